@@ -0,0 +1,110 @@
+"""
+Rule-table achievement engine.
+
+Each AchievementRule awards its Achievement once a metric of the user's progress reaches a
+threshold. Metrics are read from one snapshot of UserPoints ('goals_completed', 'level',
+'total_points') plus, when a rule needs them, completed goal counts per category
+('category:<name>'). The Achievement rows for the rules are cached in-process (dropped by the
+signal handlers in roadmap/signals.py), so adding a rule does not add a query.
+"""
+import threading
+from collections import namedtuple
+
+from django.db import transaction
+from django.db.models import Count
+
+from .models import Achievement, Goal, UserAchievement
+
+AchievementRule = namedtuple(
+    'AchievementRule', ['name', 'description', 'points', 'achievement_type', 'icon', 'metric', 'threshold'],
+)
+
+CATEGORY_METRIC_PREFIX = 'category:'
+
+RULES = [
+    AchievementRule("First Goal Completed", "You've completed your first goal!", 50, 'completion', 'stars', 'goals_completed', 1),
+    AchievementRule("Goal Master", "You've completed 5 goals!", 100, 'completion', 'emoji_events', 'goals_completed', 5),
+    AchievementRule("Level 3 Achiever", "You've reached level 3!", 75, 'special', 'military_tech', 'level', 3),
+]
+
+_catalog = {}
+_catalog_lock = threading.Lock()
+
+
+def achievement_catalog(rules=None):
+    """{rule name: Achievement} for every rule, creating missing Achievement rows on first use"""
+    rules = RULES if rules is None else rules
+    found = {rule.name: _catalog[rule.name] for rule in rules if rule.name in _catalog}
+    missing = [rule for rule in rules if rule.name not in found]
+    created = []
+    if missing:
+        with _catalog_lock:
+            existing = {}
+            for achievement in Achievement.objects.filter(name__in=[rule.name for rule in missing]).order_by('id'):
+                existing.setdefault(achievement.name, achievement)
+            # bulk_create sends no post_save, so creating the rows does not drop the catalog being filled.
+            created = Achievement.objects.bulk_create([
+                Achievement(
+                    name=rule.name, description=rule.description, points=rule.points,
+                    achievement_type=rule.achievement_type, icon=rule.icon,
+                )
+                for rule in missing if rule.name not in existing
+            ])
+            _catalog.update(existing)
+            found.update(existing)
+            found.update((achievement.name, achievement) for achievement in created)
+    if created:
+        # Rows created in a transaction that is rolled back (e.g. a retried rollup) must not stay cached.
+        transaction.on_commit(lambda: _cache_created(created))
+    return {rule.name: found[rule.name] for rule in rules}
+
+
+def _cache_created(achievements):
+    with _catalog_lock:
+        for achievement in achievements:
+            _catalog.setdefault(achievement.name, achievement)
+
+
+def invalidate_achievement_catalog():
+    with _catalog_lock:
+        _catalog.clear()
+
+
+def progress_snapshot(user, user_points, rules):
+    """The metric values the rules are evaluated against"""
+    snapshot = {
+        'goals_completed': user_points.goals_completed,
+        'level': user_points.level,
+        'total_points': user_points.total_points,
+    }
+    if any(rule.metric.startswith(CATEGORY_METRIC_PREFIX) for rule in rules):
+        completed = Goal.objects.filter(user=user, is_completed=True).values('category').annotate(count=Count('id'))
+        for row in completed:
+            metric = f"{CATEGORY_METRIC_PREFIX}{row['category'].lower()}"
+            snapshot[metric] = snapshot.get(metric, 0) + row['count']
+    return snapshot
+
+
+def award_achievements(user, user_points, rules=None):
+    """
+    Award every achievement whose rule the user now meets and has not earned yet.
+    Bonus points are added to user_points in memory; the caller saves it.
+    Returns the newly earned Achievements.
+    """
+    rules = RULES if rules is None else rules
+    catalog = achievement_catalog(rules)
+    snapshot = progress_snapshot(user, user_points, rules)
+    earned = set(UserAchievement.objects.filter(user=user).values_list('achievement_id', flat=True))
+
+    new_achievements = [
+        catalog[rule.name] for rule in rules
+        if snapshot.get(rule.metric, 0) >= rule.threshold and catalog[rule.name].id not in earned
+    ]
+    if new_achievements:
+        UserAchievement.objects.bulk_create(
+            [UserAchievement(user=user, achievement=achievement) for achievement in new_achievements],
+            ignore_conflicts=True,
+        )
+        # Add achievement bonus points
+        user_points.total_points += sum(achievement.points for achievement in new_achievements)
+    return new_achievements
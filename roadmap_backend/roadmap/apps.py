@@ -4,3 +4,12 @@ from django.apps import AppConfig
 class RoadmapConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'roadmap'
+
+    def ready(self):
+        from django.core import checks
+
+        from . import signals  # noqa: F401
+        from .sessions import check_session_cache
+
+        checks.register(check_session_cache, checks.Tags.caches)
+
@@ -0,0 +1,100 @@
+"""
+Token authentication with the Token -> User lookup cached.
+
+Tokens are looked up in a small in-process TTLLRUCache and then, when AUTH_TOKEN_SHARED_CACHE
+is on, in the Django cache, before falling back to DRF's Token/User query. Entries are keyed
+by a hash of the token, so token keys never reach the shared cache. The signal handlers in
+roadmap/signals.py drop a user's entries when their Token is deleted or rotated, when the
+User is saved (password change, deactivation) or deleted, and on logout. Dropping an entry also
+bumps a per-token generation counter in the Django cache, which every process checks before
+trusting its in-process copy, so a revoked token stops working everywhere at once when the cache
+backend is shared (REDIS_URL). With a per-process cache backend, other processes keep their copy
+for at most AUTH_TOKEN_CACHE_TTL seconds.
+"""
+import copy
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+from . import metrics
+from .lru import TTLLRUCache
+
+SHARED_CACHE_PREFIX = 'roadmap:auth_token:'
+GENERATION_CACHE_KEY = 'roadmap:auth_token:generation:{}'
+
+# token hash -> (generation, (user, token))
+_memory = TTLLRUCache(settings.AUTH_TOKEN_CACHE_SIZE, settings.AUTH_TOKEN_CACHE_TTL)
+
+
+def _token_hash(key):
+    return hashlib.sha256(key.encode('utf-8')).hexdigest()
+
+
+def _generation(token_hash):
+    return cache.get(GENERATION_CACHE_KEY.format(token_hash), 0)
+
+
+def _cached_credentials(token_hash, generation):
+    cached = _memory.get(token_hash)
+    if cached is not None and cached[0] == generation:
+        return cached[1]
+    credentials = None
+    if settings.AUTH_TOKEN_SHARED_CACHE:
+        credentials = cache.get(SHARED_CACHE_PREFIX + token_hash)
+        if credentials is not None:
+            _memory.set(token_hash, (generation, credentials))
+    return credentials
+
+
+def _store_credentials(token_hash, generation, credentials):
+    _memory.set(token_hash, (generation, credentials))
+    if settings.AUTH_TOKEN_SHARED_CACHE:
+        cache.set(SHARED_CACHE_PREFIX + token_hash, credentials, timeout=settings.AUTH_TOKEN_SHARED_CACHE_TTL)
+
+
+def invalidate_token(key):
+    """Forget the cached user for one token key"""
+    token_hash = _token_hash(key)
+    _memory.delete(token_hash)
+    if settings.AUTH_TOKEN_SHARED_CACHE:
+        cache.delete(SHARED_CACHE_PREFIX + token_hash)
+    # Once the counter expires every in-process copy cached before the bump has expired too.
+    generation_key = GENERATION_CACHE_KEY.format(token_hash)
+    try:
+        cache.incr(generation_key)
+    except ValueError:
+        cache.set(generation_key, 1, timeout=settings.AUTH_TOKEN_CACHE_TTL)
+
+
+def invalidate_user_tokens(user_id):
+    """Forget the cached user for every token the user holds"""
+    for key in Token.objects.filter(user_id=user_id).values_list('key', flat=True):
+        invalidate_token(key)
+
+
+def clear_token_cache():
+    """Empty this process's tier (the shared tier expires on its own)"""
+    _memory.clear()
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """Drop-in replacement for DRF's TokenAuthentication that skips the database on a warm cache"""
+
+    def authenticate_credentials(self, key):
+        token_hash = _token_hash(key)
+        # Read before the lookup, so a revocation that lands meanwhile invalidates what is stored.
+        generation = _generation(token_hash)
+        credentials = _cached_credentials(token_hash, generation)
+        if credentials is None:
+            metrics.increment('auth_token_cache_misses')
+            # Raises AuthenticationFailed for unknown tokens and inactive users, which are not cached.
+            credentials = super().authenticate_credentials(key)
+            _store_credentials(token_hash, generation, credentials)
+        else:
+            metrics.increment('auth_token_cache_hits')
+        # Every request gets its own instances, so views cannot change the cached ones.
+        user, token = credentials
+        return copy.copy(user), copy.copy(token)
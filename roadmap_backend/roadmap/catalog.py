@@ -0,0 +1,77 @@
+"""
+In-process catalog of assessment questions.
+
+The questions only change when seed_questions.py runs, so they are loaded once and kept together
+with their pre-rendered JSON and an ETag. Saving or deleting an AssessmentQuestion (see
+roadmap/signals.py) or reseeding bumps a generation counter in the Django cache; other processes
+notice the new generation on their next lookup when the cache backend is shared, and reload after
+ASSESSMENT_CATALOG_TTL seconds regardless.
+"""
+import hashlib
+import threading
+import time
+from collections import namedtuple
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.renderers import JSONRenderer
+
+from .models import AssessmentQuestion
+from .serializers import AssessmentQuestionSerializer
+
+GENERATION_CACHE_KEY = 'roadmap:question_catalog:generation'
+
+# questions maps question_id to the AssessmentQuestion; body is the serialized list as JSON bytes.
+QuestionCatalog = namedtuple('QuestionCatalog', ['body', 'etag', 'questions', 'generation', 'loaded_at'])
+
+_catalog = None
+_lock = threading.Lock()
+
+
+def _current_generation():
+    return cache.get(GENERATION_CACHE_KEY, 0)
+
+
+def _is_fresh(catalog, generation):
+    return (
+        catalog is not None and catalog.generation == generation
+        and time.monotonic() - catalog.loaded_at < settings.ASSESSMENT_CATALOG_TTL
+    )
+
+
+def _load_catalog(generation):
+    questions = list(AssessmentQuestion.objects.order_by('question_id'))
+    body = JSONRenderer().render(AssessmentQuestionSerializer(questions, many=True).data)
+    etag = f'"{hashlib.sha256(body).hexdigest()[:32]}"'
+    return QuestionCatalog(body, etag, {question.question_id: question for question in questions}, generation, time.monotonic())
+
+
+def get_question_catalog():
+    """Return the current QuestionCatalog, loading it if it is missing or stale"""
+    global _catalog
+    generation = _current_generation()
+    catalog = _catalog
+    if _is_fresh(catalog, generation):
+        return catalog
+    with _lock:
+        if not _is_fresh(_catalog, generation):
+            _catalog = _load_catalog(generation)
+        return _catalog
+
+
+def invalidate_question_catalog():
+    """Drop this process's catalog and tell other processes to drop theirs"""
+    global _catalog
+    _catalog = None
+    try:
+        cache.incr(GENERATION_CACHE_KEY)
+    except ValueError:
+        cache.set(GENERATION_CACHE_KEY, 1, timeout=None)
+
+
+def etag_matches(if_none_match, etag):
+    """Weak comparison of an If-None-Match header against etag"""
+    if not if_none_match:
+        return False
+    candidates = [candidate.strip().removeprefix('W/') for candidate in if_none_match.split(',')]
+    return '*' in candidates or etag in candidates
@@ -0,0 +1,14 @@
+from rest_framework import status
+
+
+class RoadmapGenerationError(Exception):
+    """Raised when a roadmap cannot be generated; carries the API detail and status code."""
+
+    def __init__(self, detail, status_code=status.HTTP_400_BAD_REQUEST):
+        super().__init__(detail)
+        self.detail = detail
+        self.status_code = status_code
+
+
+class RoadmapFormatError(ValueError):
+    """A structured (JSON) roadmap response does not match the expected schema."""
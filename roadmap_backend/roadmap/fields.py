@@ -0,0 +1,59 @@
+"""
+CompressedTextField: a TextField stored as zlib-compressed bytes.
+
+Stored values start with a format version byte:
+    0x00  raw UTF-8 (short values, or values that do not compress)
+    0x01  zlib-compressed UTF-8
+Python code, forms, the admin and serializers see plain str values. The column cannot be
+searched or filtered with text lookups.
+"""
+import zlib
+
+from django.db import models
+
+RAW = 0
+ZLIB = 1
+# Values shorter than this are not worth compressing.
+MIN_COMPRESS_LENGTH = 128
+COMPRESSION_LEVEL = 6
+
+
+def compress_text(text):
+    data = text.encode('utf-8')
+    if len(data) >= MIN_COMPRESS_LENGTH:
+        compressed = zlib.compress(data, COMPRESSION_LEVEL)
+        if len(compressed) < len(data):
+            return bytes([ZLIB]) + compressed
+    return bytes([RAW]) + data
+
+
+def decompress_text(value):
+    value = bytes(value)
+    if not value:
+        return ''
+    version, payload = value[0], value[1:]
+    if version == ZLIB:
+        return zlib.decompress(payload).decode('utf-8')
+    if version == RAW:
+        return payload.decode('utf-8')
+    raise ValueError(f'Unknown compressed text format version {version}')
+
+
+class CompressedTextField(models.TextField):
+    description = 'Text stored compressed'
+
+    def get_internal_type(self):
+        # Use the binary column type (bytea / BLOB) of the database.
+        return 'BinaryField'
+
+    def from_db_value(self, value, expression, connection):
+        if value is None:
+            return value
+        return decompress_text(value)
+
+    def get_db_prep_value(self, value, connection, prepared=False):
+        if not prepared:
+            value = self.get_prep_value(value)
+        if value is None:
+            return None
+        return connection.Database.Binary(compress_text(value))
@@ -2,12 +2,63 @@ from google import generativeai as genai
 from django.conf import settings
 import os
 
+from .gemini_client import get_client
+from .parsing import ROADMAP_FIELDS
+from .timing import timed
+
 genai.configure(api_key=settings.GEMINI_API_KEY)
 
+GEMINI_MODEL = "gemini-2.0-flash-lite"
+
+# Structured output: Gemini returns a JSON object with the five milestones and the plan.
+ROADMAP_RESPONSE_SCHEMA = {
+    "type": "object",
+    "properties": {field: {"type": "string"} for field in ROADMAP_FIELDS},
+    "required": ROADMAP_FIELDS,
+}
+JSON_GENERATION_CONFIG = {
+    "response_mime_type": "application/json",
+    "response_schema": ROADMAP_RESPONSE_SCHEMA,
+}
+
 def analyze_goal_with_gemini(full_prompt: str) -> str:
     contents = full_prompt
 
-    model = genai.GenerativeModel("gemini-2.0-flash-lite")
-    response = model.generate_content(contents)
+    with timed('gemini'):
+        response = get_client().generate(contents, GEMINI_MODEL)
 
     return response.text
+
+async def analyze_goal_with_gemini_async(full_prompt: str) -> str:
+    """Same as analyze_goal_with_gemini but awaits the request instead of blocking a thread."""
+    contents = full_prompt
+
+    with timed('gemini'):
+        response = await get_client().agenerate(contents, GEMINI_MODEL)
+
+    return response.text
+
+def analyze_goal_with_gemini_json(full_prompt: str) -> str:
+    """Like analyze_goal_with_gemini, but asks for JSON matching ROADMAP_RESPONSE_SCHEMA."""
+    contents = full_prompt
+
+    with timed('gemini'):
+        response = get_client().generate(contents, GEMINI_MODEL, generation_config=JSON_GENERATION_CONFIG)
+
+    return response.text
+
+async def analyze_goal_with_gemini_json_async(full_prompt: str) -> str:
+    contents = full_prompt
+
+    with timed('gemini'):
+        response = await get_client().agenerate(contents, GEMINI_MODEL, generation_config=JSON_GENERATION_CONFIG)
+
+    return response.text
+
+async def stream_goal_with_gemini_async(full_prompt: str):
+    """Yield the response text chunk by chunk as Gemini streams it."""
+    contents = full_prompt
+
+    async for chunk in get_client().astream(contents, GEMINI_MODEL):
+        if chunk.text:
+            yield chunk.text
@@ -0,0 +1,314 @@
+"""
+Managed access to Gemini.
+
+GeminiClientManager keeps one GenerativeModel per model name and guards every call with
+  * an AdaptiveLimiter: an AIMD cap on in-flight calls that grows by about one per round of
+    fast successes and halves on errors or calls slower than GEMINI_LATENCY_TARGET;
+  * a CircuitBreaker: fails fast with GeminiUnavailable once the recent error rate crosses
+    GEMINI_BREAKER_ERROR_RATE, then lets a single trial call through after a cool-down.
+Calls abandoned by the caller (a client disconnect cancelling the task or closing the stream)
+free their slot without counting as an error or a success.
+Pass model_factory (e.g. roadmap.gemini_fake.FakeGeminiModel) to exercise it without the network.
+"""
+import asyncio
+import threading
+import time
+from collections import deque
+
+from django.conf import settings
+
+from . import metrics
+
+
+class GeminiUnavailable(Exception):
+    """Gemini is not called because the circuit is open or the concurrency limit is saturated."""
+
+
+class AdaptiveLimiter:
+    def __init__(self, initial, min_limit, max_limit, latency_target, backoff_ratio=0.5):
+        self.limit = float(initial)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.latency_target = latency_target
+        self.backoff_ratio = backoff_ratio
+        self.in_flight = 0
+        self._condition = threading.Condition()
+        # (loop, future) for each coroutine in acquire_async; release wakes them from any thread.
+        self._async_waiters = []
+
+    def try_acquire(self):
+        with self._condition:
+            if self.in_flight < int(self.limit):
+                self.in_flight += 1
+                return True
+            return False
+
+    def acquire(self, timeout):
+        deadline = time.monotonic() + timeout
+        with self._condition:
+            while self.in_flight >= int(self.limit):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._condition.wait(remaining)
+            self.in_flight += 1
+            return True
+
+    async def acquire_async(self, timeout):
+        deadline = time.monotonic() + timeout
+        loop = asyncio.get_running_loop()
+        while True:
+            with self._condition:
+                if self.in_flight < int(self.limit):
+                    self.in_flight += 1
+                    return True
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                waiter = (loop, loop.create_future())
+                self._async_waiters.append(waiter)
+            try:
+                await asyncio.wait_for(waiter[1], remaining)
+            except asyncio.TimeoutError:
+                pass
+            finally:
+                with self._condition:
+                    if waiter in self._async_waiters:
+                        self._async_waiters.remove(waiter)
+
+    def release(self, latency, error=False):
+        with self._condition:
+            self.in_flight -= 1
+            if error or latency > self.latency_target:
+                self.limit = max(self.min_limit, self.limit * self.backoff_ratio)
+            else:
+                # Additive increase: roughly +1 once a full window of calls succeeds.
+                self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+            self._notify()
+
+    def cancel(self):
+        """Free the slot of a call abandoned by its caller, leaving the limit as it is"""
+        with self._condition:
+            self.in_flight -= 1
+            self._notify()
+
+    def _notify(self):
+        self._condition.notify_all()
+        waiters, self._async_waiters = self._async_waiters, []
+        for loop, future in waiters:
+            try:
+                loop.call_soon_threadsafe(_wake, future)
+            except RuntimeError:  # the waiter's loop is already closed
+                pass
+
+
+def _wake(future):
+    if not future.done():
+        future.set_result(None)
+
+
+class CircuitBreaker:
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, error_rate, window, min_calls, reset_seconds):
+        self.error_rate = error_rate
+        self.min_calls = min_calls
+        self.reset_seconds = reset_seconds
+        self.state = self.CLOSED
+        self._outcomes = deque(maxlen=window)
+        self._opened_at = 0
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_seconds:
+                self.state = self.HALF_OPEN
+            if self.state == self.HALF_OPEN and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            return False
+
+    def record(self, success):
+        with self._lock:
+            if self.state == self.HALF_OPEN:
+                self._trial_in_flight = False
+                if success:
+                    self.state = self.CLOSED
+                    self._outcomes.clear()
+                else:
+                    self._open()
+                return
+
+            self._outcomes.append(success)
+            failures = self._outcomes.count(False)
+            if len(self._outcomes) >= self.min_calls and failures / len(self._outcomes) >= self.error_rate:
+                self._open()
+
+    def cancel(self):
+        """Give back a half-open trial slot for a call that was admitted but never made"""
+        with self._lock:
+            self._trial_in_flight = False
+
+    def _open(self):
+        self.state = self.OPEN
+        self._opened_at = time.monotonic()
+        metrics.increment('gemini_circuit_opened')
+
+
+class GeminiClientManager:
+    def __init__(self, model_factory=None):
+        self._model_factory = model_factory
+        self._models = {}
+        self._models_lock = threading.Lock()
+        self.limiter = AdaptiveLimiter(
+            settings.GEMINI_CONCURRENCY_INITIAL, settings.GEMINI_CONCURRENCY_MIN,
+            settings.GEMINI_CONCURRENCY_MAX, settings.GEMINI_LATENCY_TARGET,
+        )
+        self.breaker = CircuitBreaker(
+            settings.GEMINI_BREAKER_ERROR_RATE, settings.GEMINI_BREAKER_WINDOW,
+            settings.GEMINI_BREAKER_MIN_CALLS, settings.GEMINI_BREAKER_RESET_SECONDS,
+        )
+
+    def get_model(self, model_name):
+        """Return the shared model instance for model_name, creating it on first use"""
+        with self._models_lock:
+            model = self._models.get(model_name)
+            if model is None:
+                model = self._models[model_name] = self._create_model(model_name)
+            return model
+
+    def _create_model(self, model_name):
+        if self._model_factory is not None:
+            return self._model_factory(model_name)
+        from google import generativeai as genai
+        return genai.GenerativeModel(model_name)
+
+    def _admit(self):
+        if not self.breaker.allow():
+            metrics.increment('gemini_rejected')
+            raise GeminiUnavailable('Gemini is temporarily unavailable (circuit open).')
+
+    def _reject_saturated(self):
+        self.breaker.cancel()
+        metrics.increment('gemini_rejected')
+        raise GeminiUnavailable('Too many Gemini requests in flight.')
+
+    async def _acquire_async(self):
+        """Wait for a limiter slot for an admitted call; a caller that gives up waiting returns its trial slot"""
+        try:
+            acquired = await self.limiter.acquire_async(settings.GEMINI_ACQUIRE_TIMEOUT)
+        except asyncio.CancelledError:
+            self.breaker.cancel()
+            metrics.increment('gemini_cancelled')
+            raise
+        if not acquired:
+            self._reject_saturated()
+
+    def _abandon(self):
+        self.limiter.cancel()
+        self.breaker.cancel()
+        metrics.increment('gemini_cancelled')
+
+    def _finish(self, started, error):
+        latency = time.monotonic() - started
+        self.limiter.release(latency, error)
+        self.breaker.record(not error)
+        metrics.increment('gemini_calls')
+        if error:
+            metrics.increment('gemini_errors')
+
+    def generate(self, contents, model_name, **kwargs):
+        """Blocking generate_content with timeout, concurrency limit and circuit breaker"""
+        self._admit()
+        if not self.limiter.acquire(settings.GEMINI_ACQUIRE_TIMEOUT):
+            self._reject_saturated()
+        started = time.monotonic()
+        error = True
+        try:
+            response = self.get_model(model_name).generate_content(
+                contents, request_options={'timeout': settings.GEMINI_TIMEOUT}, **kwargs
+            )
+            error = False
+            return response
+        finally:
+            self._finish(started, error)
+
+    async def agenerate(self, contents, model_name, **kwargs):
+        """Async counterpart of generate()"""
+        self._admit()
+        await self._acquire_async()
+        started = time.monotonic()
+        error = True
+        try:
+            response = await self.get_model(model_name).generate_content_async(
+                contents, request_options={'timeout': settings.GEMINI_TIMEOUT}, **kwargs
+            )
+            error = False
+            return response
+        except asyncio.CancelledError:
+            error = None
+            raise
+        finally:
+            if error is None:
+                self._abandon()
+            else:
+                self._finish(started, error)
+
+    async def astream(self, contents, model_name, **kwargs):
+        """Yield response chunks; the limiter slot is held until the stream ends"""
+        self._admit()
+        await self._acquire_async()
+        started = time.monotonic()
+        error = True
+        try:
+            response = await self.get_model(model_name).generate_content_async(
+                contents, stream=True, request_options={'timeout': settings.GEMINI_TIMEOUT}, **kwargs
+            )
+            async for chunk in response:
+                yield chunk
+            error = False
+        except (GeneratorExit, asyncio.CancelledError):
+            error = None
+            raise
+        finally:
+            if error is None:
+                self._abandon()
+            else:
+                self._finish(started, error)
+
+    def stats(self):
+        return {
+            'state': self.breaker.state,
+            'limit': int(self.limiter.limit),
+            'in_flight': self.limiter.in_flight,
+            'calls': metrics.get_counter('gemini_calls'),
+            'errors': metrics.get_counter('gemini_errors'),
+            'rejected': metrics.get_counter('gemini_rejected'),
+            'cancelled': metrics.get_counter('gemini_cancelled'),
+        }
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """Process-wide GeminiClientManager"""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = GeminiClientManager()
+        return _client
+
+
+def set_client(client):
+    """Replace the process-wide client (e.g. with one built on a fake model); returns the old one"""
+    global _client
+    with _client_lock:
+        previous, _client = _client, client
+        return previous
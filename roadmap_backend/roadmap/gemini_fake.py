@@ -0,0 +1,150 @@
+"""
+Local stand-in for google.generativeai.GenerativeModel with injectable latency and failures.
+
+    GeminiClientManager(model_factory=lambda name: FakeGeminiModel(latency=0.5, failure_rate=0.1))
+    FakeGeminiModel(latency=latency_distribution('lognormal:1.5,0.4'))
+
+FakeGeminiRestServer serves a FakeGeminiModel over HTTP for the direct REST path (GEMINI_REST_URL).
+"""
+import asyncio
+import json
+import math
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class FakeGeminiError(Exception):
+    pass
+
+
+def latency_distribution(spec, seed=None):
+    """
+    Latency callable (seconds) for FakeGeminiModel from a spec string:
+    'fixed:S', 'uniform:LOW,HIGH', 'normal:MEAN,STDEV' or 'lognormal:MEDIAN,SIGMA'.
+    """
+    kind, _, args = spec.partition(':')
+    try:
+        params = [float(arg) for arg in args.split(',')] if args else []
+    except ValueError:
+        raise ValueError(f'Invalid latency distribution: {spec!r}')
+    rng = random.Random(seed)
+    samplers = {
+        ('fixed', 1): lambda: params[0],
+        ('uniform', 2): lambda: rng.uniform(params[0], params[1]),
+        ('normal', 2): lambda: max(0.0, rng.gauss(params[0], params[1])),
+        ('lognormal', 2): lambda: rng.lognormvariate(math.log(params[0]), params[1]),
+    }
+    sampler = samplers.get((kind, len(params)))
+    if sampler is None:
+        raise ValueError(f'Invalid latency distribution: {spec!r}')
+    return sampler
+
+
+class FakeResponse:
+    def __init__(self, text):
+        self.text = text
+
+
+class _FakeStream:
+    def __init__(self, chunks, delay):
+        self._chunks = chunks
+        self._delay = delay
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        for chunk in self._chunks:
+            await asyncio.sleep(self._delay)
+            yield FakeResponse(chunk)
+
+
+class FakeGeminiModel:
+    DEFAULT_RESPONSE = (
+        "Milestones:\n"
+        "- Start: Define the goal and gather resources.\n"
+        "- 3 months: Build the core habits.\n"
+        "- 6 months: Reach the first measurable result.\n"
+        "- 9 months: Expand and refine.\n"
+        "- 12 months: Review and set the next goal.\n\n"
+        "Full Plan:\nWork on the goal every week and review progress monthly.\n"
+    )
+
+    def __init__(self, response_text=None, latency=0.0, failure_rate=0.0, chunk_size=40, seed=None):
+        self.response_text = response_text or self.DEFAULT_RESPONSE
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.chunk_size = chunk_size
+        self.calls = 0
+        self._random = random.Random(seed)
+
+    def _latency(self):
+        return self.latency() if callable(self.latency) else self.latency
+
+    def _maybe_fail(self):
+        self.calls += 1
+        if self._random.random() < self.failure_rate:
+            raise FakeGeminiError('Injected Gemini failure')
+
+    def _chunks(self):
+        text = self.response_text
+        return [text[i:i + self.chunk_size] for i in range(0, len(text), self.chunk_size)]
+
+    def generate_content(self, contents, stream=False, **kwargs):
+        time.sleep(self._latency())
+        self._maybe_fail()
+        return FakeResponse(self.response_text)
+
+    async def generate_content_async(self, contents, stream=False, **kwargs):
+        latency = self._latency()
+        if stream:
+            chunks = self._chunks()
+            await asyncio.sleep(latency / (len(chunks) + 1))
+            self._maybe_fail()
+            return _FakeStream(chunks, latency / (len(chunks) + 1))
+        await asyncio.sleep(latency)
+        self._maybe_fail()
+        return FakeResponse(self.response_text)
+
+
+class _RestHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # keep-alive, like the real endpoint
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+        prompt = ''.join(part.get('text', '') for content in body.get('contents', []) for part in content.get('parts', []))
+        try:
+            text = self.server.model.generate_content(prompt).text
+        except FakeGeminiError as e:
+            status, payload = 503, {'error': {'code': 503, 'message': str(e), 'status': 'UNAVAILABLE'}}
+        else:
+            status, payload = 200, {'candidates': [{'content': {'parts': [{'text': text}], 'role': 'model'}}]}
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+class FakeGeminiRestServer:
+    """generateContent endpoint on localhost answering from model; use as a context manager"""
+
+    def __init__(self, model):
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), _RestHandler)
+        self._server.daemon_threads = True
+        self._server.model = model
+        self.url = f'http://127.0.0.1:{self._server.server_port}/v1beta/models/fake:generateContent'
+
+    def __enter__(self):
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._server.shutdown()
+        self._server.server_close()
@@ -0,0 +1,415 @@
+import json
+import logging
+import re
+from contextlib import contextmanager
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from rest_framework import status
+
+from . import metrics
+from .models import Goal
+from .gemini_ai import (
+    GEMINI_MODEL, analyze_goal_with_gemini, analyze_goal_with_gemini_async, analyze_goal_with_gemini_json,
+    analyze_goal_with_gemini_json_async, stream_goal_with_gemini_async,
+)
+from .exceptions import RoadmapFormatError, RoadmapGenerationError
+from .gemini_client import GeminiUnavailable
+from .parsing import ROADMAP_FIELDS, RoadmapSectionParser, parse_roadmap_json, parse_roadmap_sections
+from .prompts import build_roadmap_prompt, build_batch_roadmap_prompt, build_repair_prompt, profile_fragment
+from .roadmap_cache import roadmap_cache_key, evict_response, get_cached_response, store_response
+from .singleflight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+# Concurrent requests with the same prompt fingerprint share one Gemini call.
+roadmap_flight = SingleFlight('roadmap_gemini')
+
+
+def prompt_cache_key(prompt):
+    """The prompt text is a canonical rendering of its inputs, so it doubles as the cache input"""
+    return roadmap_cache_key(GEMINI_MODEL, prompt=prompt.text)
+
+
+def prepare_roadmap_prompt(user, data, json_mode=None):
+    """
+    Load the target goal and the user's profile fragment and build the prompt.
+    Expects 'goal_id' in data and uses 'goal', 'category', 'description' for the prompt.
+    json_mode defaults to settings.ROADMAP_JSON_MODE.
+    Returns (target_goal, prompt, cache_key) where prompt is a prompts.Prompt.
+    """
+    if json_mode is None:
+        json_mode = settings.ROADMAP_JSON_MODE
+    goal_id = data.get('goal_id')
+    goal_title = data.get('goal') # Assuming 'goal' is the title for the prompt
+    category = data.get('category')
+    description = data.get('description')
+
+    if not goal_id:
+        raise RoadmapGenerationError('goal_id is required.')
+
+    try:
+        target_goal = Goal.objects.get(id=goal_id, user=user)
+    except Goal.DoesNotExist:
+        raise RoadmapGenerationError('Goal not found or you do not have permission.', status.HTTP_404_NOT_FOUND)
+
+    prompt = build_roadmap_prompt(goal_title, category, description, profile_fragment(user), json_mode)
+    return target_goal, prompt, prompt_cache_key(prompt)
+
+
+def parse_gemini_roadmap_response(text_response):
+    """
+    Parses the plain text response from Gemini to extract roadmap milestones and full plan.
+    Assumes the response format requested in the prompt:
+    Milestones:
+    - Start: ...
+    - 3 months: ...
+    - 6 months: ...
+    - 9 months: ...
+    - 12 months: ...
+
+    Full Plan:
+    ...
+    Markdown headings, bold labels and numbered lists are tolerated (see roadmap/parsing.py).
+    """
+    roadmap_data, missing = parse_roadmap_sections(text_response)
+    if missing:
+        metrics.increment('roadmap_parse_incomplete')
+        logger.debug("Roadmap response is missing sections: %s", ", ".join(missing))
+    return roadmap_data
+
+
+MILESTONE_FIELDS = ROADMAP_FIELDS[:-1]
+
+
+class RoadmapStreamParser:
+    """
+    Incremental counterpart of parse_gemini_roadmap_response for streamed responses.
+    feed() returns (field, text) pairs for every milestone that became complete, i.e. whose
+    following milestone or "Full Plan:" label line has arrived. close() returns the remaining
+    milestone pairs and the parse of the whole response, which is what gets saved.
+    """
+
+    def __init__(self):
+        self.text = ""
+        self._pending = ""
+        self._sections = RoadmapSectionParser()
+        self._emitted = set()
+
+    def _milestones(self, completed):
+        milestones = [(field, text) for field, text in completed if field in MILESTONE_FIELDS]
+        self._emitted.update(field for field, _ in milestones)
+        return milestones
+
+    def feed(self, chunk):
+        self.text += chunk
+        *lines, self._pending = (self._pending + chunk).split("\n")
+        completed = []
+        for line in lines:
+            completed.extend(self._sections.feed_line(line))
+        completed.extend(self._sections.feed_partial(self._pending))
+        return self._milestones(completed)
+
+    def close(self):
+        self._sections.feed_line(self._pending)
+        self._pending = ""
+        self._sections.finish()
+        parsed_roadmap = self._sections.sections
+        remaining = [(field, parsed_roadmap[field]) for field in MILESTONE_FIELDS if field not in self._emitted]
+        self._emitted.update(field for field, _ in remaining)
+        return remaining, parsed_roadmap
+
+
+def save_roadmap(target_goal, parsed_roadmap):
+    """Copy parsed milestones onto the goal and save it"""
+    target_goal.milestone_start = parsed_roadmap.get("milestone_start", "")
+    target_goal.milestone_3_months = parsed_roadmap.get("milestone_3_months", "")
+    target_goal.milestone_6_months = parsed_roadmap.get("milestone_6_months", "")
+    target_goal.milestone_9_months = parsed_roadmap.get("milestone_9_months", "")
+    target_goal.milestone_12_months = parsed_roadmap.get("milestone_12_months", "")
+    target_goal.full_plan = parsed_roadmap.get("full_plan", "")
+
+    try:
+        target_goal.save()
+    except Exception as e:
+        logger.exception("Error saving roadmap to goal %s", target_goal.id)
+        raise RoadmapGenerationError(f'Could not save roadmap to goal: {str(e)}', status.HTTP_500_INTERNAL_SERVER_ERROR)
+    return target_goal
+
+
+def _peek_cached_response(cache_key):
+    return get_cached_response(cache_key, record_stats=False)
+
+
+@contextmanager
+def gemini_call_errors():
+    """Turn Gemini failures into RoadmapGenerationErrors for the API"""
+    try:
+        yield
+    except GeminiUnavailable as e:
+        raise RoadmapGenerationError(str(e), status.HTTP_503_SERVICE_UNAVAILABLE)
+    except Exception as e:
+        raise RoadmapGenerationError(f'Error calling Gemini: {str(e)}', status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+def get_roadmap_response(prompt, cache_key):
+    """
+    Return the Gemini response for prompt (a prompts.Prompt), served from the roadmap cache when possible.
+    Concurrent misses for the same cache_key are coalesced into a single Gemini call.
+    """
+    ai_response_text = get_cached_response(cache_key)
+    if ai_response_text is not None:
+        return ai_response_text
+
+    def call_gemini():
+        # Another process may have published the response while we waited for the lease.
+        ai_response_text = _peek_cached_response(cache_key)
+        if ai_response_text is not None:
+            return ai_response_text
+        metrics.increment('gemini_prompt_tokens', prompt.token_count)
+        analyze = analyze_goal_with_gemini_json if prompt.json_mode else analyze_goal_with_gemini
+        with gemini_call_errors():
+            ai_response_text = analyze(prompt.text)
+        store_response(cache_key, GEMINI_MODEL, ai_response_text)
+        return ai_response_text
+
+    return roadmap_flight.do(cache_key, call_gemini, remote_result=lambda: _peek_cached_response(cache_key))
+
+
+async def aget_roadmap_response(prompt, cache_key):
+    """Async variant of get_roadmap_response"""
+    ai_response_text = await sync_to_async(get_cached_response)(cache_key)
+    if ai_response_text is not None:
+        return ai_response_text
+
+    async def call_gemini():
+        ai_response_text = await sync_to_async(_peek_cached_response)(cache_key)
+        if ai_response_text is not None:
+            return ai_response_text
+        metrics.increment('gemini_prompt_tokens', prompt.token_count)
+        analyze = analyze_goal_with_gemini_json_async if prompt.json_mode else analyze_goal_with_gemini_async
+        with gemini_call_errors():
+            ai_response_text = await analyze(prompt.text)
+        await sync_to_async(store_response)(cache_key, GEMINI_MODEL, ai_response_text)
+        return ai_response_text
+
+    return await roadmap_flight.ado(cache_key, call_gemini, remote_result=lambda: _peek_cached_response(cache_key))
+
+
+def _validate_json_response(ai_response_text):
+    try:
+        return parse_roadmap_json(ai_response_text), None
+    except RoadmapFormatError as e:
+        metrics.increment('roadmap_json_invalid')
+        return None, e
+
+
+def _fall_back_to_text_parser(ai_response_text, error):
+    # The model may have ignored the JSON instruction and answered in the text format.
+    metrics.increment('roadmap_json_fallbacks')
+    logger.warning("Roadmap JSON response could not be repaired (%s); falling back to the text parser", error)
+    return parse_gemini_roadmap_response(ai_response_text)
+
+
+def _replace_unrepaired_response(cache_key, roadmap_data):
+    """
+    Keep an invalid JSON response that could not be repaired out of the cache, so later hits do
+    not pay for the repair again: cache the text parser's result in its place when it is complete,
+    otherwise evict the entry and let the next request ask Gemini afresh.
+    """
+    if roadmap_data is not None:
+        text = json.dumps(roadmap_data)
+        try:
+            parse_roadmap_json(text)
+        except RoadmapFormatError:
+            pass
+        else:
+            store_response(cache_key, GEMINI_MODEL, text)
+            return
+    evict_response(cache_key)
+
+
+def parse_roadmap_response(prompt, cache_key, ai_response_text):
+    """
+    Turn a Gemini response into roadmap data.
+    For a json_mode prompt, an invalid response is retried once with a repair prompt; the
+    repaired response replaces the invalid one in the cache. If the repair is invalid as well
+    the original response goes through parse_gemini_roadmap_response, and either way the invalid
+    response leaves the cache (see _replace_unrepaired_response).
+    """
+    if not prompt.json_mode:
+        return parse_gemini_roadmap_response(ai_response_text)
+    roadmap_data, error = _validate_json_response(ai_response_text)
+    if roadmap_data is not None:
+        return roadmap_data
+
+    metrics.increment('roadmap_json_repairs')
+    repair_prompt = build_repair_prompt(prompt, ai_response_text, error)
+    metrics.increment('gemini_prompt_tokens', repair_prompt.token_count)
+    try:
+        with gemini_call_errors():
+            repaired_text = analyze_goal_with_gemini_json(repair_prompt.text)
+    except RoadmapGenerationError:
+        _replace_unrepaired_response(cache_key, None)
+        raise
+    roadmap_data, repair_error = _validate_json_response(repaired_text)
+    if roadmap_data is None:
+        roadmap_data = _fall_back_to_text_parser(ai_response_text, repair_error)
+        _replace_unrepaired_response(cache_key, roadmap_data)
+        return roadmap_data
+    store_response(cache_key, GEMINI_MODEL, repaired_text)
+    return roadmap_data
+
+
+async def aparse_roadmap_response(prompt, cache_key, ai_response_text):
+    """Async variant of parse_roadmap_response"""
+    if not prompt.json_mode:
+        return parse_gemini_roadmap_response(ai_response_text)
+    roadmap_data, error = _validate_json_response(ai_response_text)
+    if roadmap_data is not None:
+        return roadmap_data
+
+    metrics.increment('roadmap_json_repairs')
+    repair_prompt = build_repair_prompt(prompt, ai_response_text, error)
+    metrics.increment('gemini_prompt_tokens', repair_prompt.token_count)
+    try:
+        with gemini_call_errors():
+            repaired_text = await analyze_goal_with_gemini_json_async(repair_prompt.text)
+    except RoadmapGenerationError:
+        await sync_to_async(_replace_unrepaired_response)(cache_key, None)
+        raise
+    roadmap_data, repair_error = _validate_json_response(repaired_text)
+    if roadmap_data is None:
+        roadmap_data = _fall_back_to_text_parser(ai_response_text, repair_error)
+        await sync_to_async(_replace_unrepaired_response)(cache_key, roadmap_data)
+        return roadmap_data
+    await sync_to_async(store_response)(cache_key, GEMINI_MODEL, repaired_text)
+    return roadmap_data
+
+
+def generate_roadmap_for_goal(user, data):
+    """Generate a roadmap with Gemini, parse it and save it to the goal. Returns the goal."""
+    target_goal, prompt, cache_key = prepare_roadmap_prompt(user, data)
+    ai_response_text = get_roadmap_response(prompt, cache_key)
+
+    parsed_roadmap = parse_roadmap_response(prompt, cache_key, ai_response_text)
+    return save_roadmap(target_goal, parsed_roadmap)
+
+
+async def agenerate_roadmap_for_goal(user, data):
+    """
+    Async variant of generate_roadmap_for_goal.
+    ORM work runs through sync_to_async while the Gemini call is awaited on the event loop,
+    so a pending request does not hold a thread.
+    """
+    target_goal, prompt, cache_key = await sync_to_async(prepare_roadmap_prompt)(user, data)
+    ai_response_text = await aget_roadmap_response(prompt, cache_key)
+
+    parsed_roadmap = await aparse_roadmap_response(prompt, cache_key, ai_response_text)
+    return await sync_to_async(save_roadmap)(target_goal, parsed_roadmap)
+
+
+async def astream_roadmap_events(target_goal, prompt, cache_key):
+    """
+    Stream a roadmap as (event, data) pairs: 'token' for each Gemini chunk, 'milestone' as soon as
+    a milestone is complete, then 'done' once the goal has been saved (or 'error').
+    A cached response is replayed straight away without calling Gemini.
+    """
+    parser = RoadmapStreamParser()
+    cached_text = await sync_to_async(get_cached_response)(cache_key)
+    if cached_text is not None:
+        for field, text in parser.feed(cached_text):
+            yield 'milestone', {'field': field, 'text': text}
+    else:
+        try:
+            async for chunk in stream_goal_with_gemini_async(prompt.text):
+                yield 'token', {'text': chunk}
+                for field, text in parser.feed(chunk):
+                    yield 'milestone', {'field': field, 'text': text}
+        except Exception as e:
+            yield 'error', {'detail': f'Error calling Gemini: {str(e)}'}
+            return
+
+    remaining, parsed_roadmap = parser.close()
+    for field, text in remaining:
+        yield 'milestone', {'field': field, 'text': text}
+
+    try:
+        if cached_text is None:
+            await sync_to_async(store_response)(cache_key, GEMINI_MODEL, parser.text)
+        await sync_to_async(save_roadmap)(target_goal, parsed_roadmap)
+    except RoadmapGenerationError as e:
+        yield 'error', {'detail': e.detail}
+        return
+    yield 'done', {'goal_id': target_goal.id}
+
+
+BATCH_SECTION_RE = re.compile(r"^[\s#*]*=+\s*GOAL\s+(\d+)\s*=+[\s*]*$", re.IGNORECASE | re.MULTILINE)
+
+
+def split_batch_roadmap_response(text_response, goal_ids):
+    """Split a batch response into {goal_id: section text} using the '=== GOAL <id> ===' headers"""
+    headers = list(BATCH_SECTION_RE.finditer(text_response))
+    sections = {}
+    for i, header in enumerate(headers):
+        goal_id = int(header.group(1))
+        if goal_id not in goal_ids:
+            continue
+        end = headers[i + 1].start() if i + 1 < len(headers) else len(text_response)
+        sections[goal_id] = text_response[header.end():end]
+    return sections
+
+
+def parse_batch_roadmap_response(text_response, goal_ids):
+    """
+    Generalisation of parse_gemini_roadmap_response for batch responses.
+    Returns {goal_id: roadmap_data}; goals whose section is missing or has neither
+    milestones nor a full plan map to None.
+    """
+    sections = split_batch_roadmap_response(text_response, goal_ids)
+    parsed = {}
+    for goal_id in goal_ids:
+        roadmap_data = parse_gemini_roadmap_response(sections[goal_id]) if goal_id in sections else None
+        if roadmap_data is not None and not roadmap_data["full_plan"]:
+            roadmap_data = None
+        parsed[goal_id] = roadmap_data
+    return parsed
+
+
+def generate_roadmaps_for_goals(user, goal_ids):
+    """
+    Generate roadmaps for several goals with one Gemini call and save them in one transaction.
+    Goals whose section of the batch response cannot be parsed are generated individually.
+    Returns the updated goals in the requested order.
+    """
+    goals = {goal.id: goal for goal in Goal.objects.filter(user=user, id__in=goal_ids)}
+    missing = [goal_id for goal_id in goal_ids if goal_id not in goals]
+    if missing:
+        raise RoadmapGenerationError(f'Goals not found or you do not have permission: {missing}', status.HTTP_404_NOT_FOUND)
+
+    fragment = profile_fragment(user)
+    ordered_goals = [goals[goal_id] for goal_id in goal_ids]
+
+    prompt = build_batch_roadmap_prompt(ordered_goals, fragment)
+    parsed = parse_batch_roadmap_response(get_roadmap_response(prompt, prompt_cache_key(prompt)), goal_ids)
+
+    now = timezone.now()
+    for goal in ordered_goals:
+        roadmap_data = parsed[goal.id]
+        if roadmap_data is None:
+            metrics.increment('roadmap_batch_fallbacks')
+            single_prompt = build_roadmap_prompt(goal.title, goal.category, goal.description, fragment)
+            roadmap_data = parse_gemini_roadmap_response(get_roadmap_response(single_prompt, prompt_cache_key(single_prompt)))
+        for field in ROADMAP_FIELDS:
+            setattr(goal, field, roadmap_data.get(field, ""))
+        goal.updated_at = now
+
+    try:
+        with transaction.atomic():
+            Goal.objects.bulk_update(ordered_goals, ROADMAP_FIELDS + ['updated_at'])
+    except Exception as e:
+        logger.exception("Error saving batch roadmap for goals %s", goal_ids)
+        raise RoadmapGenerationError(f'Could not save roadmaps: {str(e)}', status.HTTP_500_INTERNAL_SERVER_ERROR)
+    return ordered_goals
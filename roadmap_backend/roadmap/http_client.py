@@ -0,0 +1,88 @@
+"""
+Pooled HTTP client for direct Gemini REST calls.
+
+One requests.Session per process keeps connections alive between calls instead of paying DNS,
+TCP and TLS setup every time. Its adapter holds at most GEMINI_HTTP_POOL_SIZE connections per
+host and makes extra callers wait for a free one rather than opening more. Every call gets a
+(connect, read) timeout, and connection errors, 429s and 5xx responses are retried with jittered
+exponential backoff, waiting out Retry-After (up to GEMINI_HTTP_RETRY_AFTER_MAX) when the server
+sends one. When retries run out the last response is returned as is.
+"""
+import threading
+
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from . import metrics
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+class CappedRetry(Retry):
+    """Retry that never waits longer than retry_after_max for a Retry-After header"""
+    retry_after_max = None
+
+    def new(self, **kw):
+        retry = super().new(**kw)
+        retry.retry_after_max = self.retry_after_max
+        return retry
+
+    def get_retry_after(self, response):
+        seconds = super().get_retry_after(response)
+        if seconds is not None and self.retry_after_max is not None:
+            return min(seconds, self.retry_after_max)
+        return seconds
+
+    def increment(self, *args, **kwargs):
+        metrics.increment('gemini_http_retries')
+        return super().increment(*args, **kwargs)
+
+
+def build_session():
+    """New session configured from the GEMINI_HTTP_* settings"""
+    retry = CappedRetry(
+        total=settings.GEMINI_HTTP_RETRIES,
+        status_forcelist=RETRY_STATUSES,
+        allowed_methods=frozenset({'GET', 'POST'}),  # generateContent has no side effects
+        backoff_factor=settings.GEMINI_HTTP_BACKOFF,
+        backoff_jitter=settings.GEMINI_HTTP_BACKOFF_JITTER,
+        raise_on_status=False,
+    )
+    retry.retry_after_max = settings.GEMINI_HTTP_RETRY_AFTER_MAX
+    adapter = HTTPAdapter(
+        pool_connections=1, pool_maxsize=settings.GEMINI_HTTP_POOL_SIZE, pool_block=True, max_retries=retry,
+    )
+    session = requests.Session()
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_session():
+    """Process-wide pooled session"""
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = build_session()
+        return _session
+
+
+def set_session(session):
+    """Replace the process-wide session; returns the old one (which the caller may close)"""
+    global _session
+    with _session_lock:
+        previous, _session = _session, session
+        return previous
+
+
+def post_json(url, payload, headers=None, timeout=None):
+    """POST payload as JSON through the pooled session with the configured timeouts"""
+    if timeout is None:
+        timeout = (settings.GEMINI_HTTP_CONNECT_TIMEOUT, settings.GEMINI_HTTP_READ_TIMEOUT)
+    return get_session().post(url, json=payload, headers=headers, timeout=timeout)
@@ -0,0 +1,206 @@
+"""
+DB-backed queue for roadmap generation.
+
+Jobs live in the RoadmapJob table, so a restart loses nothing and no external broker is needed.
+Each web process runs a small pool of worker threads (ROADMAP_JOB_WORKERS), started by its first
+request or enqueued job (see signals.start_job_workers), or run explicitly with the
+process_roadmap_jobs command; they claim queued jobs with a compare-and-set update, and several
+processes can share the table safely. Failed Gemini calls are retried with exponential backoff.
+A running job's heartbeat is refreshed while it runs, and jobs left 'running' by a crashed process
+are requeued once their heartbeat is older than the lease (ROADMAP_JOB_LEASE_SECONDS). The crashed
+run counts as an attempt, so a job that keeps killing its process fails after
+ROADMAP_JOB_MAX_ATTEMPTS.
+"""
+import logging
+import random
+import threading
+import time
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+from django.utils import timezone
+from rest_framework import status
+
+from . import metrics
+from .generation import RoadmapGenerationError, generate_roadmap_for_goal
+from .models import RoadmapJob
+
+logger = logging.getLogger(__name__)
+
+
+def enqueue_roadmap_job(user, goal, data):
+    """
+    Queue a roadmap generation for goal and wake the workers once the row is committed.
+    An identical request that is still queued or running is returned instead of a new job,
+    so double-clicks and retries share one generation and one Goal save.
+    """
+    payload = {key: data.get(key) for key in ('goal', 'category', 'description')}
+    active = RoadmapJob.objects.filter(
+        goal=goal, status__in=[RoadmapJob.STATUS_QUEUED, RoadmapJob.STATUS_RUNNING],
+    ).only('id', 'status', 'payload')
+    for job in active:
+        if job.payload == payload:
+            metrics.increment('roadmap_jobs_coalesced')
+            return job
+
+    job = RoadmapJob.objects.create(user=user, goal=goal, payload=payload)
+    if settings.ROADMAP_JOB_AUTOSTART:
+        transaction.on_commit(lambda: get_worker().wake())
+    return job
+
+
+def claim_next_job():
+    """Atomically move the oldest due job from queued to running and return it, or None"""
+    now = timezone.now()
+    candidates = (
+        RoadmapJob.objects
+        .filter(status=RoadmapJob.STATUS_QUEUED, run_after__lte=now)
+        .order_by('run_after', 'id')
+        .values_list('id', 'attempts')[:5]
+    )
+    for job_id, attempts in candidates:
+        claimed = RoadmapJob.objects.filter(id=job_id, status=RoadmapJob.STATUS_QUEUED).update(
+            status=RoadmapJob.STATUS_RUNNING, attempts=attempts + 1, heartbeat_at=now,
+        )
+        if claimed:
+            return RoadmapJob.objects.select_related('user').get(id=job_id)
+    return None
+
+
+def retry_delay(attempts):
+    """Exponential backoff with full jitter for the given attempt number"""
+    return random.uniform(0, settings.ROADMAP_JOB_RETRY_BACKOFF * 2 ** (attempts - 1))
+
+
+@contextmanager
+def heartbeat(job, interval=None):
+    """Keep refreshing job.heartbeat_at while the block runs, so a long job is not taken for orphaned"""
+    interval = settings.ROADMAP_JOB_LEASE_SECONDS / 5 if interval is None else interval
+    stop = threading.Event()
+
+    def beat():
+        try:
+            while not stop.wait(interval):
+                try:
+                    RoadmapJob.objects.filter(id=job.id, status=RoadmapJob.STATUS_RUNNING).update(heartbeat_at=timezone.now())
+                except Exception:
+                    logger.warning("Roadmap job %s heartbeat failed", job.id, exc_info=True)
+        finally:
+            connection.close()
+
+    thread = threading.Thread(target=beat, name=f'roadmap-job-heartbeat-{job.id}', daemon=True)
+    thread.start()
+    try:
+        yield
+    finally:
+        stop.set()
+        thread.join()
+
+
+def run_job(job):
+    """Generate the roadmap for a claimed job and record the outcome"""
+    data = dict(job.payload, goal_id=job.goal_id)
+    try:
+        with heartbeat(job):
+            generate_roadmap_for_goal(job.user, data)
+    except Exception as e:
+        retryable = not isinstance(e, RoadmapGenerationError) or e.status_code >= status.HTTP_500_INTERNAL_SERVER_ERROR
+        job.error = e.detail if isinstance(e, RoadmapGenerationError) else str(e)
+        if retryable and job.attempts < settings.ROADMAP_JOB_MAX_ATTEMPTS:
+            job.status = RoadmapJob.STATUS_QUEUED
+            job.run_after = timezone.now() + timedelta(seconds=retry_delay(job.attempts))
+        else:
+            job.status = RoadmapJob.STATUS_FAILED
+            job.finished_at = timezone.now()
+        job.save(update_fields=['status', 'error', 'run_after', 'finished_at'])
+        return job
+
+    job.status = RoadmapJob.STATUS_DONE
+    job.error = ''
+    job.finished_at = timezone.now()
+    job.save(update_fields=['status', 'error', 'finished_at'])
+    return job
+
+
+def recover_orphaned_jobs():
+    """
+    Requeue running jobs whose worker stopped heartbeating (e.g. the process crashed). Returns the
+    number requeued. The lost run was counted when the job was claimed, so orphans that have used
+    up ROADMAP_JOB_MAX_ATTEMPTS fail instead.
+    """
+    now = timezone.now()
+    orphaned = RoadmapJob.objects.filter(
+        status=RoadmapJob.STATUS_RUNNING, heartbeat_at__lt=now - timedelta(seconds=settings.ROADMAP_JOB_LEASE_SECONDS),
+    )
+    orphaned.filter(attempts__gte=settings.ROADMAP_JOB_MAX_ATTEMPTS).update(
+        status=RoadmapJob.STATUS_FAILED, error='The worker running this job stopped', finished_at=now,
+    )
+    return orphaned.update(status=RoadmapJob.STATUS_QUEUED, run_after=now)
+
+
+def run_pending_jobs():
+    """Process due jobs on the calling thread until the queue is empty. Returns the number run."""
+    count = 0
+    while True:
+        job = claim_next_job()
+        if job is None:
+            return count
+        run_job(job)
+        count += 1
+
+
+class RoadmapJobWorker:
+    """Pool of daemon threads that drain the job table, bounded to ROADMAP_JOB_WORKERS at a time"""
+
+    def __init__(self, size):
+        self.size = size
+        self._wakeup = threading.Event()
+        self._threads = []
+        self._lock = threading.Lock()
+        self._next_recovery = 0
+
+    def start(self):
+        with self._lock:
+            if self._threads:
+                return
+            for i in range(self.size):
+                thread = threading.Thread(target=self._loop, name=f'roadmap-job-worker-{i}', daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def wake(self):
+        self.start()
+        self._wakeup.set()
+
+    def _loop(self):
+        while True:
+            try:
+                close_old_connections()
+                if time.monotonic() >= self._next_recovery:
+                    self._next_recovery = time.monotonic() + settings.ROADMAP_JOB_LEASE_SECONDS / 4
+                    recover_orphaned_jobs()
+                job = claim_next_job()
+                if job is not None:
+                    run_job(job)
+                    continue
+            except Exception:
+                logger.exception("Roadmap job worker error")
+            finally:
+                close_old_connections()
+            self._wakeup.wait(settings.ROADMAP_JOB_POLL_INTERVAL)
+            self._wakeup.clear()
+
+
+_worker = None
+_worker_lock = threading.Lock()
+
+
+def get_worker():
+    """Return this process's worker pool, creating it on first use"""
+    global _worker
+    with _worker_lock:
+        if _worker is None:
+            _worker = RoadmapJobWorker(settings.ROADMAP_JOB_WORKERS)
+        return _worker
@@ -0,0 +1,149 @@
+"""
+Leaderboard ranks.
+
+Users are ranked by UserPoints.total_points, highest first; equal totals share a rank
+(1, 2, 2, 4) and are listed by user id. The top of the board is read straight from the
+(total_points, id) index. Ranks anywhere else come from an in-process RankSnapshot: every
+user's total and id in rank order, held in two flat arrays so a million users take about
+16 MB, where a rank is a binary search. The snapshot is rebuilt after LEADERBOARD_SNAPSHOT_TTL
+seconds by one background thread while requests keep using the stale one, so ranks from it can
+be that much behind, plus the rebuild time. Only a process with no snapshot yet waits for one.
+"""
+import logging
+import threading
+import time
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import namedtuple
+
+from django.conf import settings
+from django.db import connection
+
+from .models import UserPoints
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_CHUNK_SIZE = 10000
+
+LeaderboardEntry = namedtuple('LeaderboardEntry', ['rank', 'user_id', 'total_points'])
+
+
+class RankSnapshot:
+    """Every user's (total_points, user_id) in rank order"""
+
+    def __init__(self, rows):
+        """rows: (total_points, user_id) pairs ordered by total_points descending, then user_id"""
+        # Totals are stored negated so that both arrays are ascending and bisect applies directly.
+        self._negated_points = array('q')
+        self._user_ids = array('q')
+        for total_points, user_id in rows:
+            self._negated_points.append(-total_points)
+            self._user_ids.append(user_id)
+        self.built_at = time.monotonic()
+
+    def __len__(self):
+        return len(self._user_ids)
+
+    def rank_for_points(self, total_points):
+        """Rank a user with total_points would have: one more than the number of users ahead"""
+        return bisect_left(self._negated_points, -total_points) + 1
+
+    def position(self, user_id, total_points):
+        """Index where the user is, or would be, in rank order"""
+        low = bisect_left(self._negated_points, -total_points)
+        high = bisect_right(self._negated_points, -total_points, low)
+        # Ties are ordered by user id, so the user is found with a second binary search.
+        return bisect_left(self._user_ids, user_id, low, high)
+
+    def entries(self, start, stop):
+        """LeaderboardEntry for the users at positions start..stop-1"""
+        start, stop = max(0, start), min(len(self), stop)
+        return [
+            LeaderboardEntry(self.rank_for_points(-self._negated_points[i]), self._user_ids[i], -self._negated_points[i])
+            for i in range(start, stop)
+        ]
+
+    @classmethod
+    def from_database(cls):
+        rows = UserPoints.objects.order_by('-total_points', 'user_id').values_list('total_points', 'user_id')
+        return cls(rows.iterator(chunk_size=SNAPSHOT_CHUNK_SIZE))
+
+
+_snapshot = None
+_generation = 0  # bumped by invalidate_rank_snapshot, so a rebuild started before it is discarded
+_rebuilding = False
+_lock = threading.Lock()
+
+
+def _is_fresh(snapshot):
+    return snapshot is not None and time.monotonic() - snapshot.built_at < settings.LEADERBOARD_SNAPSHOT_TTL
+
+
+def _rebuild_in_background(generation):
+    global _snapshot, _rebuilding
+    try:
+        snapshot = RankSnapshot.from_database()
+        with _lock:
+            if generation == _generation:
+                _snapshot = snapshot
+    except Exception:
+        logger.exception('Rebuilding the leaderboard rank snapshot failed; serving the stale one')
+    finally:
+        with _lock:
+            _rebuilding = False
+        connection.close()
+
+
+def get_rank_snapshot():
+    """
+    Return the current RankSnapshot. A stale one is returned as is while a background thread
+    replaces it; the caller only waits when there is no snapshot at all.
+    """
+    global _snapshot, _rebuilding
+    snapshot = _snapshot
+    if _is_fresh(snapshot):
+        return snapshot
+    with _lock:
+        if _snapshot is None:
+            _snapshot = RankSnapshot.from_database()
+            return _snapshot
+        if not _is_fresh(_snapshot) and not _rebuilding:
+            _rebuilding = True
+            threading.Thread(
+                target=_rebuild_in_background, args=(_generation,), name='leaderboard-snapshot', daemon=True,
+            ).start()
+        return _snapshot
+
+
+def invalidate_rank_snapshot():
+    global _snapshot, _generation
+    with _lock:
+        _snapshot = None
+        _generation += 1
+
+
+def top_entries(limit):
+    """The first limit users on the board, read in order from the (total_points, id) index"""
+    rows = UserPoints.objects.order_by('-total_points', 'user_id').values_list('total_points', 'user_id')[:limit]
+    entries = []
+    for position, (total_points, user_id) in enumerate(rows):
+        if entries and entries[-1].total_points == total_points:
+            rank = entries[-1].rank
+        else:
+            rank = position + 1
+        entries.append(LeaderboardEntry(rank, user_id, total_points))
+    return entries
+
+
+def rank_around(user_id, total_points, neighbours):
+    """
+    (rank, ranked_users, entries) for a user with total_points: the user's rank in the snapshot
+    and the board from neighbours users above them to neighbours below
+    """
+    snapshot = get_rank_snapshot()
+    position = snapshot.position(user_id, total_points)
+    # The snapshot may hold an older total for the user, so their own entry is left out around them.
+    above = [entry for entry in snapshot.entries(position - neighbours - 1, position) if entry.user_id != user_id]
+    below = [entry for entry in snapshot.entries(position, position + neighbours + 1) if entry.user_id != user_id]
+    me = LeaderboardEntry(snapshot.rank_for_points(total_points), user_id, total_points)
+    return me.rank, len(snapshot), above[len(above) - neighbours:] + [me] + below[:neighbours]
@@ -0,0 +1,68 @@
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from roadmap.fields import compress_text
+from roadmap.models import Goal
+from roadmap.parsing import load_response_corpus
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Compare CompressedTextField (Goal.full_plan) with a plain TextField (Goal.description): stored size and read/write latency'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=200, help='Goals written and read per column')
+        parser.add_argument('--repeat', type=int, default=8,
+                            help='Times the corpus text is repeated to mimic a long full plan')
+
+    def handle(self, *args, **options):
+        corpus_text = '\n\n'.join(entry['text'] for entry in load_response_corpus())
+        samples = [
+            ('milestone (short)', 'Finish the fundamentals course and build two small projects.'),
+            ('corpus response', corpus_text),
+            (f"long plan (x{options['repeat']})", corpus_text * options['repeat']),
+        ]
+
+        self.stdout.write(f"{'value':<24}{'utf-8 bytes':>12}{'stored':>9}{'ratio':>8}")
+        for name, text in samples:
+            raw, stored = len(text.encode('utf-8')), len(compress_text(text))
+            self.stdout.write(f'{name:<24}{raw:>12}{stored:>9}{stored / raw:>8.2f}')
+
+        text = samples[-1][1]
+        with transaction.atomic():
+            user = User.objects.create_user(username=f'bench-compressed-{time.time_ns()}', password=None)
+            goals = Goal.objects.bulk_create(
+                Goal(user=user, title=f'Goal {i}', description='', category='bench') for i in range(options['rows'])
+            )
+            ids = [goal.id for goal in goals]
+
+            self.stdout.write(f"\n{options['rows']} rows, {len(text.encode('utf-8'))}-byte value")
+            self.stdout.write(f"{'column':<34}{'write ms':>10}{'read ms':>10}{'db bytes/row':>14}")
+            for label, column in [('TextField (description)', 'description'), ('CompressedTextField (full_plan)', 'full_plan')]:
+                started = time.perf_counter()
+                for goal in goals:
+                    setattr(goal, column, text)
+                    goal.save(update_fields=[column])
+                write_ms = (time.perf_counter() - started) * 1000
+
+                started = time.perf_counter()
+                values = list(Goal.objects.filter(id__in=ids).values_list(column, flat=True))
+                read_ms = (time.perf_counter() - started) * 1000
+                assert values[0] == text
+
+                self.stdout.write(f'{label:<34}{write_ms:>10.1f}{read_ms:>10.1f}{self._stored_size(column, ids[0]):>14}')
+            transaction.set_rollback(True)
+
+    def _stored_size(self, column, goal_id):
+        # pg_column_size is the on-disk size after TOAST compression; SQLite stores values as given.
+        if connection.vendor == 'postgresql':
+            expression = f'pg_column_size({column})'
+        else:
+            expression = f'length(CAST({column} AS BLOB))'
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT {expression} FROM roadmap_goal WHERE id = %s', [goal_id])
+            return cursor.fetchone()[0]
@@ -0,0 +1,70 @@
+import statistics
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext, override_settings
+from rest_framework.test import APIClient
+
+from roadmap.models import Goal, RoadmapStep, Resource
+
+User = get_user_model()
+
+VARIANTS = [
+    ('full', ''),
+    ('summary', 'view=summary'),
+    ('fields=id,title,is_completed', 'fields=id,title,is_completed'),
+    ('exclude=full_plan', 'exclude=full_plan'),
+]
+
+
+class Command(BaseCommand):
+    help = 'Measure goal list payload size, query count and latency for full, summary and sparse responses'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--goals', type=int, default=150, help='Goals created for the benchmark user')
+        parser.add_argument('--text-size', type=int, default=4000, help='Characters in each milestone / full plan field')
+        parser.add_argument('--page-size', type=int, default=100)
+        parser.add_argument('--iterations', type=int, default=20)
+
+    def handle(self, *args, **options):
+        # Everything runs in a transaction that is rolled back, so the database is left untouched.
+        with transaction.atomic(), override_settings(ALLOWED_HOSTS=['testserver']):
+            user = self._seed(options['goals'], options['text_size'])
+            client = APIClient()
+            client.force_authenticate(user)
+
+            self.stdout.write(f"{options['goals']} goals, {options['text_size']}-character roadmap fields, page size {options['page_size']}")
+            self.stdout.write(f"{'variant':<32}{'bytes':>10}{'queries':>9}{'median ms':>11}{'p95 ms':>9}")
+            for name, query in VARIANTS:
+                url = f"/api/goals/?page_size={options['page_size']}&{query}"
+                timings = []
+                for _ in range(options['iterations']):
+                    with CaptureQueriesContext(connection) as queries:
+                        started = time.perf_counter()
+                        response = client.get(url)
+                        timings.append((time.perf_counter() - started) * 1000)
+                timings.sort()
+                p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+                self.stdout.write(
+                    f"{name:<32}{len(response.content):>10}{len(queries):>9}{statistics.median(timings):>11.1f}{p95:>9.1f}"
+                )
+            transaction.set_rollback(True)
+
+    def _seed(self, goal_count, text_size):
+        user = User.objects.create_user(username=f'bench-goal-list-{time.time_ns()}', password=None)
+        text = ('Practice every day and review progress at the end of each week. ' * (text_size // 64 + 1))[:text_size]
+        goals = Goal.objects.bulk_create(
+            Goal(
+                user=user, title=f'Goal {i}', description='Benchmark goal', category='career',
+                milestone_start=text, milestone_3_months=text, milestone_6_months=text,
+                milestone_9_months=text, milestone_12_months=text, full_plan=text,
+            )
+            for i in range(goal_count)
+        )
+        RoadmapStep.objects.bulk_create(
+            RoadmapStep(goal=goal, step_text=f'Step {order}', order=order) for goal in goals for order in range(3)
+        )
+        Resource.objects.bulk_create(Resource(goal=goal, title='Guide', link='https://example.com') for goal in goals)
+        return user
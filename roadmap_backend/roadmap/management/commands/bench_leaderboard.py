@@ -0,0 +1,82 @@
+import random
+import statistics
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from roadmap.leaderboard import RankSnapshot, top_entries
+from roadmap.models import UserPoints
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Measure leaderboard rank lookups: snapshot build and binary search vs a count-above query'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1_000_000, help='Synthetic users in the in-memory snapshot')
+        parser.add_argument('--db-users', type=int, default=20_000, help='Users seeded in the database for the query timings (0 to skip)')
+        parser.add_argument('--lookups', type=int, default=10_000)
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        totals = self._totals(rng, options['users'])
+
+        started = time.perf_counter()
+        snapshot = RankSnapshot(sorted(((total, user_id) for user_id, total in enumerate(totals, 1)), key=lambda row: (-row[0], row[1])))
+        build_ms = (time.perf_counter() - started) * 1000
+        self.stdout.write(f"snapshot of {len(snapshot):,} users built in {build_ms:.0f} ms (including the sort)")
+
+        probes = [(user_id, totals[user_id - 1]) for user_id in (rng.randint(1, len(totals)) for _ in range(options['lookups']))]
+        started = time.perf_counter()
+        for user_id, total in probes:
+            snapshot.rank_for_points(total)
+            snapshot.position(user_id, total)
+        per_lookup_us = (time.perf_counter() - started) / len(probes) * 1e6
+        self.stdout.write(f"rank + position lookup: {per_lookup_us:.1f} µs each over {len(probes):,} lookups")
+
+        if options['db_users']:
+            self._bench_queries(rng, options['db_users'], min(options['lookups'], 200))
+
+    def _totals(self, rng, count):
+        # Most users have few points; a long tail has many, so large tie groups exist at the bottom.
+        return [int(rng.paretovariate(1.2) * 50) - 50 for _ in range(count)]
+
+    def _bench_queries(self, rng, count, lookups):
+        # Seeded rows are rolled back, so the database is left untouched.
+        with transaction.atomic():
+            prefix = f'bench-leaderboard-{time.time_ns()}'
+            users = User.objects.bulk_create(User(username=f'{prefix}-{i}') for i in range(count))
+            totals = self._totals(rng, count)
+            UserPoints.objects.bulk_create(
+                (UserPoints(user=user, total_points=total) for user, total in zip(users, totals)), batch_size=5000,
+            )
+            probes = rng.sample(range(count), min(lookups, count))
+
+            naive = []
+            for index in probes:
+                started = time.perf_counter()
+                UserPoints.objects.filter(total_points__gt=totals[index]).count()
+                naive.append((time.perf_counter() - started) * 1000)
+
+            started = time.perf_counter()
+            snapshot = RankSnapshot.from_database()
+            build_ms = (time.perf_counter() - started) * 1000
+            indexed = []
+            for index in probes:
+                started = time.perf_counter()
+                snapshot.rank_for_points(totals[index])
+                indexed.append((time.perf_counter() - started) * 1000)
+
+            started = time.perf_counter()
+            top_entries(100)
+            top_ms = (time.perf_counter() - started) * 1000
+
+            self.stdout.write(f"database with {count:,} ranked users:")
+            self.stdout.write(f"  count-above query  median {statistics.median(naive):.3f} ms")
+            self.stdout.write(f"  snapshot lookup    median {statistics.median(indexed):.4f} ms (snapshot load {build_ms:.0f} ms)")
+            self.stdout.write(f"  top 100 via index  {top_ms:.2f} ms")
+            transaction.set_rollback(True)
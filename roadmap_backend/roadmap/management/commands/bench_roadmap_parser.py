@@ -0,0 +1,68 @@
+import timeit
+
+from django.core.management.base import BaseCommand
+
+from roadmap.parsing import load_response_corpus, parse_roadmap_regex, parse_roadmap_sections
+
+
+class Command(BaseCommand):
+    help = 'Compare the single-pass roadmap parser with the original regex parser on the response corpus'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=200, help='Parses per response and parser')
+        parser.add_argument('--scale', type=int, default=50,
+                            help='Also time each response with its text repeated this many times (long plans, malformed output)')
+        parser.add_argument('--repeat', type=int, default=5, help='Timing runs per measurement; the fastest is reported')
+        parser.add_argument('--whitespace', type=int, nargs='*', default=[2000, 8000, 32000],
+                            help='Lengths of the whitespace line in the pathological response')
+
+    def time_parse(self, parse, text, number, repeat):
+        """Best time per parse in seconds"""
+        return min(timeit.repeat(lambda: parse(text), number=number, repeat=repeat)) / number
+
+    def handle(self, *args, **options):
+        iterations, repeat = options['iterations'], options['repeat']
+        totals = {'single_pass': 0.0, 'regex': 0.0}
+        recovered = 0
+        regressions = []
+
+        self.stdout.write(f"{'response':<36}{'size':>9}{'regex µs':>12}{'1-pass µs':>12}{'speedup':>9}")
+        for entry in load_response_corpus():
+            cases = [(entry['name'], entry['text'])]
+            if options['scale'] > 1:
+                cases.append((f"{entry['name']} x{options['scale']}", entry['text'] * options['scale']))
+
+            for name, text in cases:
+                regex_time = self.time_parse(parse_roadmap_regex, text, iterations, repeat)
+                single_time = self.time_parse(parse_roadmap_sections, text, iterations, repeat)
+                totals['regex'] += regex_time
+                totals['single_pass'] += single_time
+                self.stdout.write(
+                    f"{name:<36}{len(text):>9}{regex_time * 1e6:>12.1f}{single_time * 1e6:>12.1f}{regex_time / single_time:>8.1f}x"
+                )
+
+            # Every section the regex parser finds must come out identical.
+            regex_data = parse_roadmap_regex(entry['text'])
+            sections, _ = parse_roadmap_sections(entry['text'])
+            for field, value in regex_data.items():
+                if value and sections[field] != value:
+                    regressions.append(f"{entry['name']}.{field}")
+            recovered += sum(1 for field, value in sections.items() if value and not regex_data[field])
+
+        self.stdout.write(
+            f"\nTotal: regex {totals['regex'] * 1e3:.2f} ms, single pass {totals['single_pass'] * 1e3:.2f} ms "
+            f"({totals['regex'] / totals['single_pass']:.1f}x)"
+        )
+        self.stdout.write(f'Sections only the single-pass parser recovered: {recovered}')
+
+        # A long whitespace line must not make either parser backtrack: time should grow linearly.
+        self.stdout.write(f"\n{'whitespace line':<36}{'size':>9}{'regex µs':>12}{'1-pass µs':>12}")
+        for length in options['whitespace']:
+            text = "Milestones:\n" + " " * length + "x\nFull Plan: y"
+            regex_time = self.time_parse(parse_roadmap_regex, text, 1, repeat)
+            single_time = self.time_parse(parse_roadmap_sections, text, 1, repeat)
+            self.stdout.write(f"{length:<36}{len(text):>9}{regex_time * 1e6:>12.1f}{single_time * 1e6:>12.1f}")
+        if regressions:
+            self.stderr.write(f"Sections that differ from the regex parser: {', '.join(regressions)}")
+        else:
+            self.stdout.write(self.style.SUCCESS('Single-pass parser matches the regex parser on every section it finds'))
@@ -0,0 +1,48 @@
+import time
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+
+User = get_user_model()
+
+ENGINES = ['django.contrib.sessions.backends.db', 'roadmap.sessions']
+
+
+class Command(BaseCommand):
+    help = 'Count django_session writes per 1,000 session-authenticated requests for the db backend and roadmap.sessions'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=1000)
+        parser.add_argument('--spacing', type=float, default=2.0, help='Simulated seconds between requests')
+        parser.add_argument('--path', default='/api/auth/me/')
+
+    def handle(self, *args, **options):
+        # Everything runs in a transaction that is rolled back, so the database is left untouched.
+        with transaction.atomic(), override_settings(ALLOWED_HOSTS=['testserver']):
+            password = 'bench-pass-12345'
+            user = User.objects.create_user(username=f'bench-session-{time.time_ns()}', password=password)
+            self.stdout.write(f"{options['requests']} requests to {options['path']}, {options['spacing']:g} s apart")
+            self.stdout.write(f"{'engine':<40}{'writes':>8}{'per 1,000':>11}")
+            for engine in ENGINES:
+                writes = self._run(engine, user.username, password, options)
+                self.stdout.write(f"{engine:<40}{writes:>8}{writes * 1000 / options['requests']:>11.1f}")
+            transaction.set_rollback(True)
+
+    def _run(self, engine, username, password, options):
+        # A simulated clock spaces the requests out, so the sliding-expiry stamp moves as it would in use.
+        now = [time.time()]
+        with override_settings(SESSION_ENGINE=engine), mock.patch('time.time', side_effect=lambda: now[0]):
+            client = Client()
+            client.login(username=username, password=password)
+            with CaptureQueriesContext(connection) as queries:
+                for _ in range(options['requests']):
+                    now[0] += options['spacing']
+                    client.get(options['path'])
+        return sum(
+            1 for query in queries
+            if query['sql'].startswith(('UPDATE', 'INSERT')) and 'django_session' in query['sql']
+        )
@@ -0,0 +1,46 @@
+import statistics
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+from roadmap.authentication import CachedTokenAuthentication, clear_token_cache
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Measure database queries and latency per token authentication, cached vs DRF TokenAuthentication'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        # The benchmark user and token are rolled back, so the database is left untouched.
+        with transaction.atomic():
+            user = User.objects.create_user(username=f'bench-token-auth-{time.time_ns()}', password=None)
+            token = Token.objects.create(user=user)
+            request = RequestFactory().get('/', HTTP_AUTHORIZATION=f'Token {token.key}')
+            clear_token_cache()
+
+            self.stdout.write(f"{'authenticator':<28}{'queries/auth':>14}{'median µs':>11}")
+            for name, authenticator in [
+                ('TokenAuthentication', TokenAuthentication()),
+                ('CachedTokenAuthentication', CachedTokenAuthentication()),
+            ]:
+                authenticator.authenticate(request)  # warm up
+                timings = []
+                with CaptureQueriesContext(connection) as queries:
+                    for _ in range(options['iterations']):
+                        started = time.perf_counter()
+                        authenticator.authenticate(request)
+                        timings.append((time.perf_counter() - started) * 1e6)
+                self.stdout.write(
+                    f"{name:<28}{len(queries) / options['iterations']:>14.2f}{statistics.median(timings):>11.1f}"
+                )
+            transaction.set_rollback(True)
@@ -0,0 +1,395 @@
+import json
+import os
+import random
+import statistics
+import tempfile
+import threading
+import time
+import warnings
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+import django
+from asgiref.sync import async_to_sync
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+
+from roadmap.gemini_client import GeminiClientManager, set_client
+from roadmap.gemini_fake import FakeGeminiModel, FakeGeminiRestServer, latency_distribution
+from roadmap.models import (
+    AssessmentAnswer, AssessmentQuestion, Goal, PersonalityProfile, PointsTransaction, Resource, RoadmapJob,
+    RoadmapStep, UserPoints,
+)
+from roadmap_backend.seed_questions import questions_data
+
+User = get_user_model()
+
+PASSWORD = 'loadtest-pass-12345'
+EXCEPTION = 'exception'  # status recorded for a request that raised instead of returning a response
+CATEGORIES = ['career', 'education', 'personal', 'financial', 'health']
+PROFILE = dict(
+    problem_solving='creative', goal_energy='social', strengths='empathy', change_response='planner',
+    goal_motivation='values', daily_motivation='growth', core_belief='curiosity', time_structure='routine',
+    environment_preference='quiet_focus', progress_block='support', obstacle_type='starting',
+    future_focus='freedom', success_definition='mastery', project_style='break_down', support_type='mentor',
+)
+
+# auth is 'token', 'staff' (a staff user's token), 'session', 'fresh_session' or None; path and body take
+# the worker's context.
+Route = namedtuple('Route', ['name', 'method', 'path', 'body', 'auth'], defaults=[None, 'token'])
+
+
+def _roadmap_request(ctx):
+    # A fresh description per request, so generation reaches the simulated Gemini instead of the roadmap cache.
+    return {
+        'goal_id': ctx.goal_ids[0], 'goal': 'Run a marathon', 'category': 'health',
+        'description': f'Training plan {ctx.next_id()}',
+    }
+
+
+ROUTES = [
+    Route('home', 'GET', '/', auth=None),
+    Route('login page', 'GET', '/login/', auth=None),
+    Route('register page', 'GET', '/register/', auth=None),
+    Route('profile page', 'GET', '/profile/', auth='session'),
+    Route('logout', 'GET', '/logout/', auth='fresh_session'),
+    Route('api login', 'POST', '/api/auth/login/', lambda ctx: {'username': ctx.user.username, 'password': PASSWORD}, None),
+    Route('api register', 'POST', '/api/auth/register/', lambda ctx: {
+        'username': f'loadtest-new-{ctx.index}-{ctx.next_id()}', 'email': 'new@example.com', 'password': PASSWORD,
+    }, None),
+    Route('me', 'GET', '/api/auth/me/'),
+    Route('assessment questions', 'GET', '/api/assessments/questions/'),
+    Route('submit assessment', 'POST', '/api/assessments/submit/', lambda ctx: {
+        'answers': [{'question_id': q['question_id'], 'answer': random.choice('abcd')} for q in questions_data],
+    }),
+    Route('personality profile', 'GET', '/api/assessments/profile/'),
+    Route('goal list', 'GET', '/api/goals/'),
+    Route('goal list summary', 'GET', '/api/goals/?view=summary'),
+    Route('create goal', 'POST', '/api/goals/', lambda ctx: {
+        'title': f'Goal {ctx.next_id()}', 'description': 'Load test goal', 'category': random.choice(CATEGORIES),
+    }),
+    Route('goal detail', 'GET', lambda ctx: f'/api/goals/{random.choice(ctx.goal_ids)}/'),
+    Route('goal roadmap', 'GET', lambda ctx: f'/api/goals/{random.choice(ctx.goal_ids)}/roadmap/'),
+    Route('points', 'GET', '/api/gamification/points/'),
+    Route('points history', 'GET', '/api/gamification/points/history/'),
+    Route('points by period', 'GET', '/api/gamification/points/periods/?period=month'),
+    Route('leaderboard', 'GET', '/api/gamification/leaderboard/?limit=20'),
+    Route('leaderboard me', 'GET', '/api/gamification/leaderboard/me/'),
+    Route('add points', 'POST', '/api/gamification/add-points/', lambda ctx: {
+        'goal_id': random.choice(ctx.goal_ids), 'category': random.choice(CATEGORIES),
+    }),
+    Route('achievements', 'GET', '/api/gamification/achievements/'),
+    Route('check achievements', 'GET', '/api/gamification/check-achievements/'),
+    Route('generate roadmap (job)', 'POST', '/api/goals/generate-roadmap/', _roadmap_request),
+    Route('generate roadmap (async)', 'POST', '/api/goals/generate-roadmap/async/', _roadmap_request),
+    Route('generate roadmap (batch)', 'POST', '/api/goals/generate-roadmap/batch/', lambda ctx: {'goal_ids': ctx.goal_ids[:3]}),
+    Route('generate roadmap (stream)', 'POST', '/api/goals/generate-roadmap/stream/', _roadmap_request),
+    Route('roadmap job status', 'GET', lambda ctx: f'/api/goals/generate-roadmap/jobs/{ctx.job_id}/'),
+    Route('ask gemini', 'POST', '/api/gemini/ask/', lambda ctx: {'prompt': f'Question {ctx.next_id()}'}),
+    Route('metrics', 'GET', '/api/metrics/', auth='staff'),
+]
+
+
+class WorkerContext:
+    """One simulated client: its user, token, goals and latest roadmap job"""
+
+    def __init__(self, index, user, token, staff_token, goal_ids, job_id):
+        self.index = index
+        self.user = user
+        self.token = token
+        self.staff_token = staff_token
+        self.goal_ids = goal_ids
+        self.job_id = job_id
+        self._ids = iter(range(1, 10 ** 9))
+
+    def next_id(self):
+        return next(self._ids)
+
+
+async def _drain(response):
+    return b''.join([chunk async for chunk in response.streaming_content])
+
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, max(0, int(round(fraction * len(sorted_values))) - 1))]
+
+
+class Command(BaseCommand):
+    help = (
+        'Seed a throwaway test database, drive every route in roadmap/urls.py concurrently against a simulated '
+        'Gemini, and report throughput, latency percentiles and SQL queries per request'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=200, help='Seeded users (the leaderboard and list volumes)')
+        parser.add_argument('--goals-per-user', type=int, default=20)
+        parser.add_argument('--plan-size', type=int, default=8000, help='Characters of full_plan text per goal')
+        parser.add_argument('--concurrency', type=int, default=8, help='Concurrent simulated clients')
+        parser.add_argument('--rounds', type=int, default=10, help='Passes each client makes over every route')
+        parser.add_argument('--routes', default='', help='Comma-separated route names to run (default: all)')
+        parser.add_argument('--gemini-latency', default='lognormal:0.8,0.4',
+                            help="Simulated Gemini latency: fixed:S, uniform:LOW,HIGH, normal:MEAN,STDEV or lognormal:MEDIAN,SIGMA")
+        parser.add_argument('--gemini-failure-rate', type=float, default=0.0)
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--output', help='Write the results as JSON to this path')
+        parser.add_argument('--baseline', help='Compare against results JSON from an earlier run')
+        parser.add_argument('--tolerance', type=float, default=0.25, help='Allowed p99 growth over the baseline (0.25 = 25%%)')
+        parser.add_argument('--fail-on-regression', action='store_true')
+
+    def handle(self, *args, **options):
+        try:
+            latency = latency_distribution(options['gemini_latency'], seed=options['seed'])
+        except ValueError as e:
+            raise CommandError(str(e))
+        routes = self._select_routes(options['routes'])
+        random.seed(options['seed'])
+
+        if connection.vendor == 'sqlite' and not connection.settings_dict['TEST'].get('NAME'):
+            # Threads sharing an in-memory SQLite database fail on table locks instead of waiting; use a file.
+            connection.settings_dict['TEST']['NAME'] = os.path.join(tempfile.gettempdir(), 'roadmap_loadtest.sqlite3')
+        if connection.vendor == 'sqlite':
+            # Wait for the single writer lock instead of failing with "database is locked" straight away,
+            # and take it when a transaction begins: a read transaction upgrading to a write gets no wait.
+            options_dict = connection.settings_dict.setdefault('OPTIONS', {})
+            options_dict.setdefault('timeout', 30)
+            options_dict.setdefault('transaction_mode', 'IMMEDIATE')
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        fake = FakeGeminiModel(
+            response_text=self._roadmap_text(options['plan_size']), latency=latency,
+            failure_rate=options['gemini_failure_rate'], seed=options['seed'],
+        )
+        previous_client = set_client(GeminiClientManager(model_factory=lambda name: fake))
+        try:
+            # Jobs stay queued: the job route measures enqueueing, not the background workers.
+            with FakeGeminiRestServer(fake) as rest, override_settings(
+                ALLOWED_HOSTS=['testserver'], ROADMAP_JOB_AUTOSTART=False, GEMINI_REST_URL=rest.url,
+            ), warnings.catch_warnings():
+                warnings.simplefilter('ignore')
+                contexts = self._seed(options)
+                results = self._run(routes, contexts, options)
+            results['gemini_calls'] = fake.calls
+        finally:
+            set_client(previous_client)
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        self._report(results)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                json.dump(results, f, indent=2)
+            self.stdout.write(f"Results written to {options['output']}")
+        if options['baseline']:
+            regressions = self._compare(results, options['baseline'], options['tolerance'])
+            if regressions and options['fail_on_regression']:
+                raise CommandError(f"{len(regressions)} route(s) regressed: {', '.join(regressions)}")
+
+    def _select_routes(self, names):
+        if not names:
+            return ROUTES
+        wanted = {name.strip() for name in names.split(',') if name.strip()}
+        unknown = wanted - {route.name for route in ROUTES}
+        if unknown:
+            raise CommandError(f"Unknown route(s): {', '.join(sorted(unknown))}")
+        return [route for route in ROUTES if route.name in wanted]
+
+    def _roadmap_text(self, plan_size):
+        plan = ('Train four times a week, log every run and review progress on Sundays. ' * (plan_size // 72 + 1))[:plan_size]
+        return FakeGeminiModel.DEFAULT_RESPONSE.split('Full Plan:')[0] + f'Full Plan:\n{plan}\n'
+
+    def _seed(self, options):
+        started = time.perf_counter()
+        questions = AssessmentQuestion.objects.bulk_create(AssessmentQuestion(**data) for data in questions_data)
+        users = [
+            User(username=f'loadtest-{i}', email=f'loadtest-{i}@example.com') for i in range(max(options['users'], options['concurrency']))
+        ]
+        hashed = User(username='hash')
+        hashed.set_password(PASSWORD)
+        for user in users:
+            user.password = hashed.password
+        users = User.objects.bulk_create(users)
+        PersonalityProfile.objects.bulk_create(PersonalityProfile(user=user, **PROFILE) for user in users)
+        AssessmentAnswer.objects.bulk_create(
+            AssessmentAnswer(user=user, question=question, answer=random.choice('abcd')) for user in users for question in questions
+        )
+        plan = self._roadmap_text(options['plan_size']).split('Full Plan:\n')[1]
+        goals = Goal.objects.bulk_create(
+            Goal(
+                user=user, title=f'Goal {i}', description='Seeded goal', category=CATEGORIES[i % len(CATEGORIES)],
+                is_completed=i % 4 == 0, milestone_start='Start small.', milestone_3_months='Build habits.',
+                milestone_6_months='First results.', milestone_9_months='Refine.', milestone_12_months='Review.',
+                full_plan=plan,
+            )
+            for user in users for i in range(options['goals_per_user'])
+        )
+        RoadmapStep.objects.bulk_create(RoadmapStep(goal=goal, step_text='Step', order=order) for goal in goals for order in range(3))
+        Resource.objects.bulk_create(Resource(goal=goal, title='Guide', link='https://example.com', category='article') for goal in goals)
+        UserPoints.objects.bulk_create(
+            UserPoints(user=user, total_points=random.randrange(0, 5000, 25), goals_completed=options['goals_per_user'] // 4)
+            for user in users
+        )
+        earlier = timezone.now() - timedelta(days=90)
+        PointsTransaction.objects.bulk_create(
+            PointsTransaction(
+                user=goal.user, goal=goal, delta=100, reason=PointsTransaction.REASON_GOAL_COMPLETED, rolled_up=True,
+                created_at=earlier + timedelta(hours=random.randrange(90 * 24)),
+            )
+            for goal in goals if goal.is_completed
+        )
+
+        goal_ids = {}
+        for goal in goals:
+            goal_ids.setdefault(goal.user_id, []).append(goal.id)
+        staff = User.objects.create_user(username='loadtest-staff', password=PASSWORD, is_staff=True)
+        staff_token = Token.objects.create(user=staff)
+        contexts = []
+        for index, user in enumerate(users[:options['concurrency']]):
+            job = RoadmapJob.objects.create(user=user, goal_id=goal_ids[user.id][0], payload={})
+            contexts.append(WorkerContext(index, user, Token.objects.create(user=user), staff_token, goal_ids[user.id], job.id))
+        self.stdout.write(
+            f"Seeded {len(users)} users, {len(goals)} goals ({options['plan_size']}-character plans) "
+            f"in {time.perf_counter() - started:.1f} s on {connection.vendor}"
+        )
+        return contexts
+
+    def _run(self, routes, contexts, options):
+        samples = {route.name: [] for route in routes}
+        samples_lock = threading.Lock()
+
+        def work(ctx):
+            client = Client(raise_request_exception=False)
+            client.force_login(ctx.user)
+            rng = random.Random(options['seed'] + ctx.index)
+            try:
+                for _ in range(options['rounds']):
+                    order = list(routes)
+                    rng.shuffle(order)
+                    for route in order:
+                        sample = self._request(client, route, ctx)
+                        with samples_lock:
+                            samples[route.name].append(sample)
+            finally:
+                connection.close()
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options['concurrency']) as pool:
+            for future in [pool.submit(work, ctx) for ctx in contexts]:
+                future.result()
+        wall = time.perf_counter() - started
+
+        total = sum(len(route_samples) for route_samples in samples.values())
+        return {
+            'meta': {
+                'django': django.get_version(), 'database': connection.vendor,
+                'concurrency': options['concurrency'], 'rounds': options['rounds'], 'users': options['users'],
+                'goals_per_user': options['goals_per_user'], 'plan_size': options['plan_size'],
+                'gemini_latency': options['gemini_latency'], 'gemini_failure_rate': options['gemini_failure_rate'],
+                'finished_at': timezone.now().isoformat(),
+            },
+            'wall_seconds': round(wall, 3),
+            'requests': total,
+            'throughput_rps': round(total / wall, 2) if wall else 0.0,
+            'routes': {name: self._summarize(route_samples, wall) for name, route_samples in samples.items()},
+        }
+
+    def _request(self, client, route, ctx):
+        path = route.path(ctx) if callable(route.path) else route.path
+        kwargs = {}
+        if route.auth in ('token', 'staff'):
+            token = ctx.staff_token if route.auth == 'staff' else ctx.token
+            kwargs['HTTP_AUTHORIZATION'] = f'Token {token.key}'
+        if route.auth == 'fresh_session':
+            client = Client(raise_request_exception=False)
+            client.force_login(ctx.user)
+        elif route.auth is None:
+            client = Client(raise_request_exception=False)
+        if route.body is not None:
+            kwargs.update(data=json.dumps(route.body(ctx)), content_type='application/json')
+
+        # An exception escaping the request (e.g. while a streamed body is drained) is one failed
+        # request, not the end of the run.
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            try:
+                response = getattr(client, route.method.lower())(path, **kwargs)
+                if response.streaming:
+                    async_to_sync(_drain)(response) if response.is_async else b''.join(response.streaming_content)
+            except Exception as e:
+                return (time.perf_counter() - started) * 1000, len(queries), EXCEPTION, f'{type(e).__name__}: {e}'
+            elapsed = time.perf_counter() - started
+        if route.name == 'generate roadmap (job)' and response.status_code == 202:
+            ctx.job_id = response.json()['job_id']
+        error = None
+        if getattr(response, 'exc_info', None):  # an unhandled exception the view turned into a 500
+            error = f'{response.exc_info[0].__name__}: {response.exc_info[1]}'
+        return elapsed * 1000, len(queries), response.status_code, error
+
+    def _summarize(self, samples, wall):
+        latencies = sorted(sample[0] for sample in samples)
+        status_counts = {}
+        exceptions = {}
+        for _, _, status_code, error in samples:
+            status_counts[str(status_code)] = status_counts.get(str(status_code), 0) + 1
+            if error is not None:
+                exceptions[error] = exceptions.get(error, 0) + 1
+        return {
+            'requests': len(samples),
+            'errors': sum(1 for _, _, status_code, _ in samples if status_code == EXCEPTION or status_code >= 500),
+            'status_counts': status_counts,
+            'exceptions': exceptions,
+            'throughput_rps': round(len(samples) / wall, 2) if wall else 0.0,
+            'p50_ms': round(percentile(latencies, 0.50), 2),
+            'p90_ms': round(percentile(latencies, 0.90), 2),
+            'p99_ms': round(percentile(latencies, 0.99), 2),
+            'max_ms': round(latencies[-1], 2) if latencies else 0.0,
+            'queries_per_request': round(statistics.mean(sample[1] for sample in samples), 2) if samples else 0.0,
+        }
+
+    def _report(self, results):
+        self.stdout.write(
+            f"{results['requests']} requests in {results['wall_seconds']:.1f} s "
+            f"({results['throughput_rps']:.1f} req/s), {results['gemini_calls']} simulated Gemini calls"
+        )
+        self.stdout.write(f"{'route':<28}{'reqs':>6}{'errors':>7}{'p50 ms':>9}{'p90 ms':>9}{'p99 ms':>9}{'queries':>9}")
+        for name, route in results['routes'].items():
+            self.stdout.write(
+                f"{name:<28}{route['requests']:>6}{route['errors']:>7}{route['p50_ms']:>9.1f}"
+                f"{route['p90_ms']:>9.1f}{route['p99_ms']:>9.1f}{route['queries_per_request']:>9.1f}"
+            )
+        for name, route in results['routes'].items():
+            for error, count in route['exceptions'].items():
+                self.stdout.write(self.style.WARNING(f"{name}: {count} x {error}"))
+
+    def _compare(self, results, baseline_path, tolerance):
+        """Print p50/p99/query changes against the baseline; returns the routes that regressed"""
+        try:
+            with open(baseline_path, encoding='utf-8') as f:
+                baseline = json.load(f)
+        except (OSError, ValueError) as e:
+            raise CommandError(f'Could not read baseline {baseline_path}: {e}')
+
+        regressions = []
+        self.stdout.write(f"Compared with {baseline_path} (p99 tolerance {tolerance:.0%}):")
+        self.stdout.write(f"{'route':<28}{'p50 Δ':>9}{'p99 Δ':>9}{'queries Δ':>11}")
+        for name, current in results['routes'].items():
+            before = baseline.get('routes', {}).get(name)
+            if before is None:
+                self.stdout.write(f"{name:<28}{'new route':>29}")
+                continue
+            p50_change = current['p50_ms'] / before['p50_ms'] - 1 if before['p50_ms'] else 0.0
+            p99_change = current['p99_ms'] / before['p99_ms'] - 1 if before['p99_ms'] else 0.0
+            query_change = current['queries_per_request'] - before['queries_per_request']
+            regressed = p99_change > tolerance or query_change > 0.5
+            if regressed:
+                regressions.append(name)
+            self.stdout.write(
+                f"{name:<28}{p50_change:>+9.0%}{p99_change:>+9.0%}{query_change:>+11.1f}{'  REGRESSED' if regressed else ''}"
+            )
+        return regressions
@@ -0,0 +1,27 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from roadmap.jobs import get_worker, recover_orphaned_jobs, run_pending_jobs
+
+
+class Command(BaseCommand):
+    help = 'Run roadmap generation workers in the foreground (useful when ROADMAP_JOB_AUTOSTART is off)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Drain the queue once and exit')
+
+    def handle(self, *args, **options):
+        recovered = recover_orphaned_jobs()
+        if recovered:
+            self.stdout.write(f'Requeued {recovered} orphaned job(s)')
+
+        if options['once']:
+            self.stdout.write(f'Processed {run_pending_jobs()} job(s)')
+            return
+
+        get_worker().wake()
+        self.stdout.write(f'Running {settings.ROADMAP_JOB_WORKERS} roadmap worker(s); Ctrl+C to stop')
+        while True:
+            time.sleep(3600)
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+from django.contrib.auth import get_user_model
+from django.db.models import Count
+
+from roadmap.models import PointsTransaction
+from roadmap.points import rollup_points
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = "Fold pending points ledger rows into every user's UserPoints totals"
+
+    def handle(self, *args, **options):
+        pending = dict(
+            PointsTransaction.objects.filter(rolled_up=False)
+            .values('user_id').annotate(rows=Count('id')).values_list('user_id', 'rows')
+        )
+        for user in User.objects.filter(id__in=list(pending)).iterator():
+            rollup_points(user)
+        # Rows appended while this ran are left for the next read or run.
+        self.stdout.write(f'Rolled up {sum(pending.values())} ledger row(s) for {len(pending)} user(s)')
@@ -0,0 +1,26 @@
+import threading
+from collections import defaultdict
+
+_lock = threading.Lock()
+_counters = defaultdict(int)
+
+
+def increment(name, amount=1):
+    """Add amount to the named process-wide counter"""
+    with _lock:
+        _counters[name] += amount
+
+
+def get_counter(name):
+    return _counters.get(name, 0)
+
+
+def snapshot():
+    """Return a copy of every counter"""
+    with _lock:
+        return dict(_counters)
+
+
+def reset():
+    with _lock:
+        _counters.clear()
@@ -0,0 +1,52 @@
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+from . import timing
+
+
+class RequestTimingMiddleware:
+    """
+    Time each request (see roadmap/timing.py), add a Server-Timing header and record the
+    request in the per-route histograms. Works for sync and async views without adapting them.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+        timing.install_on_open_connections()
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        token = timing.start_request()
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+            self._finish(request, response, time.perf_counter() - started)
+        finally:
+            timing.finish_request(token)
+        return response
+
+    async def __acall__(self, request):
+        token = timing.start_request()
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+            self._finish(request, response, time.perf_counter() - started)
+        finally:
+            timing.finish_request(token)
+        return response
+
+    def _finish(self, request, response, total):
+        timings = timing.current_timings()
+        match = request.resolver_match
+        route = match.route if match is not None else 'unmatched'
+        timing.record_request(route, request.method, total, timings)
+        if settings.SERVER_TIMING_HEADER:
+            response['Server-Timing'] = timings.server_timing(total)
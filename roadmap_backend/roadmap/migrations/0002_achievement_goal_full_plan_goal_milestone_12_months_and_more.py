@@ -0,0 +1,95 @@
+# Generated by Django 5.2 on 2026-10-18 10:14
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('roadmap', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Achievement',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100)),
+                ('description', models.TextField()),
+                ('points', models.IntegerField(default=50)),
+                ('achievement_type', models.CharField(choices=[('completion', 'Goal Completion'), ('streak', 'Completion Streak'), ('category', 'Category Mastery'), ('special', 'Special Achievement')], max_length=20)),
+                ('icon', models.CharField(default='trophy', max_length=100)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='goal',
+            name='full_plan',
+            field=models.TextField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='goal',
+            name='milestone_12_months',
+            field=models.TextField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='goal',
+            name='milestone_3_months',
+            field=models.TextField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='goal',
+            name='milestone_6_months',
+            field=models.TextField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='goal',
+            name='milestone_9_months',
+            field=models.TextField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='goal',
+            name='milestone_start',
+            field=models.TextField(blank=True, null=True),
+        ),
+        migrations.CreateModel(
+            name='UserPoints',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('total_points', models.IntegerField(default=0)),
+                ('level', models.IntegerField(default=1)),
+                ('goals_completed', models.IntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='points', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='AssessmentAnswer',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('answer', models.CharField(max_length=1)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('question', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='roadmap.assessmentquestion')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='assessment_answers', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'unique_together': {('user', 'question')},
+            },
+        ),
+        migrations.CreateModel(
+            name='UserAchievement',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('achieved_at', models.DateTimeField(auto_now_add=True)),
+                ('achievement', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='roadmap.achievement')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='achievements', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'unique_together': {('user', 'achievement')},
+            },
+        ),
+    ]
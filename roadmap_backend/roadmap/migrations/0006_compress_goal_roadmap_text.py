@@ -0,0 +1,67 @@
+# Moves the Goal roadmap text columns to CompressedTextField: add compressed columns, copy the
+# existing rows over in batches, drop the old columns and take over their names.
+
+from django.db import migrations, transaction
+
+import roadmap.fields
+
+ROADMAP_FIELDS = [
+    'milestone_start',
+    'milestone_3_months',
+    'milestone_6_months',
+    'milestone_9_months',
+    'milestone_12_months',
+    'full_plan',
+]
+BATCH_SIZE = 500
+
+
+def copy_roadmap_text(apps, source_suffix, target_suffix):
+    Goal = apps.get_model('roadmap', 'Goal')
+    sources = [field + source_suffix for field in ROADMAP_FIELDS]
+    targets = [field + target_suffix for field in ROADMAP_FIELDS]
+    last_pk = 0
+    while True:
+        # Each batch commits on its own so a large table is not rewritten in one transaction.
+        with transaction.atomic():
+            batch = list(Goal.objects.filter(pk__gt=last_pk).order_by('pk').only('pk', *sources)[:BATCH_SIZE])
+            if not batch:
+                return
+            for goal in batch:
+                for source, target in zip(sources, targets):
+                    setattr(goal, target, getattr(goal, source))
+            Goal.objects.bulk_update(batch, targets)
+        last_pk = batch[-1].pk
+
+
+def compress_roadmap_text(apps, schema_editor):
+    copy_roadmap_text(apps, '', '_compressed')
+
+
+def decompress_roadmap_text(apps, schema_editor):
+    copy_roadmap_text(apps, '_compressed', '')
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ('roadmap', '0005_roadmaplease'),
+    ]
+
+    operations = [
+        *[
+            migrations.AddField(
+                model_name='goal',
+                name=f'{field}_compressed',
+                field=roadmap.fields.CompressedTextField(blank=True, null=True),
+            )
+            for field in ROADMAP_FIELDS
+        ],
+        migrations.RunPython(compress_roadmap_text, decompress_roadmap_text),
+        *[migrations.RemoveField(model_name='goal', name=field) for field in ROADMAP_FIELDS],
+        *[
+            migrations.RenameField(model_name='goal', old_name=f'{field}_compressed', new_name=field)
+            for field in ROADMAP_FIELDS
+        ],
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 5.2 on 2026-10-18 10:53
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+BATCH_SIZE = 500
+
+
+def open_balances(apps, schema_editor):
+    """Record each existing total as a rolled-up ledger row so the ledger sums to UserPoints"""
+    UserPoints = apps.get_model('roadmap', 'UserPoints')
+    PointsTransaction = apps.get_model('roadmap', 'PointsTransaction')
+    balances = UserPoints.objects.filter(total_points__gt=0).values_list('user_id', 'total_points', 'created_at')
+    PointsTransaction.objects.bulk_create(
+        (
+            PointsTransaction(user_id=user_id, delta=total, reason='opening_balance', rolled_up=True, created_at=created_at)
+            for user_id, total, created_at in balances.iterator(chunk_size=BATCH_SIZE)
+        ),
+        batch_size=BATCH_SIZE,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('roadmap', '0006_compress_goal_roadmap_text'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PointsTransaction',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('delta', models.IntegerField()),
+                ('reason', models.CharField(choices=[('goal_completed', 'Goal Completed'), ('achievement', 'Achievement Bonus'), ('opening_balance', 'Opening Balance')], max_length=20)),
+                ('rolled_up', models.BooleanField(default=False)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('goal', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='points_transactions', to='roadmap.goal')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='points_transactions', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', 'created_at'], name='roadmap_poi_user_id_d04072_idx'), models.Index(condition=models.Q(('rolled_up', False)), fields=['user'], name='points_tx_pending_idx')],
+            },
+        ),
+        migrations.RunPython(open_balances, migrations.RunPython.noop),
+    ]
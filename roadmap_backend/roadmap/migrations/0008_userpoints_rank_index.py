@@ -0,0 +1,19 @@
+# Generated by Django 5.2 on 2026-10-18 10:55
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('roadmap', '0007_pointstransaction'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='userpoints',
+            index=models.Index(fields=['-total_points', 'user'], name='userpoints_rank_idx'),
+        ),
+    ]
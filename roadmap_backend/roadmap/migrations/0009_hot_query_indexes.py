@@ -0,0 +1,47 @@
+# Generated by Django 5.2 on 2026-10-18 10:58
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('roadmap', '0008_userpoints_rank_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='goal',
+            index=models.Index(fields=['user', '-created_at', '-id'], name='roadmap_goa_user_id_d61b31_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='goal',
+            index=models.Index(fields=['user', 'is_completed', 'category'], name='roadmap_goa_user_id_61cc2a_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='goal',
+            index=models.Index(fields=['category'], name='roadmap_goa_categor_4506b8_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='goal',
+            index=models.Index(condition=models.Q(('is_completed', True)), fields=['-created_at'], name='goal_completed_recent_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='resource',
+            index=models.Index(fields=['goal', 'category'], name='roadmap_res_goal_id_890105_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='roadmapcacheentry',
+            index=models.Index(fields=['created_at'], name='roadmap_roa_created_3548e9_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='roadmapjob',
+            index=models.Index(fields=['status', 'heartbeat_at'], name='roadmap_roa_status_411705_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='roadmapstep',
+            index=models.Index(fields=['goal', 'order'], name='roadmap_roa_goal_id_f86b7a_idx'),
+        ),
+    ]
@@ -1,5 +1,8 @@
 from django.db import models
 from django.contrib.auth import get_user_model
+from django.utils import timezone
+
+from .fields import CompressedTextField
 
 User = get_user_model()
 
@@ -11,12 +14,21 @@ class Goal(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     is_completed = models.BooleanField(default=False)
-    milestone_start = models.TextField(blank=True, null=True)
-    milestone_3_months = models.TextField(blank=True, null=True)
-    milestone_6_months = models.TextField(blank=True, null=True)
-    milestone_9_months = models.TextField(blank=True, null=True)
-    milestone_12_months = models.TextField(blank=True, null=True)
-    full_plan = models.TextField(blank=True, null=True)
+    milestone_start = CompressedTextField(blank=True, null=True)
+    milestone_3_months = CompressedTextField(blank=True, null=True)
+    milestone_6_months = CompressedTextField(blank=True, null=True)
+    milestone_9_months = CompressedTextField(blank=True, null=True)
+    milestone_12_months = CompressedTextField(blank=True, null=True)
+    full_plan = CompressedTextField(blank=True, null=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', '-created_at', '-id']),  # goal list, newest first
+            models.Index(fields=['user', 'is_completed', 'category']),  # completed goals per category
+            models.Index(fields=['category']),  # admin filter
+            # admin filter; most goals are open, so only the completed ones are worth an index
+            models.Index(fields=['-created_at'], condition=models.Q(is_completed=True), name='goal_completed_recent_idx'),
+        ]
     
     def __str__(self):
         return f'{self.title} - {self.user.username}'
@@ -51,6 +63,9 @@ class RoadmapStep(models.Model):
     completed = models.BooleanField(default=False)
     due_date = models.DateField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['goal', 'order'])]  # a goal's steps in order
     
     def __str__(self):
         return f'Step {self.order} of {self.goal.title}'
@@ -61,6 +76,9 @@ class Resource(models.Model):
     category = models.CharField(max_length=100, blank=True, null=True)
     goal = models.ForeignKey(Goal, on_delete=models.CASCADE, related_name='resources', null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['goal', 'category'])]
     
     def __str__(self):
         return self.title
@@ -103,6 +121,10 @@ class UserPoints(models.Model):
     goals_completed = models.IntegerField(default=0)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        # Leaderboard order (roadmap/leaderboard.py)
+        indexes = [models.Index(fields=['-total_points', 'user'], name='userpoints_rank_idx')]
     
     def __str__(self):
         return f"{self.user.username}'s Points - Level {self.level}"
@@ -119,16 +141,6 @@ class UserPoints(models.Model):
             return 4
         else:
             return 5
-    
-    def add_points(self, points):
-        """Add points and update level if needed"""
-        self.total_points += points
-        self.goals_completed += 1
-        new_level = self.calculate_level()
-        level_up = new_level > self.level
-        self.level = new_level
-        self.save()
-        return level_up
 
 
 class Achievement(models.Model):
@@ -159,4 +171,94 @@ class UserAchievement(models.Model):
         unique_together = ('user', 'achievement')
     
     def __str__(self):
-        return f"{self.user.username} - {self.achievement.name}"
\ No newline at end of file
+        return f"{self.user.username} - {self.achievement.name}"
+
+
+class PointsTransaction(models.Model):
+    """
+    Append-only points ledger. Rows are inserted without touching UserPoints and folded into
+    its totals by roadmap.points.rollup_points, which marks them rolled_up.
+    """
+    REASON_GOAL_COMPLETED = 'goal_completed'
+    REASON_ACHIEVEMENT = 'achievement'
+    REASON_OPENING_BALANCE = 'opening_balance'
+    REASON_CHOICES = [
+        (REASON_GOAL_COMPLETED, 'Goal Completed'),
+        (REASON_ACHIEVEMENT, 'Achievement Bonus'),
+        (REASON_OPENING_BALANCE, 'Opening Balance'),
+    ]
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='points_transactions')
+    delta = models.IntegerField()
+    reason = models.CharField(max_length=20, choices=REASON_CHOICES)
+    goal = models.ForeignKey(Goal, on_delete=models.SET_NULL, null=True, blank=True, related_name='points_transactions')
+    rolled_up = models.BooleanField(default=False)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'created_at']),
+            models.Index(fields=['user'], condition=models.Q(rolled_up=False), name='points_tx_pending_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.user.username} {self.delta:+d} ({self.reason})"
+
+
+class RoadmapCacheEntry(models.Model):
+    """Gemini roadmap response stored under a hash of the prompt inputs and model name"""
+    key = models.CharField(max_length=64, unique=True)
+    model_name = models.CharField(max_length=100)
+    response_text = models.TextField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_accessed_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['created_at'])]  # expiry purge
+
+    def __str__(self):
+        return f"{self.model_name} roadmap {self.key[:12]}"
+
+
+class RoadmapJob(models.Model):
+    """Queued roadmap generation request, processed by the workers in roadmap/jobs.py"""
+    STATUS_QUEUED = 'queued'
+    STATUS_RUNNING = 'running'
+    STATUS_DONE = 'done'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_QUEUED, 'Queued'),
+        (STATUS_RUNNING, 'Running'),
+        (STATUS_DONE, 'Done'),
+        (STATUS_FAILED, 'Failed'),
+    ]
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='roadmap_jobs')
+    goal = models.ForeignKey(Goal, on_delete=models.CASCADE, related_name='roadmap_jobs')
+    payload = models.JSONField(default=dict)  # goal/category/description sent with the request
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_QUEUED)
+    attempts = models.IntegerField(default=0)
+    error = models.TextField(blank=True, default='')
+    run_after = models.DateTimeField(default=timezone.now)
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'run_after']),
+            models.Index(fields=['status', 'heartbeat_at']),  # orphaned job recovery
+        ]
+
+    def __str__(self):
+        return f"Roadmap job {self.id} for {self.goal_id} ({self.status})"
+
+
+class RoadmapLease(models.Model):
+    """Cross-process lock row: whoever holds the lease for key makes the upstream call"""
+    key = models.CharField(max_length=128, unique=True)
+    owner = models.CharField(max_length=64)
+    expires_at = models.DateTimeField()
+
+    def __str__(self):
+        return f"Lease {self.key[:12]} held by {self.owner}"
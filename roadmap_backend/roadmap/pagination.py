@@ -0,0 +1,22 @@
+from django.conf import settings
+from rest_framework.pagination import CursorPagination
+
+
+class GoalCursorPagination(CursorPagination):
+    """
+    Keyset pagination for goal lists, newest first.
+    The cursor is an opaque token holding the last created_at seen (plus an offset to step over
+    goals created in the same instant), so pages stay stable while goals are being added.
+    """
+    ordering = ('-created_at', '-id')
+    page_size = settings.GOAL_LIST_PAGE_SIZE
+    page_size_query_param = 'page_size'
+    max_page_size = settings.GOAL_LIST_MAX_PAGE_SIZE
+
+
+class PointsHistoryPagination(CursorPagination):
+    """Keyset pagination over a user's points ledger, newest first"""
+    ordering = ('-created_at', '-id')
+    page_size = settings.GOAL_LIST_PAGE_SIZE
+    page_size_query_param = 'page_size'
+    max_page_size = settings.GOAL_LIST_MAX_PAGE_SIZE
@@ -0,0 +1,223 @@
+"""
+Single-pass parser for Gemini roadmap responses.
+
+A section label (Milestones, Start, 3/6/9/12 months, Full Plan) closes the current section and
+opens the next; everything between two labels belongs to the section the first one opened.
+Labels normally start a line and may carry markdown headings, bullets, numbering and bold markers
+("## Full Plan:", "1. **3 Months:** ..."). Inside the milestones list a label may also follow an
+inline bullet ("Milestones: - Start: ... - 3 months: ..."), and "Full Plan:" is recognised
+anywhere. Milestone labels only count after the Milestones heading, so a preamble such as
+"Start: here is your plan" stays out of the milestones. Once "Full Plan:" is reached, everything
+that follows belongs to the plan.
+
+Whitespace runs in the label pattern are matched possessively, so a run is consumed once and never
+re-split between optional parts, and every alternative starts with a literal (a newline or a
+bullet), which lets the regex engine skip to candidate positions in C. Parsing is linear in the
+length of the response whatever it contains.
+"""
+import json
+import re
+from pathlib import Path
+
+from .exceptions import RoadmapFormatError
+
+# Real-world-shaped responses used by the tests and the parser benchmark.
+RESPONSE_CORPUS = Path(__file__).resolve().parent / "corpus" / "roadmap_responses.json"
+
+ROADMAP_FIELDS = [
+    "milestone_start",
+    "milestone_3_months",
+    "milestone_6_months",
+    "milestone_9_months",
+    "milestone_12_months",
+    "full_plan",
+]
+
+# [^\S\n] is whitespace other than a newline, so a label never runs into the next line. Optional
+# markers are written as alternations with an empty branch, which the engine tries cheaply.
+_SPACE = r"[^\S\n]"
+_BOLD = r"(?:\*\*|__|)"
+
+# A label at the start of a line (text is scanned with a newline in front) or after an inline
+# bullet, through its colon and any closing bold marker. Each label is a group named after its
+# field, so match.lastgroup is the field.
+LABEL_RE = re.compile(
+    r"(?:"
+    rf"\n{_SPACE}*+(?:#{{1,6}}+{_SPACE}*+|)(?:[-*•+]{_SPACE}++|\d{{1,2}}[.)]{_SPACE}++|)"
+    rf"|-(?<={_SPACE}-){_SPACE}++|\*(?<={_SPACE}\*){_SPACE}++|•(?<={_SPACE}•){_SPACE}++|\+(?<={_SPACE}\+){_SPACE}++"
+    r")"
+    rf"{_BOLD}{_SPACE}*+"
+    r"(?:"
+    # The heading alone on its line needs no colon ("### Milestones").
+    rf"(?P<milestones>milestones){_SPACE}*+{_BOLD}{_SPACE}*+(?::|(?=\n|\Z))"
+    r"|(?:(?P<milestone_start>start)"
+    r"|(?:(?P<milestone_3_months>3)|(?P<milestone_6_months>6)|(?P<milestone_9_months>9)|(?P<milestone_12_months>12))"
+    rf"(?:{_SPACE}|-)*+months?+"
+    rf"|(?P<full_plan>full{_SPACE}++plan)){_SPACE}*+{_BOLD}{_SPACE}*+:"
+    r")"
+    rf"(?:{_SPACE}*+(?:\*\*|__)|)",
+    re.IGNORECASE,
+)
+
+# "Full Plan:" anywhere, e.g. at the end of a single-line response. Case is spelled out instead of
+# re.IGNORECASE so that both alternatives start with a literal the engine can skip to.
+_PLAN_REST = rf"[uU][lL][lL]{_SPACE}++[pP][lL][aA][nN]{_SPACE}*+{_BOLD}{_SPACE}*+:(?:{_SPACE}*+(?:\*\*|__)|)"
+INLINE_FULL_PLAN_RE = re.compile(rf"f(?<![^\W_]f){_PLAN_REST}|F(?<![^\W_]F){_PLAN_REST}")
+
+
+class RoadmapSectionParser:
+    """
+    Incremental state machine behind parse_roadmap_sections.
+    feed_line() returns the (field, text) sections that the line completed.
+    """
+
+    def __init__(self):
+        self.sections = dict.fromkeys(ROADMAP_FIELDS, "")
+        self._field = None
+        self._parts = []
+        self._in_milestones = False
+
+    def feed_line(self, line):
+        return self._feed("\n" + line)
+
+    def feed_partial(self, line):
+        """
+        Look at a line that is still arriving: once it shows a label, the open section is complete.
+        The whole line must still be passed to feed_line() when it ends.
+        """
+        if self._field in (None, "full_plan"):
+            return []
+        return self._feed("\n" + line, partial=True)
+
+    def _feed(self, text, partial=False):
+        """
+        Scan text, which starts with a newline, for labels. With partial, stop once the open
+        section is closed and leave the rest of the text for the next call.
+        """
+        completed = []
+        start = 0
+        if self._field != "full_plan":
+            plan = INLINE_FULL_PLAN_RE.search(text)
+            plan_start = len(text) if plan is None else plan.start()
+            for match in LABEL_RE.finditer(text):
+                label_start = match.start()
+                if label_start > plan_start:
+                    break
+                field = match.lastgroup
+                if field == "milestones":
+                    if text[label_start] != "\n":
+                        continue
+                    self._in_milestones = True
+                elif field != "full_plan" and not self._in_milestones:
+                    continue
+                self._close_section(text[start:label_start], completed)
+                if partial:
+                    return completed
+                self._field, start = field, match.end()
+                if field == "full_plan":
+                    break
+            if plan is not None and self._field != "full_plan":
+                if text[plan_start - 2:plan_start] in ("**", "__"):
+                    plan_start -= 2
+                self._close_section(text[start:plan_start], completed)
+                if partial:
+                    return completed
+                self._field, start = "full_plan", plan.end()
+        if self._field is not None and not partial:
+            self._parts.append(text[start:])
+        return completed
+
+    def _close_section(self, tail, completed):
+        field, parts = self._field, self._parts
+        self._field, self._parts = None, []
+        # "Milestones:" is only a heading; repeated labels keep their first occurrence.
+        if field is None or field == "milestones" or self.sections[field]:
+            return
+        parts.append(tail)
+        self.sections[field] = "".join(parts).strip()
+        completed.append((field, self.sections[field]))
+
+    def finish(self):
+        """Close the open section; returns what it completed"""
+        completed = []
+        self._close_section("", completed)
+        return completed
+
+
+def parse_roadmap_sections(text_response):
+    """Parse a roadmap response in one pass. Returns (roadmap_data, missing_fields)."""
+    parser = RoadmapSectionParser()
+    parser._feed("\n" + text_response)
+    parser.finish()
+    return parser.sections, [field for field in ROADMAP_FIELDS if not parser.sections[field]]
+
+
+def parse_roadmap_json(text_response):
+    """
+    Validate a structured (JSON mode) roadmap response and return the roadmap data.
+    Raises RoadmapFormatError naming what is wrong, which goes into the repair prompt.
+    """
+    text = text_response.strip()
+    if text.startswith("```"):
+        # Tolerate a markdown code fence around the object.
+        text = text.split("\n", 1)[1] if "\n" in text else ""
+        text = text.rstrip().removesuffix("```")
+    try:
+        data = json.loads(text)
+    except ValueError as e:
+        raise RoadmapFormatError(f"the reply is not valid JSON ({e})")
+    if not isinstance(data, dict):
+        raise RoadmapFormatError("the reply must be a JSON object")
+
+    roadmap_data = {}
+    invalid = []
+    for field in ROADMAP_FIELDS:
+        value = data.get(field)
+        if isinstance(value, str) and value.strip():
+            roadmap_data[field] = value.strip()
+        else:
+            invalid.append(field)
+    if invalid:
+        raise RoadmapFormatError(f"missing or empty string fields: {', '.join(invalid)}")
+    return roadmap_data
+
+
+def load_response_corpus():
+    """[{'name', 'text', 'expected_missing'}, ...]"""
+    with open(RESPONSE_CORPUS, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def parse_roadmap_regex(text_response):
+    """
+    The original seven-regex parser, kept as the reference implementation for the parser
+    benchmark (manage.py bench_roadmap_parser) and tests.
+    """
+    roadmap_data = dict.fromkeys(ROADMAP_FIELDS, "")
+
+    milestones_match = re.search(r"Milestones:(.*?)Full Plan:", text_response, re.DOTALL | re.IGNORECASE)
+    milestones_text = ""
+    if milestones_match:
+        milestones_text = milestones_match.group(1).strip()
+
+    full_plan_match = re.search(r"Full Plan:(.*)", text_response, re.DOTALL | re.IGNORECASE)
+    if full_plan_match:
+        roadmap_data["full_plan"] = full_plan_match.group(1).strip()
+
+    if milestones_text:
+        start_match = re.search(r"- Start:(.*?)(?=(- 3 months:|- 6 months:|- 9 months:|- 12 months:|$))", milestones_text, re.DOTALL | re.IGNORECASE)
+        if start_match: roadmap_data["milestone_start"] = start_match.group(1).strip()
+
+        three_months_match = re.search(r"- 3 months:(.*?)(?=(- 6 months:|- 9 months:|- 12 months:|$))", milestones_text, re.DOTALL | re.IGNORECASE)
+        if three_months_match: roadmap_data["milestone_3_months"] = three_months_match.group(1).strip()
+
+        six_months_match = re.search(r"- 6 months:(.*?)(?=(- 9 months:|- 12 months:|$))", milestones_text, re.DOTALL | re.IGNORECASE)
+        if six_months_match: roadmap_data["milestone_6_months"] = six_months_match.group(1).strip()
+
+        nine_months_match = re.search(r"- 9 months:(.*?)(?=(- 12 months:|$))", milestones_text, re.DOTALL | re.IGNORECASE)
+        if nine_months_match: roadmap_data["milestone_9_months"] = nine_months_match.group(1).strip()
+
+        twelve_months_match = re.search(r"- 12 months:(.*)", milestones_text, re.DOTALL | re.IGNORECASE)
+        if twelve_months_match: roadmap_data["milestone_12_months"] = twelve_months_match.group(1).strip()
+
+    return roadmap_data
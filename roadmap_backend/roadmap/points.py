@@ -0,0 +1,146 @@
+"""
+Points and achievement accounting.
+
+Gamification events are appended to the PointsTransaction ledger, which never blocks other
+inserts: awarding points is insert-only and reports the persisted totals plus the pending rows.
+rollup_points folds a user's pending ledger rows into their UserPoints row: inside one
+transaction it locks the row (select_for_update), applies all deltas in memory (ledger rows,
+achievement bonuses, level) and writes the row back with a single UPDATE. That UPDATE adds the
+deltas with F() expressions and only matches the totals it read, and the pending rows are
+claimed with an UPDATE that only matches unclaimed ones; if another rollup got there first
+(possible where select_for_update is a no-op, e.g. SQLite) the transaction is rolled back and
+retried, so no points are lost or counted twice on any backend. Only reads
+(current_points, claim_new_achievements) and `manage.py rollup_points` roll up, so the
+achievements a completion unlocks are awarded on the next of those.
+"""
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Q, Subquery, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from . import metrics
+from .achievements import award_achievements
+from .models import PointsTransaction, UserPoints
+
+ROLLUP_ATTEMPTS = 5
+
+
+class RollupConflict(Exception):
+    """Another rollup changed the user's points or claimed their ledger rows first"""
+
+
+def lock_user_points(user):
+    """Return the user's UserPoints row, created if needed and locked until the transaction ends"""
+    UserPoints.objects.get_or_create(user=user)
+    return UserPoints.objects.select_for_update().get(user=user)
+
+
+def record_points(user, delta, reason, goal=None):
+    """Append a ledger row; it counts towards UserPoints at the next rollup"""
+    return PointsTransaction.objects.create(user=user, delta=delta, reason=reason, goal=goal)
+
+
+def rollup_points(user, check_achievements=False):
+    """
+    Fold the user's pending ledger rows into UserPoints and award the achievements the new
+    totals unlock (always checked with check_achievements, otherwise only when something was folded).
+    Returns (user_points, level_up, new_achievements).
+    """
+    for attempt in range(ROLLUP_ATTEMPTS):
+        try:
+            return _rollup_once(user, check_achievements)
+        except RollupConflict:
+            metrics.increment('points_rollup_conflicts')
+            if attempt == ROLLUP_ATTEMPTS - 1:
+                raise
+
+
+def _rollup_once(user, check_achievements):
+    with transaction.atomic():
+        user_points = lock_user_points(user)
+        old_level, old_total, old_goals = user_points.level, user_points.total_points, user_points.goals_completed
+        pending = list(PointsTransaction.objects.filter(user=user, rolled_up=False).values_list('id', 'delta', 'reason'))
+        for _, delta, reason in pending:
+            user_points.total_points += delta
+            if reason == PointsTransaction.REASON_GOAL_COMPLETED:
+                user_points.goals_completed += 1
+        user_points.level = user_points.calculate_level()
+
+        new_achievements = []
+        if pending or check_achievements:
+            new_achievements = award_achievements(user, user_points)
+        if new_achievements:
+            # The bonuses are already in user_points, so they go into the ledger as rolled up.
+            PointsTransaction.objects.bulk_create([
+                PointsTransaction(user=user, delta=achievement.points, reason=PointsTransaction.REASON_ACHIEVEMENT, rolled_up=True)
+                for achievement in new_achievements
+            ])
+            user_points.level = user_points.calculate_level()
+        if pending:
+            claimed = PointsTransaction.objects.filter(id__in=[row[0] for row in pending], rolled_up=False).update(rolled_up=True)
+            if claimed != len(pending):
+                raise RollupConflict()
+        if pending or new_achievements:
+            user_points.updated_at = timezone.now()
+            updated = UserPoints.objects.filter(
+                pk=user_points.pk, total_points=old_total, goals_completed=old_goals,
+            ).update(
+                total_points=F('total_points') + (user_points.total_points - old_total),
+                goals_completed=F('goals_completed') + (user_points.goals_completed - old_goals),
+                level=user_points.level,
+                updated_at=user_points.updated_at,
+            )
+            if not updated:
+                raise RollupConflict()
+    return user_points, user_points.level > old_level, new_achievements
+
+
+def current_points(user):
+    """The user's UserPoints, rolled up first only if ledger rows are pending"""
+    if PointsTransaction.objects.filter(user=user, rolled_up=False).exists():
+        return rollup_points(user)[0]
+    user_points, _ = UserPoints.objects.get_or_create(user=user)
+    return user_points
+
+
+def projected_points(user):
+    """
+    Unsaved UserPoints with the user's persisted totals plus their pending ledger rows (achievement
+    bonuses not yet awarded aside), read without locking anything - in one statement once the
+    user has a UserPoints row, so a concurrent rollup cannot be counted twice.
+    """
+    pending = PointsTransaction.objects.filter(user=OuterRef('user'), rolled_up=False).order_by().values('user')
+    user_points = UserPoints.objects.filter(user=user).annotate(
+        pending_points=Coalesce(Subquery(pending.annotate(total=Sum('delta')).values('total')), 0),
+        pending_goals=Coalesce(Subquery(pending.annotate(
+            goals=Count('id', filter=Q(reason=PointsTransaction.REASON_GOAL_COMPLETED)),
+        ).values('goals')), 0),
+    ).first()
+    if user_points is None:
+        totals = PointsTransaction.objects.filter(user=user, rolled_up=False).aggregate(
+            pending_points=Coalesce(Sum('delta'), 0),
+            pending_goals=Count('id', filter=Q(reason=PointsTransaction.REASON_GOAL_COMPLETED)),
+        )
+        user_points = UserPoints(user=user, total_points=0, goals_completed=0)
+    else:
+        totals = {'pending_points': user_points.pending_points, 'pending_goals': user_points.pending_goals}
+    user_points.total_points += totals['pending_points']
+    user_points.goals_completed += totals['pending_goals']
+    user_points.level = user_points.calculate_level()
+    return user_points
+
+
+def award_goal_completion(user, points, goal=None):
+    """
+    Record the points for a completed goal without touching UserPoints.
+    Returns (user_points, level_up) from projected_points().
+    """
+    record_points(user, points, PointsTransaction.REASON_GOAL_COMPLETED, goal)
+    user_points = projected_points(user)
+    previous_level = UserPoints(total_points=user_points.total_points - points).calculate_level()
+    return user_points, user_points.level > previous_level
+
+
+def claim_new_achievements(user):
+    """Award any achievements the user already qualifies for; returns the new ones"""
+    return rollup_points(user, check_achievements=True)[2]
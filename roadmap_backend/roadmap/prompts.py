@@ -0,0 +1,200 @@
+"""
+Prompt building for roadmap generation.
+
+The user's assessment and personality profile are rendered once into a compact, canonical
+fragment ("dimension=value; ..." in sorted order) that is cached per user in each process. The
+signal handlers in roadmap/signals.py bump a per-user (or global) generation counter in the Django
+cache when PersonalityProfile, AssessmentAnswer or AssessmentQuestion rows change; cached fragments
+from an older generation are rebuilt, in every process when the cache backend is shared, and every
+fragment is rebuilt after ROADMAP_PROFILE_FRAGMENT_TTL seconds regardless.
+Prompts are kept under ROADMAP_PROMPT_TOKEN_BUDGET input tokens by truncating goal descriptions.
+"""
+import math
+from collections import namedtuple
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .exceptions import RoadmapGenerationError
+from .lru import TTLLRUCache
+from .models import PersonalityProfile, AssessmentAnswer
+
+# Gemini's tokenizer averages about four characters of English text per token.
+CHARS_PER_TOKEN = 4
+TRUNCATION_MARKER = '…'
+PROFILE_EXCLUDED_FIELDS = ['id', 'user', 'created_at', 'updated_at']
+
+RESPONSE_FORMAT = """Milestones:
+- Start: ...
+- 3 months: ...
+- 6 months: ...
+- 9 months: ...
+- 12 months: ...
+
+Full Plan:
+..."""
+
+JSON_RESPONSE_FORMAT = (
+    "Reply with only a JSON object with exactly these keys, each a non-empty string: "
+    "milestone_start, milestone_3_months, milestone_6_months, milestone_9_months, milestone_12_months, full_plan."
+)
+
+# json_mode prompts ask Gemini for JSON (see roadmap.gemini_ai.analyze_goal_with_gemini_json).
+Prompt = namedtuple('Prompt', ['text', 'token_count', 'truncated', 'json_mode'], defaults=[False])
+
+GENERATION_CACHE_KEY = 'roadmap:profile_fragment:generation'
+USER_GENERATION_CACHE_KEY = 'roadmap:profile_fragment:generation:{}'
+
+# user id -> ((global generation, user generation), fragment)
+_fragments = TTLLRUCache(max_entries=settings.ROADMAP_PROFILE_FRAGMENT_CACHE_SIZE, ttl=settings.ROADMAP_PROFILE_FRAGMENT_TTL)
+
+
+def count_tokens(text):
+    """Estimate the number of input tokens Gemini will bill for text"""
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def _render_pairs(values):
+    return '; '.join(f'{key}={value}' for key, value in sorted(values.items()) if value)
+
+
+def build_profile_fragment(user):
+    """
+    Render the user's personality profile and assessment answers as one compact line each.
+    Assessment answers that only repeat the profile are left out.
+    Raises RoadmapGenerationError if the profile or assessment is missing.
+    """
+    try:
+        profile = PersonalityProfile.objects.get(user=user)
+    except PersonalityProfile.DoesNotExist:
+        raise RoadmapGenerationError('You must complete your assessment and personality profile before generating a roadmap.')
+
+    answers = list(AssessmentAnswer.objects.filter(user=user).select_related('question'))
+    if not answers:
+        raise RoadmapGenerationError('You must complete your assessment before generating a roadmap.')
+
+    personality_summary = {
+        field.name: getattr(profile, field.name)
+        for field in PersonalityProfile._meta.fields if field.name not in PROFILE_EXCLUDED_FIELDS
+    }
+    assessment_summary = {}
+    for answer in answers:
+        # Map the answer letter to the richer text value that the profile uses.
+        value = getattr(answer.question, f'value_{answer.answer.lower()}', answer.answer)
+        if personality_summary.get(answer.question.dimension) != value:
+            assessment_summary[answer.question.dimension] = value
+
+    fragment = f'Profile: {_render_pairs(personality_summary)}'
+    if assessment_summary:
+        fragment += f'\nOther assessment answers: {_render_pairs(assessment_summary)}'
+    return fragment
+
+
+def _generations(user_id):
+    keys = [GENERATION_CACHE_KEY, USER_GENERATION_CACHE_KEY.format(user_id)]
+    values = cache.get_many(keys)
+    return tuple(values.get(key, 0) for key in keys)
+
+
+def _bump_generation(key, timeout):
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, 1, timeout=timeout)
+
+
+def profile_fragment(user):
+    """Cached build_profile_fragment(user)"""
+    generations = _generations(user.pk)
+    cached = _fragments.get(user.pk)
+    if cached is not None and cached[0] == generations:
+        return cached[1]
+    fragment = build_profile_fragment(user)
+    _fragments.set(user.pk, (generations, fragment))
+    return fragment
+
+
+def invalidate_profile_fragment(user_id=None):
+    """Forget the cached fragment for one user, or for everyone when user_id is None, in every process"""
+    if user_id is None:
+        _fragments.clear()
+        _bump_generation(GENERATION_CACHE_KEY, timeout=None)
+    else:
+        _fragments.delete(user_id)
+        # Once the counter expires every fragment cached before the bump has expired too.
+        _bump_generation(USER_GENERATION_CACHE_KEY.format(user_id), timeout=settings.ROADMAP_PROFILE_FRAGMENT_TTL)
+
+
+def truncate_to_tokens(text, max_tokens):
+    """Cut text to roughly max_tokens, preferring a word boundary"""
+    text = text or ''
+    if count_tokens(text) <= max_tokens:
+        return text, False
+    limit = max(0, max_tokens * CHARS_PER_TOKEN - len(TRUNCATION_MARKER))
+    cut = text[:limit]
+    if ' ' in cut:
+        cut = cut[:cut.rindex(' ')]
+    return cut.rstrip() + TRUNCATION_MARKER, True
+
+
+def _fit_descriptions(render, descriptions, json_mode=False):
+    """
+    Render the prompt with descriptions truncated so the whole prompt fits the token budget.
+    render(descriptions) must return the prompt text.
+    """
+    budget = settings.ROADMAP_PROMPT_TOKEN_BUDGET
+    text = render(descriptions)
+    if count_tokens(text) <= budget:
+        return Prompt(text, count_tokens(text), False, json_mode)
+
+    fixed_tokens = count_tokens(render([''] * len(descriptions)))
+    per_description = max(0, (budget - fixed_tokens) // max(1, len(descriptions)))
+    truncated = [truncate_to_tokens(description, per_description)[0] for description in descriptions]
+    text = render(truncated)
+    return Prompt(text, count_tokens(text), True, json_mode)
+
+
+def build_roadmap_prompt(goal_title, category, description, fragment, json_mode=False):
+    """Compose the Gemini prompt for a single goal; json_mode asks for a JSON object instead of text"""
+    response_format = JSON_RESPONSE_FORMAT if json_mode else f"Use exactly this format:\n{RESPONSE_FORMAT}"
+
+    def render(descriptions):
+        return (
+            f"Goal: {goal_title}\n"
+            f"Category: {category}\n"
+            f"Description: {descriptions[0]}\n"
+            f"{fragment}\n"
+            "Write a 1-year roadmap for this user: 5 milestones (Start, 3 months, 6 months, 9 months, 12 months) "
+            f"and a detailed full plan. {response_format}"
+        )
+    return _fit_descriptions(render, [description or ''], json_mode)
+
+
+def build_repair_prompt(prompt, response_text, error):
+    """Ask Gemini to correct a JSON reply that failed validation"""
+    previous, _ = truncate_to_tokens(response_text, settings.ROADMAP_PROMPT_TOKEN_BUDGET)
+    text = (
+        f"{prompt.text}\n\n"
+        f"Your previous reply was rejected: {error}.\n"
+        f"Previous reply:\n{previous}\n\n"
+        f"Reply again. {JSON_RESPONSE_FORMAT}"
+    )
+    return Prompt(text, count_tokens(text), prompt.truncated, True)
+
+
+def build_batch_roadmap_prompt(goals, fragment):
+    """Compose one prompt for several goals that shares the user's profile fragment"""
+    def render(descriptions):
+        sections = '\n'.join(
+            f"=== GOAL {goal.id} ===\nTitle: {goal.title}\nCategory: {goal.category}\nDescription: {description}"
+            for goal, description in zip(goals, descriptions)
+        )
+        return (
+            f"{sections}\n"
+            f"{fragment}\n"
+            "For each goal above, write a 1-year roadmap for this user: 5 milestones (Start, 3 months, 6 months, "
+            "9 months, 12 months) and a detailed full plan. Start each goal's section with its header line exactly "
+            f"as given (for example \"=== GOAL {goals[0].id} ===\") and format each section as:\n"
+            f"{RESPONSE_FORMAT}"
+        )
+    return _fit_descriptions(render, [goal.description or '' for goal in goals])
@@ -0,0 +1,103 @@
+import hashlib
+import itertools
+import json
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from . import metrics
+from .lru import TTLLRUCache
+from .models import RoadmapCacheEntry
+
+# In-process tier in front of the RoadmapCacheEntry table.
+_memory = TTLLRUCache(settings.ROADMAP_CACHE_MEMORY_ENTRIES, settings.ROADMAP_CACHE_TTL)
+
+# Stores made by this process; every ROADMAP_CACHE_EVICT_EVERY-th one trims the table.
+_stores = itertools.count(1)
+
+
+def roadmap_cache_key(model_name, **prompt_inputs):
+    """
+    Canonical hash of everything that shapes a roadmap prompt.
+    Dicts are serialised with sorted keys so the key does not depend on insertion order.
+    """
+    payload = json.dumps(
+        {'model': model_name, 'inputs': prompt_inputs},
+        sort_keys=True, separators=(',', ':'), default=str,
+    )
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def get_cached_response(key, record_stats=True):
+    """
+    Return the cached Gemini response text for key, or None on a miss.
+    Pass record_stats=False for internal polling that should not skew the hit/miss counters.
+    """
+    text = _memory.get(key)
+    if text is not None:
+        if record_stats:
+            metrics.increment('roadmap_cache_memory_hits')
+        return text
+
+    cutoff = timezone.now() - timedelta(seconds=settings.ROADMAP_CACHE_TTL)
+    entry = RoadmapCacheEntry.objects.filter(key=key, created_at__gte=cutoff).only('response_text', 'last_accessed_at').first()
+    if entry is None:
+        if record_stats:
+            metrics.increment('roadmap_cache_misses')
+        return None
+
+    if record_stats:
+        metrics.increment('roadmap_cache_db_hits')
+    # The eviction order only needs coarse recency, so a hot entry is not rewritten on every hit.
+    now = timezone.now()
+    if now - entry.last_accessed_at >= timedelta(seconds=settings.ROADMAP_CACHE_TOUCH_INTERVAL):
+        RoadmapCacheEntry.objects.filter(pk=entry.pk).update(last_accessed_at=now)
+    _memory.set(key, entry.response_text)
+    return entry.response_text
+
+
+def store_response(key, model_name, text):
+    """
+    Save a Gemini response in both tiers. Every ROADMAP_CACHE_EVICT_EVERY-th store trims the table
+    back to its size bound, so the bound may be overshot by that many rows per process in between.
+    """
+    _memory.set(key, text)
+    now = timezone.now()
+    RoadmapCacheEntry.objects.update_or_create(
+        key=key,
+        defaults={'model_name': model_name, 'response_text': text, 'created_at': now, 'last_accessed_at': now},
+    )
+    if next(_stores) % settings.ROADMAP_CACHE_EVICT_EVERY == 0:
+        evict_expired_and_overflow()
+
+
+def evict_response(key):
+    """Drop key from this process's memory tier and from the table"""
+    _memory.delete(key)
+    RoadmapCacheEntry.objects.filter(key=key).delete()
+
+
+def evict_expired_and_overflow():
+    """Delete expired rows, then the least recently used rows beyond ROADMAP_CACHE_DB_ENTRIES"""
+    cutoff = timezone.now() - timedelta(seconds=settings.ROADMAP_CACHE_TTL)
+    RoadmapCacheEntry.objects.filter(created_at__lt=cutoff).delete()
+
+    overflow = RoadmapCacheEntry.objects.order_by('-last_accessed_at').values_list('pk', flat=True)[settings.ROADMAP_CACHE_DB_ENTRIES:]
+    overflow_ids = list(overflow)
+    if overflow_ids:
+        RoadmapCacheEntry.objects.filter(pk__in=overflow_ids).delete()
+
+
+def clear_memory_cache():
+    _memory.clear()
+
+
+def cache_stats():
+    """Hit/miss counters for both tiers"""
+    return {
+        'memory_hits': metrics.get_counter('roadmap_cache_memory_hits'),
+        'db_hits': metrics.get_counter('roadmap_cache_db_hits'),
+        'misses': metrics.get_counter('roadmap_cache_misses'),
+        'memory_entries': len(_memory),
+    }
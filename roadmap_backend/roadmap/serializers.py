@@ -1,16 +1,26 @@
 from rest_framework import serializers
 from django.contrib.auth import get_user_model
-from .models import Goal, PersonalityProfile, RoadmapStep, Resource, AssessmentQuestion, UserAchievement, UserPoints, Achievement
+from .models import Goal, PersonalityProfile, RoadmapStep, Resource, AssessmentQuestion, UserAchievement, UserPoints, Achievement, PointsTransaction
+from .timing import timed
 
 User = get_user_model()
 
-class UserSerializer(serializers.ModelSerializer):
+
+class TimedModelSerializer(serializers.ModelSerializer):
+    """ModelSerializer whose output time is reported as the 'serializer' phase of the request"""
+
+    def to_representation(self, instance):
+        with timed('serializer'):
+            return super().to_representation(instance)
+
+
+class UserSerializer(TimedModelSerializer):
     class Meta:
         model = User
         fields = ['id', 'username', 'email']
 
 
-class PersonalityProfileSerializer(serializers.ModelSerializer):
+class PersonalityProfileSerializer(TimedModelSerializer):
     user = UserSerializer(read_only=True)
 
     class Meta:
@@ -18,21 +28,33 @@ class PersonalityProfileSerializer(serializers.ModelSerializer):
         exclude = ['created_at', 'updated_at']
 
 
-class RoadmapStepSerializer(serializers.ModelSerializer):
+class RoadmapStepSerializer(TimedModelSerializer):
     class Meta:
         model = RoadmapStep
         fields = '__all__'
         read_only_fields = ['created_at']
 
 
-class ResourceSerializer(serializers.ModelSerializer):
+class ResourceSerializer(TimedModelSerializer):
     class Meta:
         model = Resource
         fields = '__all__'
         read_only_fields = ['created_at']
 
 
-class GoalSerializer(serializers.ModelSerializer):
+class SparseFieldsetMixin:
+    """Accepts fields= and exclude= (lists of field names) to serialize only part of each object"""
+
+    def __init__(self, *args, fields=None, exclude=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+        for name in exclude or []:
+            self.fields.pop(name, None)
+
+
+class GoalSerializer(SparseFieldsetMixin, TimedModelSerializer):
     user = UserSerializer(read_only=True)
     steps = RoadmapStepSerializer(many=True, read_only=True)
     resources = ResourceSerializer(many=True, read_only=True)
@@ -43,24 +65,39 @@ class GoalSerializer(serializers.ModelSerializer):
         read_only_fields = ['created_at', 'updated_at']
 
 
-class AssessmentQuestionSerializer(serializers.ModelSerializer):
+class GoalSummarySerializer(SparseFieldsetMixin, TimedModelSerializer):
+    """Goal list entry for dashboards: no nested relations and none of the roadmap text"""
+
+    class Meta:
+        model = Goal
+        fields = ['id', 'title', 'category', 'is_completed', 'created_at', 'updated_at']
+        read_only_fields = fields
+
+
+class AssessmentQuestionSerializer(TimedModelSerializer):
     class Meta:
         model = AssessmentQuestion
         fields = '__all__'
 
-class UserPointsSerializer(serializers.ModelSerializer):
+class UserPointsSerializer(TimedModelSerializer):
     class Meta:
         model = UserPoints
         fields = ['id', 'user', 'total_points', 'level', 'goals_completed', 'created_at', 'updated_at']
         read_only_fields = ['created_at', 'updated_at']
 
-class AchievementSerializer(serializers.ModelSerializer):
+class PointsTransactionSerializer(TimedModelSerializer):
+    class Meta:
+        model = PointsTransaction
+        fields = ['id', 'delta', 'reason', 'goal', 'created_at']
+        read_only_fields = fields
+
+class AchievementSerializer(TimedModelSerializer):
     class Meta:
         model = Achievement
         fields = '__all__'
         read_only_fields = ['created_at']
 
-class UserAchievementSerializer(serializers.ModelSerializer):
+class UserAchievementSerializer(TimedModelSerializer):
     achievement = AchievementSerializer(read_only=True)
     
     class Meta:
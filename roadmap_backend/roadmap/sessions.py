@@ -0,0 +1,80 @@
+"""
+Cache-fronted session backend that skips database writes which only move timestamps.
+
+With SESSION_SAVE_EVERY_REQUEST and django_session_timeout's sliding expiry, every request
+changes the session (the middleware re-stamps _session_init_timestamp_), so the stock backends
+UPDATE django_session on every hit. This store compares the session without its activity
+stamps against what was loaded: when only the stamps moved, the session is written to the cache
+alone, and the database copy (including expire_date) is refreshed at most every
+SESSION_DB_WRITE_INTERVAL seconds. Any other change - login, logout, set_expiry, the profile
+retry counters - is written through at once.
+
+If the cache loses a session, the database copy is at most SESSION_DB_WRITE_INTERVAL seconds
+behind, so keep that well under SESSION_EXPIRE_SECONDS. The cache must be shared by every
+process (Redis, Memcached): check_session_cache refuses a per-process LocMemCache.
+"""
+import time
+
+from django.conf import settings
+from django.contrib.sessions.backends.cached_db import SessionStore as CachedDBStore
+from django.core import checks
+from django.core.cache.backends.locmem import LocMemCache
+
+from . import metrics
+
+# django_session_timeout's activity stamp, and when this store last wrote the database row
+ACTIVITY_KEY = '_session_init_timestamp_'
+SYNCED_AT_KEY = '_session_synced_at_'
+VOLATILE_KEYS = frozenset([ACTIVITY_KEY, SYNCED_AT_KEY])
+
+PROCESS_LOCAL_CACHES = (LocMemCache,)
+
+
+def check_session_cache(app_configs=None, **kwargs):
+    """This engine keeps live session state in the cache, so that cache must not be per-process"""
+    if settings.SESSION_ENGINE != __name__:
+        return []
+    from django.core.cache import caches
+    if not isinstance(caches[settings.SESSION_CACHE_ALIAS], PROCESS_LOCAL_CACHES):
+        return []
+    return [checks.Error(
+        f"SESSION_ENGINE '{__name__}' needs a cache shared by all processes, but cache "
+        f"'{settings.SESSION_CACHE_ALIAS}' is local to each process.",
+        hint="Set REDIS_URL (or point SESSION_CACHE_ALIAS at Redis/Memcached), or use "
+             "'django.contrib.sessions.backends.db'.",
+        id='roadmap.E001',
+    )]
+
+
+class SessionStore(CachedDBStore):
+    cache_key_prefix = 'roadmap.sessions'
+
+    _loaded_state = None
+
+    def _state(self, data):
+        """The session without its activity stamps, serialized for comparison"""
+        return self.serializer().dumps({key: value for key, value in data.items() if key not in VOLATILE_KEYS})
+
+    def load(self):
+        data = super().load()
+        self._loaded_state = self._state(data)
+        return data
+
+    def _needs_db_write(self, data):
+        if self._loaded_state is None or self._state(data) != self._loaded_state:
+            return True
+        return time.time() - data.get(SYNCED_AT_KEY, 0) >= settings.SESSION_DB_WRITE_INTERVAL
+
+    def save(self, must_create=False):
+        if self.session_key is None:
+            return self.create()
+        data = self._get_session(no_load=must_create)
+        if must_create or self._needs_db_write(data):
+            data[SYNCED_AT_KEY] = time.time()
+            super().save(must_create=must_create)
+            self._loaded_state = self._state(data)
+            metrics.increment('session_db_writes')
+            return
+        # Only the activity stamp moved: the cache copy, which the next request reads first, is enough.
+        self._cache.set(self.cache_key, data, self.get_expiry_age())
+        metrics.increment('session_db_writes_skipped')
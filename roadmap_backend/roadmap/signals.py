@@ -0,0 +1,63 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.signals import user_logged_out
+from django.core.handlers.asgi import ASGIHandler
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.signals import request_started
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from .achievements import invalidate_achievement_catalog
+from .authentication import invalidate_token, invalidate_user_tokens
+from .catalog import invalidate_question_catalog
+from .jobs import get_worker
+from .models import PersonalityProfile, AssessmentAnswer, AssessmentQuestion, Achievement
+from .prompts import invalidate_profile_fragment
+
+
+@receiver([post_save, post_delete], sender=PersonalityProfile)
+@receiver([post_save, post_delete], sender=AssessmentAnswer)
+def invalidate_user_profile_fragment(sender, instance, **kwargs):
+    invalidate_profile_fragment(instance.user_id)
+
+
+@receiver([post_save, post_delete], sender=AssessmentQuestion)
+def invalidate_all_profile_fragments(sender, instance, **kwargs):
+    # Answer values come from the question rows, so every cached fragment and the catalog may be stale.
+    invalidate_profile_fragment()
+    invalidate_question_catalog()
+
+
+@receiver([post_save, post_delete], sender=Achievement)
+def invalidate_achievements(sender, instance, **kwargs):
+    invalidate_achievement_catalog()
+
+
+@receiver([post_save, post_delete], sender=Token)
+def invalidate_cached_token(sender, instance, **kwargs):
+    invalidate_token(instance.key)
+
+
+@receiver(post_save, sender=get_user_model())
+def invalidate_cached_user_tokens(sender, instance, created=False, update_fields=None, **kwargs):
+    # Logging in only stamps last_login; anything else may be a password change or deactivation.
+    if created or (update_fields is not None and set(update_fields) <= {'last_login'}):
+        return
+    invalidate_user_tokens(instance.pk)
+
+
+@receiver(user_logged_out)
+def invalidate_tokens_on_logout(sender, request, user, **kwargs):
+    if user is not None:
+        invalidate_user_tokens(user.pk)
+
+
+@receiver(request_started, dispatch_uid='roadmap_start_job_workers')
+def start_job_workers(sender, **kwargs):
+    # The workers start with the first request a WSGI/ASGI server hands to Django; their first pass
+    # requeues jobs orphaned before a restart. Management commands, scripts and the test client
+    # never start them; process_roadmap_jobs runs them explicitly.
+    if settings.ROADMAP_JOB_AUTOSTART and issubclass(sender, (WSGIHandler, ASGIHandler)):
+        request_started.disconnect(dispatch_uid='roadmap_start_job_workers')
+        get_worker().start()
@@ -0,0 +1,145 @@
+"""
+Single-flight coalescing: concurrent calls for the same key share one execution.
+
+Within a process, callers that arrive while a call for their key is in flight wait for it and
+receive its result (or exception). Across processes, the first caller takes a RoadmapLease row;
+callers in other processes poll a `remote_result` function (e.g. a cache lookup) until the lease
+holder has published its result, and take over if the lease is released or expires without one.
+"""
+import asyncio
+import threading
+import time
+import uuid
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from . import metrics
+from .models import RoadmapLease
+
+
+def acquire_lease(key, owner):
+    """Take the lease for key, or an expired one; returns True if owner now holds it"""
+    now = timezone.now()
+    expires_at = now + timedelta(seconds=settings.ROADMAP_SINGLEFLIGHT_LEASE_SECONDS)
+    try:
+        with transaction.atomic():
+            RoadmapLease.objects.create(key=key, owner=owner, expires_at=expires_at)
+        return True
+    except IntegrityError:
+        return RoadmapLease.objects.filter(key=key, expires_at__lt=now).update(owner=owner, expires_at=expires_at) == 1
+
+
+def release_lease(key, owner):
+    RoadmapLease.objects.filter(key=key, owner=owner).delete()
+
+
+class _Call:
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    def __init__(self, name):
+        self.name = name
+        self._calls = {}
+        self._futures = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, fn, remote_result=None):
+        """Run fn() once for all concurrent callers with this key and return its result"""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            metrics.increment(f'{self.name}_coalesced')
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = self._run_with_lease(key, fn, remote_result)
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.event.set()
+        return call.result
+
+    def _run_with_lease(self, key, fn, remote_result):
+        metrics.increment(f'{self.name}_calls')
+        owner = uuid.uuid4().hex
+        while True:
+            if acquire_lease(key, owner):
+                try:
+                    return fn()
+                finally:
+                    release_lease(key, owner)
+            if remote_result is not None:
+                result = remote_result()
+                if result is not None:
+                    metrics.increment(f'{self.name}_remote_coalesced')
+                    return result
+            time.sleep(settings.ROADMAP_SINGLEFLIGHT_POLL_INTERVAL)
+
+    async def ado(self, key, fn, remote_result=None):
+        """Async variant of do(); fn is a coroutine function and remote_result a sync callable"""
+        while (future := self._futures.get(key)) is not None:
+            metrics.increment(f'{self.name}_coalesced')
+            try:
+                return await asyncio.shield(future)
+            except asyncio.CancelledError:
+                # The leader was cancelled (e.g. its client disconnected): try again, taking over if
+                # nobody else has. A cancellation of this caller leaves the future alone and propagates.
+                if not future.cancelled():
+                    raise
+
+        future = self._futures[key] = asyncio.get_running_loop().create_future()
+        try:
+            result = await self._arun_with_lease(key, fn, remote_result)
+        except Exception as e:
+            future.set_exception(e)
+            # Mark retrieved so an unawaited failure does not log "exception was never retrieved".
+            future.exception()
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            del self._futures[key]
+            if not future.done():
+                future.cancel()
+
+    async def _arun_with_lease(self, key, fn, remote_result):
+        metrics.increment(f'{self.name}_calls')
+        owner = uuid.uuid4().hex
+        while True:
+            if await sync_to_async(acquire_lease)(key, owner):
+                try:
+                    return await fn()
+                finally:
+                    await sync_to_async(release_lease)(key, owner)
+            if remote_result is not None:
+                result = await sync_to_async(remote_result)()
+                if result is not None:
+                    metrics.increment(f'{self.name}_remote_coalesced')
+                    return result
+            await asyncio.sleep(settings.ROADMAP_SINGLEFLIGHT_POLL_INTERVAL)
+
+    def stats(self):
+        return {
+            'calls': metrics.get_counter(f'{self.name}_calls'),
+            'coalesced': metrics.get_counter(f'{self.name}_coalesced'),
+            'remote_coalesced': metrics.get_counter(f'{self.name}_remote_coalesced'),
+        }
@@ -1,3 +1,1836 @@
-from django.test import TestCase
+import asyncio
+import io
+import itertools
+import json
+import re
+import statistics
+import threading
+import time
+from datetime import timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
 
-# Create your tests here.
+import requests
+
+from django.core.management import call_command
+from django.conf import settings
+from django.contrib.sessions.models import Session
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import Count, F
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings, skipUnlessDBFeature
+from django.test.utils import CaptureQueriesContext
+from django.contrib.auth import get_user_model
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.test import APIClient
+
+from . import achievements, http_client, jobs, leaderboard, metrics, roadmap_cache, sessions, signals, timing
+from .sessions import SessionStore
+from .points import award_goal_completion, record_points, rollup_points
+from .authentication import CachedTokenAuthentication, clear_token_cache
+from .catalog import get_question_catalog, invalidate_question_catalog
+from .gemini_ai import analyze_goal_with_gemini
+from .fields import RAW, ZLIB, compress_text, decompress_text
+from .lru import TTLLRUCache
+from .models import (
+    Goal, RoadmapStep, Resource, UserPoints, UserAchievement, PersonalityProfile, AssessmentQuestion, AssessmentAnswer, RoadmapCacheEntry, RoadmapJob, RoadmapLease,
+    PointsTransaction,
+)
+from .exceptions import RoadmapFormatError, RoadmapGenerationError
+from .generation import (
+    RoadmapStreamParser, generate_roadmap_for_goal, parse_gemini_roadmap_response, parse_batch_roadmap_response, prepare_roadmap_prompt,
+    roadmap_flight,
+)
+from .parsing import ROADMAP_FIELDS, RoadmapSectionParser, load_response_corpus, parse_roadmap_json, parse_roadmap_regex, parse_roadmap_sections
+from .serializers import GoalSerializer
+from .singleflight import SingleFlight
+from . import prompts
+from .gemini_client import AdaptiveLimiter, GeminiClientManager, GeminiUnavailable, set_client
+from .gemini_fake import FakeGeminiError, FakeGeminiModel, latency_distribution
+from .management.commands.loadtest import ROUTES as LOADTEST_ROUTES, Command as LoadTestCommand, percentile
+
+User = get_user_model()
+
+SAMPLE_ROADMAP_RESPONSE = """Milestones:
+- Start: Pick a course and set up a study schedule.
+- 3 months: Finish the fundamentals module.
+- 6 months: Build a first portfolio project.
+- 9 months: Contribute to an open-source project.
+- 12 months: Apply for junior developer roles.
+
+Full Plan:
+Study five hours a week and review progress monthly.
+"""
+
+
+def create_assessed_user(username='alice'):
+    """Create a user with a personality profile, one assessment answer and a goal"""
+    user = User.objects.create_user(username=username, password='pass12345')
+    PersonalityProfile.objects.create(
+        user=user, problem_solving='creative', goal_energy='social', strengths='empathy',
+        change_response='planner', goal_motivation='values', daily_motivation='growth',
+        core_belief='curiosity', time_structure='routine', environment_preference='quiet_focus',
+        progress_block='support', obstacle_type='starting', future_focus='freedom',
+        success_definition='mastery', project_style='break_down', support_type='mentor',
+    )
+    question, _ = AssessmentQuestion.objects.get_or_create(
+        question_id=1,
+        defaults=dict(
+            dimension='problem_solving', text='How do you approach problems?',
+            option_a='A', option_b='B', option_c='C', option_d='D',
+            value_a='creative', value_b='analytical', value_c='collaborative', value_d='action-oriented',
+        ),
+    )
+    AssessmentAnswer.objects.create(user=user, question=question, answer='a')
+    goal = Goal.objects.create(user=user, title='Become a developer', description='Learn to code', category='career')
+    return user, goal
+
+
+class ParseRoadmapResponseTests(TestCase):
+    def test_extracts_all_milestones_and_plan(self):
+        parsed = parse_gemini_roadmap_response(SAMPLE_ROADMAP_RESPONSE)
+        self.assertEqual(parsed['milestone_start'], 'Pick a course and set up a study schedule.')
+        self.assertEqual(parsed['milestone_12_months'], 'Apply for junior developer roles.')
+        self.assertEqual(parsed['full_plan'], 'Study five hours a week and review progress monthly.')
+
+    def test_corpus_matches_regex_parser_and_reports_missing_sections(self):
+        for entry in load_response_corpus():
+            with self.subTest(entry['name']):
+                sections, missing = parse_roadmap_sections(entry['text'])
+                self.assertEqual(missing, entry['expected_missing'])
+                for field, value in parse_roadmap_regex(entry['text']).items():
+                    if value:
+                        self.assertEqual(sections[field], value)
+
+    def test_tolerates_markdown_bold_and_numbering(self):
+        sections, missing = parse_roadmap_sections(
+            "## Milestones\n1. **Start:** Begin.\n2) __3 Months__: Keep going.\n* 6-month: Halfway.\n"
+            "- **9 months**: Nearly.\n### 12 Months: Done.\n**Full Plan:**\nThe plan.\n- Start: not a label here"
+        )
+        self.assertEqual(missing, [])
+        self.assertEqual(sections['milestone_start'], 'Begin.')
+        self.assertEqual(sections['milestone_3_months'], 'Keep going.')
+        self.assertEqual(sections['milestone_6_months'], 'Halfway.')
+        self.assertEqual(sections['milestone_9_months'], 'Nearly.')
+        self.assertEqual(sections['milestone_12_months'], 'Done.')
+        self.assertEqual(sections['full_plan'], 'The plan.\n- Start: not a label here')
+
+    def test_finds_labels_that_share_a_line(self):
+        sections, missing = parse_roadmap_sections(
+            "Milestones: - Start: a - 3 months: b - 6-month: c • 9 Months: d - 12 months: e Full Plan: x - Start: y"
+        )
+        self.assertEqual(missing, [])
+        self.assertEqual([sections[field] for field in ROADMAP_FIELDS], ['a', 'b', 'c', 'd', 'e', 'x - Start: y'])
+
+    def test_ignores_milestone_labels_before_the_milestones_heading(self):
+        sections, missing = parse_roadmap_sections(
+            "Start: let me explain the plan.\n\nMilestones:\n- Start: Begin.\n- 3 months: Keep going.\nFull Plan: The plan."
+        )
+        self.assertEqual(sections['milestone_start'], 'Begin.')
+        self.assertEqual(missing, ['milestone_6_months', 'milestone_9_months', 'milestone_12_months'])
+
+    def test_long_whitespace_runs_parse_in_linear_time(self):
+        text = "Milestones:\n" + " " * 200_000 + "x\n- Start:" + "\t" * 200_000 + "a\nFull Plan: y"
+        started = time.perf_counter()
+        sections, _ = parse_roadmap_sections(text)
+        self.assertLess(time.perf_counter() - started, 1)
+        self.assertEqual((sections['milestone_start'], sections['full_plan']), ('a', 'y'))
+
+    def test_whole_text_parse_matches_the_line_parser(self):
+        texts = [entry['text'] for entry in load_response_corpus()]
+        texts += [text * 3 for text in texts] + [
+            "Start: first line\n3 months:\n\n   indented\r\n6 Months:** bold tail\nFull Plan:",
+            "\n\nMilestones:\nStart: a\nStart: repeated\n" + " " * 70 + "9 months: too far in\n12 months: b",
+            "Start:\n3 months:\nStart: filled by the repeat", "", "\n", "Full Plan: only the plan\n12 months: inside the plan",
+        ]
+        for text in texts:
+            with self.subTest(text[:40]):
+                parser = RoadmapSectionParser()
+                for line in text.split("\n"):
+                    parser.feed_line(line)
+                parser.finish()
+                sections, _ = parse_roadmap_sections(text)
+                self.assertEqual(sections, parser.sections)
+
+
+@override_settings(ROADMAP_JOB_AUTOSTART=False)
+class GenerateRoadmapTests(TestCase):
+    def setUp(self):
+        roadmap_cache.clear_memory_cache()
+        self.user, self.goal = create_assessed_user()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    @mock.patch('roadmap.generation.analyze_goal_with_gemini', return_value=SAMPLE_ROADMAP_RESPONSE)
+    def test_generate_roadmap_queues_job_and_saves_milestones(self, gemini):
+        response = self.client.post('/api/goals/generate-roadmap/', {'goal_id': self.goal.id}, format='json')
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.data['status'], 'queued')
+        gemini.assert_not_called()
+
+        self.assertEqual(jobs.run_pending_jobs(), 1)
+        self.goal.refresh_from_db()
+        self.assertEqual(self.goal.milestone_6_months, 'Build a first portfolio project.')
+        gemini.assert_called_once()
+
+        status_response = self.client.get(f'/api/goals/generate-roadmap/jobs/{response.data["job_id"]}/')
+        self.assertEqual(status_response.data['status'], 'done')
+        self.assertEqual(status_response.data['goal']['milestone_start'], 'Pick a course and set up a study schedule.')
+
+    def test_generate_roadmap_requires_goal_id(self):
+        response = self.client.post('/api/goals/generate-roadmap/', {}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+
+class AsyncGenerateRoadmapLoadTests(TestCase):
+    """Load test: concurrent requests against a slow, stubbed Gemini must overlap on one event loop."""
+
+    CONCURRENCY = 50
+    ARRIVAL_TIMEOUT = 10
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user, cls.goal = create_assessed_user()
+        cls.token = Token.objects.create(user=cls.user)
+        # Distinct goals so the requests are not coalesced into one Gemini call.
+        cls.goals = [
+            Goal.objects.create(user=cls.user, title=f'Goal {i}', description='Load test', category='career')
+            for i in range(cls.CONCURRENCY)
+        ]
+
+    def setUp(self):
+        roadmap_cache.clear_memory_cache()
+
+    async def test_requests_are_not_capped_by_worker_count(self):
+        in_flight = 0
+        peak = 0
+        all_arrived = asyncio.Event()
+
+        async def slow_gemini(prompt):
+            # Hold every call until all of them are in flight; serialised requests would time out here.
+            nonlocal in_flight, peak
+            in_flight += 1
+            peak = max(peak, in_flight)
+            if in_flight == self.CONCURRENCY:
+                all_arrived.set()
+            await asyncio.wait_for(all_arrived.wait(), self.ARRIVAL_TIMEOUT)
+            in_flight -= 1
+            return SAMPLE_ROADMAP_RESPONSE
+
+        headers = {'Authorization': f'Token {self.token.key}'}
+        with mock.patch('roadmap.generation.analyze_goal_with_gemini_async', slow_gemini):
+            responses = await asyncio.gather(*[
+                self.async_client.post(
+                    '/api/goals/generate-roadmap/async/', {'goal_id': goal.id, 'goal': goal.title},
+                    content_type='application/json', headers=headers,
+                )
+                for goal in self.goals
+            ])
+
+        self.assertTrue(all(r.status_code == 200 for r in responses))
+        self.assertEqual(peak, self.CONCURRENCY)
+
+    async def test_identical_requests_share_one_gemini_call(self):
+        calls = 0
+
+        async def slow_gemini(prompt):
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(0.2)
+            return SAMPLE_ROADMAP_RESPONSE
+
+        headers = {'Authorization': f'Token {self.token.key}'}
+        before = roadmap_flight.stats()['coalesced']
+        with mock.patch('roadmap.generation.analyze_goal_with_gemini_async', slow_gemini):
+            responses = await asyncio.gather(*[
+                self.async_client.post(
+                    '/api/goals/generate-roadmap/async/', {'goal_id': self.goal.id},
+                    content_type='application/json', headers=headers,
+                )
+                for _ in range(5)
+            ])
+
+        self.assertTrue(all(r.status_code == 200 for r in responses))
+        self.assertEqual(calls, 1)
+        self.assertEqual(roadmap_flight.stats()['coalesced'], before + 4)
+
+    async def test_rejects_unauthenticated_requests(self):
+        response = await self.async_client.post(
+            '/api/goals/generate-roadmap/async/', {'goal_id': self.goal.id}, content_type='application/json',
+        )
+        self.assertEqual(response.status_code, 401)
+
+
+class TTLLRUCacheTests(TestCase):
+    def test_evicts_least_recently_used(self):
+        cache = TTLLRUCache(max_entries=2, ttl=60)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.get('a')
+        cache.set('c', 3)
+        self.assertEqual(cache.get('a'), 1)
+        self.assertIsNone(cache.get('b'))
+
+    def test_expires_entries(self):
+        cache = TTLLRUCache(max_entries=2, ttl=0)
+        cache.set('a', 1)
+        self.assertIsNone(cache.get('a'))
+
+
+@override_settings(ROADMAP_JOB_AUTOSTART=False)
+class RoadmapCacheTests(TestCase):
+    def setUp(self):
+        roadmap_cache.clear_memory_cache()
+        self.user, self.goal = create_assessed_user()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_key_is_independent_of_dict_order(self):
+        first = roadmap_cache.roadmap_cache_key('m', profile={'a': 1, 'b': 2}, title='x')
+        second = roadmap_cache.roadmap_cache_key('m', title='x', profile={'b': 2, 'a': 1})
+        self.assertEqual(first, second)
+        self.assertNotEqual(first, roadmap_cache.roadmap_cache_key('other-model', profile={'a': 1, 'b': 2}, title='x'))
+
+    @mock.patch('roadmap.generation.analyze_goal_with_gemini', return_value=SAMPLE_ROADMAP_RESPONSE)
+    def test_repeated_generate_is_served_from_cache(self, gemini):
+        payload = {'goal_id': self.goal.id, 'goal': 'Become a developer', 'category': 'career'}
+        self.client.post('/api/goals/generate-roadmap/', payload, format='json')
+        jobs.run_pending_jobs()
+        before = roadmap_cache.cache_stats()
+        self.client.post('/api/goals/generate-roadmap/', payload, format='json')
+        jobs.run_pending_jobs()
+
+        self.goal.refresh_from_db()
+        self.assertEqual(self.goal.milestone_start, 'Pick a course and set up a study schedule.')
+        gemini.assert_called_once()
+        self.assertEqual(roadmap_cache.cache_stats()['memory_hits'], before['memory_hits'] + 1)
+
+    @mock.patch('roadmap.generation.analyze_goal_with_gemini', return_value=SAMPLE_ROADMAP_RESPONSE)
+    def test_db_tier_survives_process_cache_loss(self, gemini):
+        payload = {'goal_id': self.goal.id, 'description': 'Learn to code'}
+        self.client.post('/api/goals/generate-roadmap/', payload, format='json')
+        jobs.run_pending_jobs()
+        roadmap_cache.clear_memory_cache()
+        before = roadmap_cache.cache_stats()
+        self.client.post('/api/goals/generate-roadmap/', payload, format='json')
+        jobs.run_pending_jobs()
+
+        gemini.assert_called_once()
+        self.assertEqual(roadmap_cache.cache_stats()['db_hits'], before['db_hits'] + 1)
+
+    @override_settings(ROADMAP_CACHE_DB_ENTRIES=2, ROADMAP_CACHE_EVICT_EVERY=1)
+    def test_db_tier_is_size_bounded(self):
+        for i in range(4):
+            roadmap_cache.store_response(f'key-{i}', 'model', 'text')
+        self.assertEqual(RoadmapCacheEntry.objects.count(), 2)
+
+    @override_settings(ROADMAP_CACHE_DB_ENTRIES=2, ROADMAP_CACHE_EVICT_EVERY=3)
+    def test_eviction_runs_on_every_nth_store(self):
+        with mock.patch.object(roadmap_cache, '_stores', itertools.count(1)):
+            for i in range(5):
+                roadmap_cache.store_response(f'key-{i}', 'model', 'text')
+                self.assertEqual(RoadmapCacheEntry.objects.count(), [1, 2, 2, 3, 4][i])
+
+    @override_settings(ROADMAP_CACHE_TOUCH_INTERVAL=3600)
+    def test_db_hit_refreshes_last_access_at_most_once_per_interval(self):
+        roadmap_cache.store_response('key', 'model', 'text')
+        stale = timezone.now() - timedelta(hours=2)
+        RoadmapCacheEntry.objects.filter(key='key').update(last_accessed_at=stale)
+        for hit in range(3):
+            roadmap_cache.clear_memory_cache()
+            with CaptureQueriesContext(connection) as queries:
+                self.assertEqual(roadmap_cache.get_cached_response('key'), 'text')
+            self.assertEqual(len(queries), 1 if hit else 2)  # only the first hit writes
+        self.assertGreater(RoadmapCacheEntry.objects.get(key='key').last_accessed_at, stale)
+
+
+@override_settings(ROADMAP_JOB_AUTOSTART=False, ROADMAP_JOB_MAX_ATTEMPTS=2, ROADMAP_JOB_RETRY_BACKOFF=0)
+class RoadmapJobTests(TestCase):
+    def setUp(self):
+        roadmap_cache.clear_memory_cache()
+        self.user, self.goal = create_assessed_user()
+
+    @mock.patch('roadmap.generation.analyze_goal_with_gemini', side_effect=[RuntimeError('timeout'), SAMPLE_ROADMAP_RESPONSE])
+    def test_failed_call_is_retried(self, gemini):
+        job = jobs.enqueue_roadmap_job(self.user, self.goal, {})
+        jobs.run_pending_jobs()
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, RoadmapJob.STATUS_DONE)
+        self.assertEqual(job.attempts, 2)
+        self.assertEqual(gemini.call_count, 2)
+
+    @mock.patch('roadmap.generation.analyze_goal_with_gemini', side_effect=RuntimeError('timeout'))
+    def test_job_fails_after_max_attempts(self, gemini):
+        job = jobs.enqueue_roadmap_job(self.user, self.goal, {})
+        jobs.run_pending_jobs()
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, RoadmapJob.STATUS_FAILED)
+        self.assertIn('timeout', job.error)
+        self.assertEqual(gemini.call_count, 2)
+
+    @override_settings(ROADMAP_JOB_RETRY_BACKOFF=60)
+    @mock.patch('roadmap.generation.analyze_goal_with_gemini', side_effect=RuntimeError('timeout'))
+    def test_retry_waits_for_backoff(self, gemini):
+        with mock.patch('roadmap.jobs.random.uniform', return_value=30):
+            job = jobs.enqueue_roadmap_job(self.user, self.goal, {})
+            jobs.run_pending_jobs()
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, RoadmapJob.STATUS_QUEUED)
+        self.assertEqual(gemini.call_count, 1)
+        self.assertIsNone(jobs.claim_next_job())
+
+    def test_orphaned_running_job_is_requeued(self):
+        job = jobs.enqueue_roadmap_job(self.user, self.goal, {})
+        claimed = jobs.claim_next_job()
+        self.assertEqual(claimed.id, job.id)
+        self.assertIsNone(jobs.claim_next_job())
+
+        RoadmapJob.objects.filter(id=job.id).update(heartbeat_at=timezone.now() - timedelta(hours=1))
+        self.assertEqual(jobs.recover_orphaned_jobs(), 1)
+        self.assertEqual(jobs.claim_next_job().id, job.id)
+
+    def test_orphan_that_used_up_its_attempts_fails(self):
+        job = jobs.enqueue_roadmap_job(self.user, self.goal, {})
+        RoadmapJob.objects.filter(id=job.id).update(
+            status=RoadmapJob.STATUS_RUNNING, attempts=2, heartbeat_at=timezone.now() - timedelta(hours=1),
+        )
+        self.assertEqual(jobs.recover_orphaned_jobs(), 0)
+        job.refresh_from_db()
+        self.assertEqual(job.status, RoadmapJob.STATUS_FAILED)
+        self.assertIsNotNone(job.finished_at)
+
+    def test_identical_pending_request_reuses_the_job(self):
+        first = jobs.enqueue_roadmap_job(self.user, self.goal, {'goal': 'Title'})
+        second = jobs.enqueue_roadmap_job(self.user, self.goal, {'goal': 'Title'})
+        third = jobs.enqueue_roadmap_job(self.user, self.goal, {'goal': 'Other title'})
+        self.assertEqual(first.id, second.id)
+        self.assertNotEqual(first.id, third.id)
+
+    def test_status_is_private_to_the_owner(self):
+        job = jobs.enqueue_roadmap_job(self.user, self.goal, {})
+        other = User.objects.create_user(username='mallory', password='pass12345')
+        client = APIClient()
+        client.force_authenticate(other)
+        response = client.get(f'/api/goals/generate-roadmap/jobs/{job.id}/')
+        self.assertEqual(response.status_code, 404)
+
+
+class RoadmapJobWorkerStartupTests(TransactionTestCase):
+    @override_settings(ROADMAP_JOB_AUTOSTART=False)  # keep the worker threads from claiming the job
+    def test_running_job_keeps_its_heartbeat(self):
+        user, goal = create_assessed_user()
+        jobs.enqueue_roadmap_job(user, goal, {})
+        job = jobs.claim_next_job()
+        stale = timezone.now() - timedelta(hours=1)
+        RoadmapJob.objects.filter(id=job.id).update(heartbeat_at=stale)
+        with jobs.heartbeat(job, interval=0.02):
+            time.sleep(0.2)
+            self.assertGreater(RoadmapJob.objects.get(id=job.id).heartbeat_at, stale)
+            self.assertEqual(jobs.recover_orphaned_jobs(), 0)
+
+    def test_first_request_from_a_server_starts_the_workers(self):
+        from django.core.handlers.wsgi import WSGIHandler
+        from django.core.signals import request_started
+        from django.test.client import ClientHandler
+
+        self.addCleanup(request_started.connect, signals.start_job_workers, dispatch_uid='roadmap_start_job_workers')
+        worker = mock.Mock()
+        with mock.patch('roadmap.signals.get_worker', return_value=worker):
+            request_started.send(sender=ClientHandler, environ={})
+            with override_settings(ROADMAP_JOB_AUTOSTART=False):
+                request_started.send(sender=WSGIHandler, environ={})
+            worker.start.assert_not_called()
+            request_started.send(sender=WSGIHandler, environ={})
+            request_started.send(sender=WSGIHandler, environ={})
+        worker.start.assert_called_once_with()
+
+
+class RoadmapStreamParserTests(TestCase):
+    def test_milestones_complete_as_soon_as_the_next_marker_arrives(self):
+        parser = RoadmapStreamParser()
+        events = []
+        for i, char in enumerate(SAMPLE_ROADMAP_RESPONSE):
+            events.extend((i, field) for field, _ in parser.feed(char))
+        remaining, parsed = parser.close()
+
+        fields = [field for _, field in events]
+        self.assertEqual(fields, ['milestone_start', 'milestone_3_months', 'milestone_6_months', 'milestone_9_months', 'milestone_12_months'])
+        self.assertEqual(remaining, [])
+        # Start is complete when "- 3 months:" arrives, well before the end of the response.
+        self.assertLess(events[0][0], SAMPLE_ROADMAP_RESPONSE.index('- 6 months:'))
+        self.assertEqual(parsed, parse_gemini_roadmap_response(SAMPLE_ROADMAP_RESPONSE))
+
+    def test_close_reports_milestones_the_stream_could_not_finish(self):
+        parser = RoadmapStreamParser()
+        parser.feed("Milestones:\n- Start: Begin.\n- 3 months: Keep going.")
+        remaining, parsed = parser.close()
+        self.assertEqual(remaining[0], ('milestone_3_months', 'Keep going.'))
+        self.assertEqual(parsed['milestone_start'], 'Begin.')
+        self.assertEqual(parsed['milestone_3_months'], 'Keep going.')
+
+
+class StreamRoadmapTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user, cls.goal = create_assessed_user()
+        cls.token = Token.objects.create(user=cls.user)
+
+    def setUp(self):
+        roadmap_cache.clear_memory_cache()
+
+    async def read_events(self, response):
+        body = b''.join([chunk async for chunk in response.streaming_content]).decode()
+        events = []
+        for block in body.strip().split('\n\n'):
+            event_line, data_line = block.split('\n')
+            events.append((event_line[len('event: '):], json.loads(data_line[len('data: '):])))
+        return events
+
+    async def test_streams_tokens_and_milestones_then_saves_goal(self):
+        async def fake_stream(prompt):
+            for i in range(0, len(SAMPLE_ROADMAP_RESPONSE), 17):
+                yield SAMPLE_ROADMAP_RESPONSE[i:i + 17]
+
+        with mock.patch('roadmap.generation.stream_goal_with_gemini_async', fake_stream):
+            response = await self.async_client.post(
+                '/api/goals/generate-roadmap/stream/', {'goal_id': self.goal.id},
+                content_type='application/json', headers={'Authorization': f'Token {self.token.key}'},
+            )
+            self.assertEqual(response['Content-Type'], 'text/event-stream')
+            events = await self.read_events(response)
+
+        names = [name for name, _ in events]
+        self.assertEqual(names[0], 'token')
+        self.assertEqual(names.count('milestone'), 5)
+        self.assertEqual(names[-1], 'done')
+        self.assertEqual(events[-1][1]['milestone_9_months'], 'Contribute to an open-source project.')
+        goal = await Goal.objects.aget(pk=self.goal.pk)
+        self.assertEqual(goal.full_plan, 'Study five hours a week and review progress monthly.')
+
+
+class SingleFlightTests(TransactionTestCase):
+    def test_concurrent_callers_share_one_call(self):
+        flight = SingleFlight('test_threads')
+        calls = []
+        results = []
+
+        def slow_call():
+            calls.append(1)
+            time.sleep(0.2)
+            return 'result'
+
+        threads = [threading.Thread(target=lambda: results.append(flight.do('key', slow_call))) for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, ['result'] * 5)
+        self.assertEqual(flight.stats()['coalesced'], 4)
+        self.assertFalse(RoadmapLease.objects.exists())
+
+    def test_errors_are_shared_and_not_cached(self):
+        flight = SingleFlight('test_errors')
+        with self.assertRaises(ValueError):
+            flight.do('key', mock.Mock(side_effect=ValueError('boom')))
+        self.assertEqual(flight.do('key', lambda: 'ok'), 'ok')
+
+    @override_settings(ROADMAP_SINGLEFLIGHT_POLL_INTERVAL=0.01)
+    def test_waits_for_result_published_by_lease_holder_in_another_process(self):
+        flight = SingleFlight('test_remote')
+        RoadmapLease.objects.create(key='key', owner='other-process', expires_at=timezone.now() + timedelta(minutes=1))
+        published = iter([None, None, 'remote result'])
+        fn = mock.Mock()
+
+        self.assertEqual(flight.do('key', fn, remote_result=lambda: next(published)), 'remote result')
+        fn.assert_not_called()
+        self.assertEqual(flight.stats()['remote_coalesced'], 1)
+
+    def test_expired_lease_is_taken_over(self):
+        flight = SingleFlight('test_expired')
+        RoadmapLease.objects.create(key='key', owner='dead-process', expires_at=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(flight.do('key', lambda: 'mine', remote_result=lambda: None), 'mine')
+
+
+    async def test_cancelled_leader_hands_over_to_followers(self):
+        flight = SingleFlight('test_cancelled')
+        started = asyncio.Event()
+        calls = []
+
+        async def call():
+            calls.append(1)
+            if len(calls) == 1:
+                started.set()
+                await asyncio.sleep(10)
+            return 'result'
+
+        leader = asyncio.ensure_future(flight.ado('key', call))
+        await started.wait()
+        follower = asyncio.ensure_future(flight.ado('key', call))
+        await asyncio.sleep(0)
+        leader.cancel()
+
+        self.assertEqual(await asyncio.wait_for(follower, 5), 'result')
+        self.assertTrue(leader.cancelled())
+        self.assertEqual(len(calls), 2)
+
+def batch_response(*goal_ids):
+    return '\n'.join(f'=== GOAL {goal_id} ===\n{SAMPLE_ROADMAP_RESPONSE}' for goal_id in goal_ids)
+
+
+class BatchRoadmapTests(TestCase):
+    def setUp(self):
+        roadmap_cache.clear_memory_cache()
+        self.user, self.goal = create_assessed_user()
+        self.other_goal = Goal.objects.create(user=self.user, title='Run a marathon', description='Train', category='health')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_parse_batch_response_tolerates_markdown_headers(self):
+        text = f'**=== GOAL 7 ===**\n{SAMPLE_ROADMAP_RESPONSE}\n## === GOAL 9 ===\nsorry, no plan'
+        parsed = parse_batch_roadmap_response(text, [7, 9, 11])
+        self.assertEqual(parsed[7], parse_gemini_roadmap_response(SAMPLE_ROADMAP_RESPONSE))
+        self.assertIsNone(parsed[9])
+        self.assertIsNone(parsed[11])
+
+    def test_one_gemini_call_for_all_goals(self):
+        with mock.patch('roadmap.generation.analyze_goal_with_gemini', return_value=batch_response(self.goal.id, self.other_goal.id)) as gemini:
+            response = self.client.post('/api/goals/generate-roadmap/batch/', {'goal_ids': [self.goal.id, self.other_goal.id]}, format='json')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([goal['id'] for goal in response.data], [self.goal.id, self.other_goal.id])
+        gemini.assert_called_once()
+        prompt = gemini.call_args[0][0]
+        self.assertEqual(prompt.count('Profile: '), 1)
+        self.assertIn('Run a marathon', prompt)
+        self.other_goal.refresh_from_db()
+        self.assertEqual(self.other_goal.milestone_3_months, 'Finish the fundamentals module.')
+
+    def test_unparseable_goal_falls_back_to_single_call(self):
+        responses = [batch_response(self.goal.id), SAMPLE_ROADMAP_RESPONSE]
+        with mock.patch('roadmap.generation.analyze_goal_with_gemini', side_effect=responses) as gemini:
+            response = self.client.post('/api/goals/generate-roadmap/batch/', {'goal_ids': [self.goal.id, self.other_goal.id]}, format='json')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(gemini.call_count, 2)
+        self.assertIn('Run a marathon', gemini.call_args_list[1][0][0])
+        self.other_goal.refresh_from_db()
+        self.assertEqual(self.other_goal.full_plan, 'Study five hours a week and review progress monthly.')
+
+    def test_rejects_other_users_goals(self):
+        _, foreign_goal = create_assessed_user('bob')
+        response = self.client.post('/api/goals/generate-roadmap/batch/', {'goal_ids': [self.goal.id, foreign_goal.id]}, format='json')
+        self.assertEqual(response.status_code, 404)
+
+
+@override_settings(
+    GEMINI_CONCURRENCY_INITIAL=2, GEMINI_CONCURRENCY_MAX=2, GEMINI_BREAKER_MIN_CALLS=3,
+    GEMINI_BREAKER_ERROR_RATE=0.5, GEMINI_BREAKER_RESET_SECONDS=60, GEMINI_ACQUIRE_TIMEOUT=5,
+)
+class GeminiClientManagerTests(TestCase):
+    def make_client(self, **fake_options):
+        self.fake = FakeGeminiModel(**fake_options)
+        self.factory = mock.Mock(return_value=self.fake)
+        return GeminiClientManager(model_factory=self.factory)
+
+    def test_model_instances_are_reused(self):
+        client = self.make_client()
+        client.generate('prompt', 'model-a')
+        client.generate('prompt', 'model-a')
+        client.generate('prompt', 'model-b')
+        self.assertEqual(self.factory.call_count, 2)
+        self.assertEqual(self.fake.calls, 3)
+
+    def test_breaker_opens_on_errors_and_fails_fast(self):
+        client = self.make_client(failure_rate=1.0)
+        for _ in range(3):
+            with self.assertRaises(FakeGeminiError):
+                client.generate('prompt', 'model')
+        with self.assertRaises(GeminiUnavailable):
+            client.generate('prompt', 'model')
+        self.assertEqual(self.fake.calls, 3)
+        self.assertEqual(client.stats()['state'], 'open')
+
+    def test_breaker_closes_after_successful_trial(self):
+        client = self.make_client(failure_rate=1.0)
+        for _ in range(3):
+            with self.assertRaises(FakeGeminiError):
+                client.generate('prompt', 'model')
+        self.fake.failure_rate = 0
+        client.breaker.reset_seconds = 0
+        client.generate('prompt', 'model')
+        self.assertEqual(client.stats()['state'], 'closed')
+
+    async def test_in_flight_calls_are_capped(self):
+        client = self.make_client(latency=0.05)
+        peak = 0
+
+        async def call():
+            nonlocal peak
+            task = asyncio.ensure_future(client.agenerate('prompt', 'model'))
+            await asyncio.sleep(0.01)
+            peak = max(peak, client.limiter.in_flight)
+            return await task
+
+        await asyncio.gather(*[call() for _ in range(6)])
+        self.assertEqual(peak, 2)
+        self.assertEqual(self.fake.calls, 6)
+
+    async def test_release_wakes_an_async_waiter(self):
+        limiter = AdaptiveLimiter(initial=1, min_limit=1, max_limit=1, latency_target=1.0)
+        limiter.acquire(0)
+        waiter = asyncio.ensure_future(limiter.acquire_async(timeout=5))
+        await asyncio.sleep(0.01)
+        self.assertFalse(waiter.done())
+        started = time.monotonic()
+        await asyncio.to_thread(limiter.release, 0.1)  # from another thread, as a sync call would
+        self.assertTrue(await waiter)
+        self.assertLess(time.monotonic() - started, 0.5)
+        self.assertEqual(limiter.in_flight, 1)
+
+    async def test_async_acquire_times_out(self):
+        limiter = AdaptiveLimiter(initial=1, min_limit=1, max_limit=1, latency_target=1.0)
+        limiter.acquire(0)
+        self.assertFalse(await limiter.acquire_async(timeout=0.02))
+        self.assertEqual(limiter._async_waiters, [])
+
+    async def test_abandoned_stream_is_not_an_error(self):
+        client = self.make_client(chunk_size=10)
+        limit = client.limiter.limit
+        errors, cancelled = metrics.get_counter('gemini_errors'), metrics.get_counter('gemini_cancelled')
+        for _ in range(3):
+            stream = client.astream('prompt', 'model')
+            await anext(stream)
+            await stream.aclose()  # the client disconnected mid-stream
+        self.assertEqual(client.limiter.in_flight, 0)
+        self.assertEqual(client.limiter.limit, limit)
+        self.assertEqual(client.stats()['state'], 'closed')
+        self.assertEqual(metrics.get_counter('gemini_errors'), errors)
+        self.assertEqual(metrics.get_counter('gemini_cancelled'), cancelled + 3)
+
+    async def test_call_cancelled_while_waiting_for_a_slot_returns_the_trial(self):
+        client = self.make_client()
+        client.breaker.state, client.breaker.reset_seconds = client.breaker.OPEN, 0
+        client.limiter.in_flight = 2
+        task = asyncio.ensure_future(client.agenerate('prompt', 'model'))
+        await asyncio.sleep(0.01)
+        self.assertTrue(client.breaker._trial_in_flight)
+        task.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await task
+        self.assertFalse(client.breaker._trial_in_flight)
+        self.assertEqual(client.limiter.in_flight, 2)
+
+        client.limiter.in_flight = 0
+        await client.agenerate('prompt', 'model')
+        self.assertEqual(client.stats()['state'], 'closed')
+
+    def test_saturated_limiter_rejects_after_timeout(self):
+        client = self.make_client()
+        client.limiter.in_flight = 2
+        with override_settings(GEMINI_ACQUIRE_TIMEOUT=0.01), self.assertRaises(GeminiUnavailable):
+            client.generate('prompt', 'model')
+
+    def test_aimd_limit_adapts_to_latency_and_errors(self):
+        limiter = AdaptiveLimiter(initial=8, min_limit=1, max_limit=10, latency_target=1.0)
+        for _ in range(2):
+            limiter.acquire(0)
+        limiter.release(latency=5.0)
+        self.assertEqual(limiter.limit, 4)
+        limiter.release(latency=0.1, error=True)
+        self.assertEqual(limiter.limit, 2)
+        for _ in range(20):
+            limiter.acquire(0)
+            limiter.release(latency=0.1)
+        self.assertGreater(limiter.limit, 5)
+
+    @override_settings(ROADMAP_JOB_AUTOSTART=False)
+    def test_roadmap_generation_runs_against_fake_client(self):
+        roadmap_cache.clear_memory_cache()
+        user, goal = create_assessed_user()
+        previous = set_client(self.make_client(response_text=SAMPLE_ROADMAP_RESPONSE))
+        try:
+            jobs.enqueue_roadmap_job(user, goal, {})
+            jobs.run_pending_jobs()
+        finally:
+            set_client(previous)
+        goal.refresh_from_db()
+        self.assertEqual(goal.milestone_12_months, 'Apply for junior developer roles.')
+
+
+class PromptBuilderTests(TestCase):
+    def setUp(self):
+        prompts.invalidate_profile_fragment()
+        self.user, self.goal = create_assessed_user()
+
+    def test_fragment_is_compact_and_canonical(self):
+        fragment = prompts.profile_fragment(self.user)
+        self.assertTrue(fragment.startswith('Profile: change_response=planner; core_belief=curiosity;'))
+        # The only answer matches the profile, so it is not repeated.
+        self.assertNotIn('Other assessment answers', fragment)
+        self.assertNotIn('{', fragment)
+
+    def test_fragment_is_cached_until_profile_changes(self):
+        prompts.profile_fragment(self.user)
+        with self.assertNumQueries(0):
+            prompts.profile_fragment(self.user)
+
+        profile = self.user.personality_profile
+        profile.strengths = 'strategy'
+        profile.save()
+        self.assertIn('strengths=strategy', prompts.profile_fragment(self.user))
+
+    def test_fragment_is_invalidated_by_another_process(self):
+        prompts.profile_fragment(self.user)
+        # Another process changed the profile and bumped the shared generation; this one got no signal.
+        PersonalityProfile.objects.filter(user=self.user).update(strengths='strategy')
+        self.assertNotIn('strengths=strategy', prompts.profile_fragment(self.user))
+        cache.incr(prompts.USER_GENERATION_CACHE_KEY.format(self.user.pk))
+        self.assertIn('strengths=strategy', prompts.profile_fragment(self.user))
+
+    def test_fragment_is_invalidated_when_answers_change(self):
+        prompts.profile_fragment(self.user)
+        answer = AssessmentAnswer.objects.get(user=self.user)
+        answer.answer = 'b'
+        answer.save()
+        self.assertIn('Other assessment answers: problem_solving=analytical', prompts.profile_fragment(self.user))
+
+    @override_settings(ROADMAP_PROMPT_TOKEN_BUDGET=200)
+    def test_long_description_is_truncated_to_budget(self):
+        fragment = prompts.profile_fragment(self.user)
+        prompt = prompts.build_roadmap_prompt('Title', 'career', 'word ' * 2000, fragment)
+        self.assertTrue(prompt.truncated)
+        self.assertLessEqual(prompt.token_count, 200)
+        self.assertEqual(prompt.token_count, prompts.count_tokens(prompt.text))
+        self.assertIn('Full Plan:', prompt.text)
+
+    def test_short_prompt_is_untouched(self):
+        prompt = prompts.build_roadmap_prompt('Title', 'career', 'Short description', prompts.profile_fragment(self.user))
+        self.assertFalse(prompt.truncated)
+        self.assertIn('Description: Short description\n', prompt.text)
+
+
+SAMPLE_ROADMAP_JSON = json.dumps({
+    'milestone_start': 'Pick a course.',
+    'milestone_3_months': 'Finish the fundamentals.',
+    'milestone_6_months': 'Build a project.',
+    'milestone_9_months': 'Contribute to open source.',
+    'milestone_12_months': 'Apply for jobs.',
+    'full_plan': 'Study five hours a week.',
+})
+
+
+@override_settings(ROADMAP_JSON_MODE=True)
+class JsonModeRoadmapTests(TestCase):
+    def setUp(self):
+        roadmap_cache.clear_memory_cache()
+        self.user, self.goal = create_assessed_user()
+        self.data = {'goal_id': self.goal.id, 'goal': 'Become a developer', 'category': 'career'}
+
+    def test_validator_accepts_fenced_json_and_names_bad_fields(self):
+        self.assertEqual(parse_roadmap_json(f"```json\n{SAMPLE_ROADMAP_JSON}\n```")['milestone_start'], 'Pick a course.')
+        with self.assertRaisesMessage(RoadmapFormatError, 'full_plan'):
+            parse_roadmap_json(json.dumps({**json.loads(SAMPLE_ROADMAP_JSON), 'full_plan': ''}))
+        with self.assertRaisesMessage(RoadmapFormatError, 'not valid JSON'):
+            parse_roadmap_json('Milestones: ...')
+
+    @mock.patch('roadmap.generation.analyze_goal_with_gemini')
+    @mock.patch('roadmap.generation.analyze_goal_with_gemini_json', return_value=SAMPLE_ROADMAP_JSON)
+    def test_valid_json_is_saved_in_one_call(self, mock_json, mock_text):
+        goal = generate_roadmap_for_goal(self.user, self.data)
+        self.assertEqual(goal.milestone_9_months, 'Contribute to open source.')
+        self.assertEqual(mock_json.call_count, 1)
+        self.assertIn('JSON object', mock_json.call_args[0][0])
+        mock_text.assert_not_called()
+
+    @mock.patch('roadmap.generation.analyze_goal_with_gemini_json', side_effect=['{"milestone_start": "Pick"', SAMPLE_ROADMAP_JSON])
+    def test_invalid_json_is_repaired_once_and_cached(self, mock_json):
+        goal = generate_roadmap_for_goal(self.user, self.data)
+        self.assertEqual(goal.full_plan, 'Study five hours a week.')
+        self.assertEqual(mock_json.call_count, 2)
+        self.assertIn('Your previous reply was rejected', mock_json.call_args[0][0])
+
+        # The repaired response replaced the invalid one in the cache.
+        generate_roadmap_for_goal(self.user, self.data)
+        self.assertEqual(mock_json.call_count, 2)
+
+    @mock.patch('roadmap.generation.analyze_goal_with_gemini_json', side_effect=[SAMPLE_ROADMAP_RESPONSE, 'still not json'])
+    def test_unrepairable_response_falls_back_to_text_parser(self, mock_json):
+        goal = generate_roadmap_for_goal(self.user, self.data)
+        self.assertEqual(mock_json.call_count, 2)
+        self.assertEqual(goal.milestone_start, 'Pick a course and set up a study schedule.')
+
+        # The complete fallback result replaced the invalid response in the cache.
+        generate_roadmap_for_goal(self.user, self.data)
+        self.assertEqual(mock_json.call_count, 2)
+        self.assertEqual(RoadmapCacheEntry.objects.get().response_text, json.dumps({
+            field: getattr(goal, field) for field in ROADMAP_FIELDS
+        }))
+
+    @mock.patch('roadmap.generation.analyze_goal_with_gemini_json', side_effect=['still not json', 'nor this'] * 2)
+    def test_incomplete_fallback_evicts_the_invalid_response(self, mock_json):
+        generate_roadmap_for_goal(self.user, self.data)
+        self.assertFalse(RoadmapCacheEntry.objects.exists())
+        generate_roadmap_for_goal(self.user, self.data)
+        self.assertEqual(mock_json.call_count, 4)
+
+    @mock.patch('roadmap.generation.analyze_goal_with_gemini_json', side_effect=['still not json', RuntimeError('timeout')])
+    def test_failed_repair_call_evicts_the_invalid_response(self, mock_json):
+        with self.assertRaises(RoadmapGenerationError):
+            generate_roadmap_for_goal(self.user, self.data)
+        self.assertFalse(RoadmapCacheEntry.objects.exists())
+        _, _, cache_key = prepare_roadmap_prompt(self.user, self.data)
+        self.assertIsNone(roadmap_cache.get_cached_response(cache_key))
+
+
+DIMENSIONS = [
+    'problem_solving', 'goal_energy', 'strengths', 'change_response', 'goal_motivation', 'daily_motivation',
+    'core_belief', 'time_structure', 'environment_preference', 'progress_block', 'obstacle_type',
+    'future_focus', 'success_definition', 'project_style', 'support_type',
+]
+
+
+class SubmitAssessmentTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        AssessmentQuestion.objects.bulk_create(
+            AssessmentQuestion(
+                question_id=i, dimension=DIMENSIONS[i % len(DIMENSIONS)], text=f'Question {i}',
+                option_a='A', option_b='B', option_c='C', option_d='D',
+                value_a=f'a{i}', value_b=f'b{i}', value_c=f'c{i}', value_d=f'd{i}',
+            )
+            for i in range(1, 46)
+        )
+
+    def setUp(self):
+        # bulk_create sends no signals, so the catalog does not know about the new questions yet
+        invalidate_question_catalog()
+        get_question_catalog()
+
+    def submit(self, user, answers):
+        client = APIClient()
+        client.force_authenticate(user)
+        payload = {'answers': [{'question_id': question_id, 'answer': answer} for question_id, answer in answers.items()]}
+        with CaptureQueriesContext(connection) as queries:
+            response = client.post('/api/assessments/submit/', payload, format='json')
+        return response, len(queries)
+
+    def test_query_count_does_not_grow_with_question_count(self):
+        counts = []
+        for n in (5, 15, 45):
+            user = User.objects.create_user(username=f'user{n}', password='pass12345')
+            response, first = self.submit(user, {i: 'a' for i in range(1, n + 1)})
+            self.assertEqual(response.status_code, 200)
+            _, changed = self.submit(user, {i: 'b' for i in range(1, n + 1)})
+            counts.append((first, changed))
+        self.assertEqual(len(set(counts)), 1, counts)
+        self.assertLessEqual(max(max(pair) for pair in counts), 10)
+
+    def test_warm_catalog_keeps_submission_off_the_question_table(self):
+        user = User.objects.create_user(username='erin', password='pass12345')
+        client = APIClient()
+        client.force_authenticate(user)
+        with CaptureQueriesContext(connection) as queries:
+            client.post('/api/assessments/submit/', {'answers': [{'question_id': 1, 'answer': 'a'}]}, format='json')
+        self.assertFalse([query for query in queries if 'FROM "roadmap_assessmentquestion"' in query['sql']])
+
+    def test_only_changed_answers_are_written_and_stale_ones_dropped(self):
+        user = User.objects.create_user(username='bob', password='pass12345')
+        self.submit(user, {1: 'a', 2: 'a', 3: 'a'})
+        created_at = AssessmentAnswer.objects.get(user=user, question__question_id=1).created_at
+
+        response, _ = self.submit(user, {'1': 'a', 2: 'c'})
+        self.assertEqual(response.status_code, 200)
+        answers = dict(AssessmentAnswer.objects.filter(user=user).values_list('question__question_id', 'answer'))
+        self.assertEqual(answers, {1: 'a', 2: 'c'})
+        self.assertEqual(AssessmentAnswer.objects.get(user=user, question__question_id=1).created_at, created_at)
+        self.assertEqual(PersonalityProfile.objects.get(user=user).strengths, 'c2')
+
+    def test_unknown_question_writes_nothing(self):
+        user = User.objects.create_user(username='carol', password='pass12345')
+        response, _ = self.submit(user, {1: 'a', 999: 'b'})
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(AssessmentAnswer.objects.filter(user=user).exists())
+        self.assertFalse(PersonalityProfile.objects.filter(user=user).exists())
+
+    def test_resubmission_refreshes_the_prompt_fragment(self):
+        user = User.objects.create_user(username='dave', password='pass12345')
+        self.submit(user, {i: 'a' for i in range(1, 16)})
+        self.assertIn('problem_solving=a15', prompts.profile_fragment(user))
+        self.submit(user, {i: 'd' for i in range(1, 16)})
+        self.assertIn('problem_solving=d15', prompts.profile_fragment(user))
+
+
+class SubmitAssessmentReseedTests(TransactionTestCase):
+    def tearDown(self):
+        invalidate_question_catalog()
+
+    def test_stale_catalog_is_reloaded_once(self):
+        # Foreign keys are only checked on commit, so this needs real transactions.
+        user = User.objects.create_user(username='frank', password='pass12345')
+        fields = dict(
+            dimension='goal_energy', text='Question', option_a='A', option_b='B', option_c='C', option_d='D',
+            value_a='old', value_b='b', value_c='c', value_d='d',
+        )
+        AssessmentQuestion.objects.create(question_id=1, **fields)
+        stale_catalog = get_question_catalog()
+
+        # Another process reseeds the questions; this process still holds the old catalog.
+        AssessmentQuestion.objects.all().delete()
+        replacement = AssessmentQuestion.objects.create(question_id=1, **{**fields, 'value_a': 'new'})
+
+        client = APIClient()
+        client.force_authenticate(user)
+        with mock.patch('roadmap.views.get_question_catalog', side_effect=[stale_catalog, get_question_catalog()]):
+            response = client.post('/api/assessments/submit/', {'answers': [{'question_id': 1, 'answer': 'a'}]}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(AssessmentAnswer.objects.get(user=user).question_id, replacement.pk)
+        self.assertEqual(PersonalityProfile.objects.get(user=user).goal_energy, 'new')
+
+
+class QuestionCatalogTests(TestCase):
+    def setUp(self):
+        invalidate_question_catalog()
+        self.user, _ = create_assessed_user()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_catalog_is_served_from_memory_with_an_etag(self):
+        response = self.client.get('/api/assessments/questions/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.content)[0]['question_id'], 1)
+        etag = response['ETag']
+
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/assessments/questions/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+
+    def test_saving_a_question_changes_the_etag(self):
+        etag = self.client.get('/api/assessments/questions/')['ETag']
+        question = AssessmentQuestion.objects.get(question_id=1)
+        question.text = 'Reworded'
+        question.save()
+
+        response = self.client.get('/api/assessments/questions/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(json.loads(response.content)[0]['text'], 'Reworded')
+
+
+class GoalListTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='gina', password='pass12345')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def create_goals(self, count):
+        goals = Goal.objects.bulk_create(
+            Goal(user=self.user, title=f'Goal {i}', description='', category='career') for i in range(count)
+        )
+        RoadmapStep.objects.bulk_create(
+            RoadmapStep(goal=goal, step_text=f'Step {order}', order=order) for goal in goals for order in (2, 1)
+        )
+        Resource.objects.bulk_create(Resource(goal=goal, title='Docs', link='https://example.com') for goal in goals)
+
+    def count_list_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/goals/')
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_query_count_does_not_grow_with_goal_count(self):
+        self.create_goals(2)
+        few = self.count_list_queries()
+        self.create_goals(15)
+        self.assertEqual(self.count_list_queries(), few)
+
+    def test_cursor_pages_cover_every_goal_once_in_order(self):
+        self.create_goals(7)
+        seen = []
+        url = '/api/goals/?page_size=3'
+        while url:
+            body = self.client.get(url).json()
+            self.assertLessEqual(len(body['results']), 3)
+            seen.extend(goal['id'] for goal in body['results'])
+            url = body['next']
+        expected = list(Goal.objects.filter(user=self.user).order_by('-created_at', '-id').values_list('id', flat=True))
+        self.assertEqual(seen, expected)
+
+    def test_list_is_unpaged_unless_a_page_is_requested(self):
+        self.create_goals(25)
+        self.assertEqual(len(self.client.get('/api/goals/').json()), 25)
+        body = self.client.get('/api/goals/?page_size=10').json()
+        self.assertEqual(set(body), {'next', 'previous', 'results'})
+        self.assertEqual(len(self.client.get(body['next']).json()['results']), 10)
+
+    def test_steps_are_ordered_and_page_size_is_capped(self):
+        self.create_goals(1)
+        goal = self.client.get('/api/goals/').json()[0]
+        self.assertEqual([step['order'] for step in goal['steps']], [1, 2])
+
+        self.create_goals(110)
+        body = self.client.get('/api/goals/?page_size=1000').json()
+        self.assertEqual(len(body['results']), 100)
+
+    def list_with_queries(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response.json(), ' '.join(query['sql'] for query in queries)
+
+    def test_summary_view_skips_roadmap_text_and_relations(self):
+        self.create_goals(3)
+        results, sql = self.list_with_queries('/api/goals/?view=summary')
+        self.assertEqual(set(results[0]), {'id', 'title', 'category', 'is_completed', 'created_at', 'updated_at'})
+        self.assertNotIn('full_plan', sql)
+        self.assertNotIn('milestone_start', sql)
+        self.assertNotIn('roadmap_roadmapstep', sql)
+
+    def test_sparse_fieldsets_limit_columns_and_prefetches(self):
+        self.create_goals(3)
+        results, sql = self.list_with_queries('/api/goals/?fields=id,title,steps')
+        self.assertEqual(set(results[0]), {'id', 'title', 'steps'})
+        self.assertNotIn('full_plan', sql)
+        self.assertNotIn('roadmap_resource', sql)
+
+        results, sql = self.list_with_queries('/api/goals/?exclude=full_plan,resources,user')
+        self.assertNotIn('full_plan', results[0])
+        self.assertIn('milestone_12_months', results[0])
+        self.assertNotIn('full_plan', sql)
+        self.assertNotIn('auth_user', sql)
+
+
+class CompressedTextFieldTests(TestCase):
+    def setUp(self):
+        self.user, self.goal = create_assessed_user()
+
+    def stored_bytes(self, column):
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT {column} FROM roadmap_goal WHERE id = %s', [self.goal.id])
+            return bytes(cursor.fetchone()[0])
+
+    def test_round_trip_is_transparent(self):
+        long_plan = 'Review progress every Sunday and adjust the plan. ' * 200
+        self.goal.full_plan = long_plan
+        self.goal.milestone_start = 'Begin ✓'
+        self.goal.save()
+
+        goal = Goal.objects.get(pk=self.goal.pk)
+        self.assertEqual(goal.full_plan, long_plan)
+        self.assertEqual(goal.milestone_start, 'Begin ✓')
+        self.assertIsNone(goal.milestone_9_months)
+        self.assertEqual(GoalSerializer(goal).data['full_plan'], long_plan)
+
+        stored = self.stored_bytes('full_plan')
+        self.assertEqual(stored[0], ZLIB)
+        self.assertLess(len(stored), len(long_plan) // 10)
+        self.assertEqual(self.stored_bytes('milestone_start')[0], RAW)
+
+    def test_format_versions(self):
+        self.assertEqual(decompress_text(bytes([RAW]) + 'plain'.encode()), 'plain')
+        self.assertEqual(decompress_text(compress_text('x' * 1000)), 'x' * 1000)
+        self.assertEqual(decompress_text(b''), '')
+        with self.assertRaises(ValueError):
+            decompress_text(b'\x07abc')
+
+
+class PointsTests(TestCase):
+    def setUp(self):
+        achievements.invalidate_achievement_catalog()
+        self.user = User.objects.create_user(username='hank', password='pass12345')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_completion_is_insert_only(self):
+        self.client.post('/api/gamification/add-points/', {'category': 'career'}, format='json')
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post('/api/gamification/add-points/', {'category': 'career'}, format='json')
+        writes = [query['sql'] for query in queries if query['sql'].startswith(('UPDATE', 'INSERT'))]
+        self.assertEqual(len(writes), 1)
+        self.assertTrue(writes[0].startswith('INSERT INTO "roadmap_pointstransaction"'))
+        self.assertFalse([query for query in queries if 'FOR UPDATE' in query['sql']])
+        self.assertEqual(response.json()['total_points'], 200)  # the first-goal bonus comes with the next read
+        self.assertEqual(self.client.get('/api/gamification/points/').json()['total_points'], 250)
+
+    def test_bonuses_and_level_come_from_the_persisted_total(self):
+        for _ in range(5):
+            user_points, level_up = award_goal_completion(self.user, 100)
+        self.assertEqual((user_points.total_points, user_points.goals_completed, level_up), (500, 5, True))
+        self.assertFalse(UserPoints.objects.filter(user=self.user).exists())
+        _, _, new_achievements = rollup_points(self.user)
+        self.assertEqual([achievement.name for achievement in new_achievements], ['First Goal Completed', 'Goal Master'])
+        persisted = UserPoints.objects.get(user=self.user)
+        self.assertEqual(persisted.total_points, 5 * 100 + 50 + 100)
+        self.assertEqual(persisted.goals_completed, 5)
+        self.assertEqual(persisted.level, persisted.calculate_level())
+        self.assertEqual(persisted.level, 2)
+
+    def test_projection_adds_pending_rows_to_the_persisted_total(self):
+        award_goal_completion(self.user, 100)
+        rollup_points(self.user)  # 100 + 50 first-goal bonus
+        user_points, level_up = award_goal_completion(self.user, 400)
+        self.assertEqual((user_points.total_points, user_points.goals_completed, user_points.level, level_up), (550, 2, 2, True))
+
+    def test_check_new_achievements_awards_once(self):
+        award_goal_completion(self.user, 10)
+        first = self.client.get('/api/gamification/check-achievements/').json()['new_achievements']
+        second = self.client.get('/api/gamification/check-achievements/').json()['new_achievements']
+        self.assertEqual([achievement['name'] for achievement in first], ['First Goal Completed'])
+        self.assertEqual(second, [])
+        self.assertEqual(UserPoints.objects.get(user=self.user).total_points, 10 + 50)
+
+
+class PointsLedgerTests(TestCase):
+    def setUp(self):
+        achievements.invalidate_achievement_catalog()
+        self.user = User.objects.create_user(username='kim', password='pass12345')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_completion_and_bonus_are_in_the_ledger(self):
+        goal = Goal.objects.create(user=self.user, title='Run', category='health')
+        self.client.post('/api/gamification/add-points/', {'goal_id': goal.id, 'category': 'health'}, format='json')
+        self.assertEqual(PointsTransaction.objects.filter(user=self.user, rolled_up=False).count(), 1)
+        self.client.get('/api/gamification/points/')
+        ledger = list(PointsTransaction.objects.filter(user=self.user).order_by('id').values_list('reason', 'delta', 'goal_id', 'rolled_up'))
+        self.assertEqual(ledger, [
+            (PointsTransaction.REASON_GOAL_COMPLETED, 100, goal.id, True),
+            (PointsTransaction.REASON_ACHIEVEMENT, 50, None, True),
+        ])
+        self.assertEqual(UserPoints.objects.get(user=self.user).total_points, 150)
+
+    def test_reads_roll_up_pending_rows_once(self):
+        for _ in range(3):
+            record_points(self.user, 20, PointsTransaction.REASON_GOAL_COMPLETED)
+        data = self.client.get('/api/gamification/points/').json()
+        self.assertEqual((data['total_points'], data['goals_completed']), (60 + 50, 3))
+        self.assertFalse(PointsTransaction.objects.filter(user=self.user, rolled_up=False).exists())
+
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get('/api/gamification/points/')
+        self.assertFalse([query for query in queries if query['sql'].startswith('UPDATE')])
+
+    def test_history_and_period_totals(self):
+        long_ago = timezone.now() - timedelta(days=40)
+        PointsTransaction.objects.create(user=self.user, delta=30, reason=PointsTransaction.REASON_GOAL_COMPLETED, created_at=long_ago)
+        award_goal_completion(self.user, 100)
+        rollup_points(self.user)
+
+        history = self.client.get('/api/gamification/points/history/', {'page_size': 2}).json()
+        self.assertEqual([row['delta'] for row in history['results']], [50, 100])
+        older = self.client.get(history['next']).json()
+        self.assertEqual([row['delta'] for row in older['results']], [30])
+
+        periods = self.client.get('/api/gamification/points/periods/', {'period': 'month'}).json()
+        self.assertEqual([row['points'] for row in periods], [30, 150])
+        since = (timezone.now() - timedelta(days=1)).date().isoformat()
+        recent = self.client.get('/api/gamification/points/periods/', {'period': 'day', 'since': since}).json()
+        self.assertEqual([row['points'] for row in recent], [150])
+        self.assertEqual(self.client.get('/api/gamification/points/periods/', {'period': 'year'}).status_code, 400)
+        self.assertEqual(self.client.get('/api/gamification/points/history/', {'since': 'soon'}).status_code, 400)
+
+    def test_rollup_command_folds_every_user(self):
+        other = User.objects.create_user(username='lee', password='pass12345')
+        record_points(self.user, 10, PointsTransaction.REASON_GOAL_COMPLETED)
+        record_points(other, 10, PointsTransaction.REASON_GOAL_COMPLETED)
+        call_command('rollup_points', stdout=io.StringIO())
+        self.assertEqual(
+            sorted(UserPoints.objects.values_list('total_points', flat=True)), [60, 60],
+        )
+
+
+class LeaderboardTests(TestCase):
+    def setUp(self):
+        leaderboard.invalidate_rank_snapshot()
+        achievements.invalidate_achievement_catalog()
+        self.users = []
+        for name, total in [('ann', 300), ('bob', 500), ('cat', 300), ('dan', 100), ('eve', 0)]:
+            user = User.objects.create_user(username=name, password='pass12345')
+            UserPoints.objects.create(user=user, total_points=total)
+            self.users.append(user)
+        self.client = APIClient()
+        self.client.force_authenticate(self.users[0])
+
+    def test_snapshot_ranks_ties_together(self):
+        snapshot = leaderboard.RankSnapshot([(500, 2), (300, 1), (300, 3), (100, 4), (0, 5)])
+        self.assertEqual([snapshot.rank_for_points(points) for points in (600, 500, 300, 200, 0)], [1, 1, 2, 4, 5])
+        self.assertEqual(snapshot.position(3, 300), 2)
+        self.assertEqual(snapshot.position(9, 300), 3)  # not in the snapshot yet: after the tied users with lower ids
+        self.assertEqual([entry.rank for entry in snapshot.entries(0, 10)], [1, 2, 2, 4, 5])
+
+    def test_stale_snapshot_is_served_while_one_thread_rebuilds(self):
+        stale = leaderboard.get_rank_snapshot()
+        stale.built_at -= settings.LEADERBOARD_SNAPSHOT_TTL + 1
+        release = threading.Event()
+        fresh = leaderboard.RankSnapshot([(700, 1)])
+
+        def slow_build():
+            release.wait(5)
+            return fresh
+
+        with mock.patch.object(leaderboard.RankSnapshot, 'from_database', side_effect=slow_build) as build:
+            self.assertIs(leaderboard.get_rank_snapshot(), stale)
+            self.assertIs(leaderboard.get_rank_snapshot(), stale)
+            release.set()
+            for _ in range(500):
+                if leaderboard.get_rank_snapshot() is fresh:
+                    break
+                time.sleep(0.01)
+        self.assertIs(leaderboard.get_rank_snapshot(), fresh)
+        self.assertEqual(build.call_count, 1)
+
+    def test_top_board(self):
+        with CaptureQueriesContext(connection) as queries:
+            results = self.client.get('/api/gamification/leaderboard/', {'limit': 4}).json()['results']
+        self.assertEqual(
+            [(row['rank'], row['username'], row['total_points']) for row in results],
+            [(1, 'bob', 500), (2, 'ann', 300), (2, 'cat', 300), (4, 'dan', 100)],
+        )
+        self.assertEqual(len(queries), 2)  # board + usernames
+
+    def test_my_rank_with_neighbours(self):
+        data = self.client.get('/api/gamification/leaderboard/me/', {'neighbours': 1}).json()
+        self.assertEqual((data['rank'], data['total_points'], data['ranked_users']), (2, 300, 5))
+        self.assertEqual([row['username'] for row in data['neighbours']], ['bob', 'ann', 'cat'])
+
+    def test_my_rank_uses_live_points_against_the_snapshot(self):
+        self.client.get('/api/gamification/leaderboard/me/')  # build the snapshot
+        award_goal_completion(self.users[0], 150)  # ann: 300 + 150 + 50 bonus at the rollup = 500
+        data = self.client.get('/api/gamification/leaderboard/me/', {'neighbours': 1}).json()
+        self.assertEqual((data['rank'], data['total_points']), (1, 500))
+        self.assertEqual([row['username'] for row in data['neighbours']], ['ann', 'bob'])
+
+
+class AchievementEngineTests(TestCase):
+    def setUp(self):
+        achievements.invalidate_achievement_catalog()
+        self.user = User.objects.create_user(username='jade', password='pass12345')
+        self.user_points = UserPoints.objects.create(user=self.user, goals_completed=5, level=3)
+
+    def _rules(self, count):
+        return [
+            achievements.AchievementRule(f'Rule {i}', 'Test rule', 10, 'completion', 'stars', 'goals_completed', i)
+            for i in range(1, count + 1)
+        ]
+
+    def test_adding_rules_adds_no_queries(self):
+        query_counts = []
+        for count in (2, 6):
+            rules = self._rules(count)
+            achievements.achievement_catalog(rules)  # warm
+            UserAchievement.objects.filter(user=self.user).delete()
+            with CaptureQueriesContext(connection) as queries:
+                new_achievements = achievements.award_achievements(self.user, self.user_points, rules)
+            self.assertEqual(len(new_achievements), min(count, 5))
+            query_counts.append(len(queries))
+        self.assertEqual(query_counts[0], query_counts[1])
+
+    def test_rules_award_once_and_add_bonus_in_memory(self):
+        new_achievements = achievements.award_achievements(self.user, self.user_points)
+        self.assertEqual(
+            sorted(achievement.name for achievement in new_achievements),
+            ['First Goal Completed', 'Goal Master', 'Level 3 Achiever'],
+        )
+        self.assertEqual(self.user_points.total_points, 50 + 100 + 75)
+        self.assertEqual(achievements.award_achievements(self.user, self.user_points), [])
+        self.assertEqual(UserAchievement.objects.filter(user=self.user).count(), 3)
+
+    def test_category_rule_counts_completed_goals(self):
+        rule = achievements.AchievementRule('Career Climber', 'Two career goals', 30, 'category', 'work', 'category:career', 2)
+        Goal.objects.create(user=self.user, title='A', category='Career', is_completed=True)
+        Goal.objects.create(user=self.user, title='B', category='career', is_completed=False)
+        self.assertEqual(achievements.award_achievements(self.user, self.user_points, [rule]), [])
+        Goal.objects.create(user=self.user, title='C', category='career', is_completed=True)
+        self.assertEqual([a.name for a in achievements.award_achievements(self.user, self.user_points, [rule])], ['Career Climber'])
+
+    def test_catalog_is_dropped_when_an_achievement_changes(self):
+        catalog = achievements.achievement_catalog()
+        achievement = catalog['Goal Master']
+        achievement.points = 120
+        achievement.save()
+        self.assertEqual(achievements.achievement_catalog()['Goal Master'].points, 120)
+
+
+class PointsConcurrencyTests(TransactionTestCase):
+    def test_rollup_that_loses_a_race_is_retried(self):
+        """Runs on every backend: another rollup commits between this one's read and its writes"""
+        achievements.invalidate_achievement_catalog()
+        user = User.objects.create_user(username='ray', password='pass12345')
+        UserPoints.objects.create(user=user)
+        other_rollups = {
+            'claimed the pending rows': lambda: PointsTransaction.objects.filter(user=user).update(rolled_up=True),
+            'changed the totals': lambda: UserPoints.objects.filter(user=user).update(total_points=F('total_points') + 5),
+        }
+        for name, other_rollup in other_rollups.items():
+            with self.subTest(name):
+                UserAchievement.objects.filter(user=user).delete()
+                UserPoints.objects.filter(user=user).update(total_points=0, goals_completed=0, level=1)
+                record_points(user, 40, PointsTransaction.REASON_GOAL_COMPLETED)
+                calls = []
+
+                def award_after_interference(user_, user_points):
+                    calls.append(1)
+                    if len(calls) == 1:
+                        other_rollup()  # undone with the losing attempt's transaction
+                    return achievements.award_achievements(user_, user_points)
+
+                conflicts = metrics.get_counter('points_rollup_conflicts')
+                with mock.patch('roadmap.points.award_achievements', side_effect=award_after_interference):
+                    user_points, _, new_achievements = rollup_points(user)
+
+                self.assertEqual(len(calls), 2)
+                self.assertEqual(metrics.get_counter('points_rollup_conflicts'), conflicts + 1)
+                self.assertEqual([achievement.name for achievement in new_achievements], ['First Goal Completed'])
+                persisted = UserPoints.objects.get(user=user)
+                self.assertEqual((persisted.total_points, persisted.goals_completed), (40 + 50, 1))
+                self.assertEqual(user_points.total_points, persisted.total_points)
+                self.assertFalse(PointsTransaction.objects.filter(user=user, rolled_up=False).exists())
+
+    @skipUnlessDBFeature('has_select_for_update')
+    def test_concurrent_completions_lose_no_points(self):
+        achievements.invalidate_achievement_catalog()
+        user = User.objects.create_user(username='ivy', password='pass12345')
+        threads_count, completions, points = 8, 10, 40
+        errors = []
+
+        def complete_goals():
+            try:
+                for _ in range(completions):
+                    award_goal_completion(user, points)
+                    rollup_points(user)
+            except Exception as e:
+                errors.append(e)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=complete_goals) for _ in range(threads_count)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        user_points = UserPoints.objects.get(user=user)
+        bonuses = sum(UserAchievement.objects.filter(user=user).values_list('achievement__points', flat=True))
+        self.assertEqual(user_points.goals_completed, threads_count * completions)
+        self.assertEqual(user_points.total_points, threads_count * completions * points + bonuses)
+        self.assertEqual(user_points.level, user_points.calculate_level())
+
+
+# A full table scan in EXPLAIN output: SQLite's EXPLAIN QUERY PLAN says "SCAN <table>" without an
+# index, Postgres says "Seq Scan on <table>".
+FULL_SCAN_PATTERNS = {
+    'sqlite': re.compile(r'\bSCAN (\w+)\s*$', re.MULTILINE),
+    'postgresql': re.compile(r'\bSeq Scan on (\w+)'),
+}
+
+
+# On tables this small Postgres rightly prefers a sequential scan, so it is told to avoid one
+# whenever an index can serve the query: a "Seq Scan" left in the plan then means no usable index.
+# SET LOCAL lasts until the test's transaction is rolled back.
+PLANNER_SETUP = {
+    'postgresql': 'SET LOCAL enable_seqscan = off',
+}
+
+
+def full_scans(queryset):
+    """Tables the database plans to read in full for queryset"""
+    setup = PLANNER_SETUP.get(connection.vendor)
+    if setup:
+        with connection.cursor() as cursor:
+            cursor.execute(setup)
+    return FULL_SCAN_PATTERNS[connection.vendor].findall(queryset.explain())
+
+
+class QueryPlanTests(TestCase):
+    """Hot queries must be served from an index on a seeded dataset."""
+    users, goals_per_user = 40, 60
+
+    @classmethod
+    def setUpTestData(cls):
+        if connection.vendor not in FULL_SCAN_PATTERNS:
+            return
+        users = User.objects.bulk_create(User(username=f'plan-{i}') for i in range(cls.users))
+        categories = ['career', 'health', 'education', 'personal', 'financial']
+        goals = Goal.objects.bulk_create(
+            Goal(user=user, title=f'Goal {i}', description='', category=categories[i % 5], is_completed=i % 10 == 0)
+            for user in users for i in range(cls.goals_per_user)
+        )
+        RoadmapStep.objects.bulk_create(RoadmapStep(goal=goal, step_text='Step', order=order) for goal in goals for order in range(3))
+        Resource.objects.bulk_create(Resource(goal=goal, title='Guide', link='https://example.com', category='book') for goal in goals)
+        question = AssessmentQuestion.objects.create(
+            question_id=1, dimension='problem_solving', text='?', option_a='a', option_b='b', option_c='c', option_d='d',
+            value_a='a', value_b='b', value_c='c', value_d='d',
+        )
+        AssessmentAnswer.objects.bulk_create(AssessmentAnswer(user=user, question=question, answer='a') for user in users)
+        UserPoints.objects.bulk_create(UserPoints(user=user, total_points=i * 10) for i, user in enumerate(users))
+        PointsTransaction.objects.bulk_create(
+            PointsTransaction(user=goal.user, goal=goal, delta=100, reason=PointsTransaction.REASON_GOAL_COMPLETED, rolled_up=True)
+            for goal in goals
+        )
+        RoadmapJob.objects.bulk_create(
+            RoadmapJob(user=goal.user, goal=goal, status=RoadmapJob.STATUS_DONE) for goal in goals
+        )
+        RoadmapCacheEntry.objects.bulk_create(
+            RoadmapCacheEntry(key=f'{i:064d}', model_name='gemini', response_text='') for i in range(len(goals))
+        )
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+        cls.user = users[0]
+        cls.goal_ids = [goal.id for goal in goals[:10]]
+
+    def hot_queries(self):
+        now = timezone.now()
+        user = self.user
+        return {
+            'goal list': Goal.objects.filter(user=user).order_by('-created_at', '-id')[:20],
+            'completed goals per category': Goal.objects.filter(user=user, is_completed=True).values('category').annotate(count=Count('id')),
+            'admin category filter': Goal.objects.filter(category='health'),
+            'admin completed filter': Goal.objects.filter(is_completed=True).order_by('-created_at')[:100],
+            'goal steps': RoadmapStep.objects.filter(goal_id__in=self.goal_ids).order_by('order', 'id'),
+            'goal resources by category': Resource.objects.filter(goal_id=self.goal_ids[0], category='book'),
+            'assessment answers': AssessmentAnswer.objects.filter(user=user),
+            'user achievements': UserAchievement.objects.filter(user=user),
+            'points history': PointsTransaction.objects.filter(user=user, created_at__gte=now - timedelta(days=30)),
+            'pending ledger rows': PointsTransaction.objects.filter(user=user, rolled_up=False),
+            'leaderboard top': UserPoints.objects.order_by('-total_points', 'user_id')[:10],
+            'job claim': RoadmapJob.objects.filter(status=RoadmapJob.STATUS_QUEUED, run_after__lte=now).order_by('run_after', 'id')[:1],
+            'orphaned jobs': RoadmapJob.objects.filter(status=RoadmapJob.STATUS_RUNNING, heartbeat_at__lt=now),
+            'roadmap cache purge': RoadmapCacheEntry.objects.filter(created_at__lt=now - timedelta(days=7)),
+        }
+
+    def test_hot_queries_use_indexes(self):
+        if connection.vendor not in FULL_SCAN_PATTERNS:
+            self.skipTest(f'No EXPLAIN parser for {connection.vendor}')
+        for name, queryset in self.hot_queries().items():
+            with self.subTest(name):
+                self.assertEqual(full_scans(queryset), [], queryset.explain())
+
+
+class CachedTokenAuthenticationTests(TestCase):
+    def setUp(self):
+        clear_token_cache()
+        self.user = User.objects.create_user(username='mia', password='pass12345')
+        self.token = Token.objects.create(user=self.user)
+        self.auth = CachedTokenAuthentication()
+
+    def authenticate(self, key=None):
+        request = RequestFactory().get('/', HTTP_AUTHORIZATION=f'Token {key or self.token.key}')
+        return self.auth.authenticate(request)
+
+    def test_warm_cache_makes_no_queries(self):
+        self.authenticate()
+        with self.assertNumQueries(0):
+            user, token = self.authenticate()
+        self.assertEqual((user.pk, token.key), (self.user.pk, self.token.key))
+
+    def test_cached_user_is_a_copy(self):
+        first, _ = self.authenticate()
+        first.username = 'changed'
+        second, _ = self.authenticate()
+        self.assertEqual(second.username, 'mia')
+
+    def test_token_rotation_and_deactivation_take_effect_immediately(self):
+        self.authenticate()
+        old_key = self.token.key
+        self.token.delete()
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate(old_key)
+
+        token = Token.objects.create(user=self.user)
+        self.authenticate(token.key)
+        self.user.is_active = False
+        self.user.save()
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate(token.key)
+
+    def test_password_change_and_logout_drop_the_entry(self):
+        self.authenticate()
+        self.user.set_password('new-pass-12345')
+        self.user.save()
+        with self.assertNumQueries(1):
+            self.authenticate()
+
+        self.client.login(username='mia', password='new-pass-12345')  # last_login alone keeps the entry
+        with self.assertNumQueries(0):
+            self.authenticate()
+        self.client.logout()
+        with self.assertNumQueries(1):
+            self.authenticate()
+
+    @override_settings(AUTH_TOKEN_SHARED_CACHE=True)
+    def test_shared_tier_serves_other_processes(self):
+        self.authenticate()
+        clear_token_cache()  # as if this were another process
+        with self.assertNumQueries(0):
+            user, _ = self.authenticate()
+        self.assertEqual(user.pk, self.user.pk)
+        self.token.delete()
+        clear_token_cache()
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate()
+
+    def test_revocation_in_another_process_takes_effect_immediately(self):
+        key = self.token.key
+        self.authenticate(key)
+        # Another process deletes the token: its signal handler clears its own in-process tier only.
+        with mock.patch('roadmap.authentication._memory', TTLLRUCache(max_entries=8, ttl=30)):
+            self.token.delete()
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate(key)
+
+
+class WriteAvoidingSessionTests(TestCase):
+    def setUp(self):
+        self.clock = [time.time()]
+        patcher = mock.patch('time.time', side_effect=lambda: self.clock[0])
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        session = SessionStore()
+        session['_auth_user_id'] = '1'
+        session[sessions.ACTIVITY_KEY] = self.clock[0]
+        session.create()
+        self.key = session.session_key
+
+    def request(self, seconds_later, **changes):
+        """Load the session, re-stamp it as django_session_timeout does, apply changes and save"""
+        self.clock[0] += seconds_later
+        session = SessionStore(self.key)
+        session[sessions.ACTIVITY_KEY] = self.clock[0]
+        session.update(changes)
+        with CaptureQueriesContext(connection) as queries:
+            session.save()
+        return [query['sql'] for query in queries if query['sql'].startswith('UPDATE "django_session"')]
+
+    def stored(self):
+        return SessionStore().decode(Session.objects.get(session_key=self.key).session_data)
+
+    def test_activity_stamps_stay_in_the_cache_until_the_interval(self):
+        self.assertEqual(self.request(2), [])
+        self.assertEqual(self.request(2), [])
+        self.assertEqual(SessionStore(self.key)[sessions.ACTIVITY_KEY], self.clock[0])
+        self.assertEqual(len(self.request(settings.SESSION_DB_WRITE_INTERVAL)), 1)
+        self.assertEqual(self.stored()[sessions.ACTIVITY_KEY], self.clock[0])
+
+    def test_data_changes_are_written_through(self):
+        self.assertEqual(len(self.request(2, profile_retry_count=1)), 1)
+        self.assertEqual(self.stored()['profile_retry_count'], 1)
+        self.assertEqual(self.request(2, profile_retry_count=1), [])
+
+    def test_sliding_timeout_survives_a_cache_loss(self):
+        for _ in range(settings.SESSION_EXPIRE_SECONDS // 10):
+            self.request(10)
+        cache.clear()
+        stamp = SessionStore(self.key)[sessions.ACTIVITY_KEY]
+        self.assertLessEqual(self.clock[0] - stamp, settings.SESSION_DB_WRITE_INTERVAL)
+        self.assertLess(self.clock[0] - stamp, settings.SESSION_EXPIRE_SECONDS)
+
+
+    def test_process_local_cache_is_refused(self):
+        with override_settings(SESSION_ENGINE='roadmap.sessions'):
+            self.assertEqual([error.id for error in sessions.check_session_cache()], ['roadmap.E001'])
+        shared = {'default': {'BACKEND': 'django.core.cache.backends.db.DatabaseCache', 'LOCATION': 'cache'}}
+        with override_settings(SESSION_ENGINE='roadmap.sessions', CACHES=shared):
+            self.assertEqual(sessions.check_session_cache(), [])
+        with override_settings(SESSION_ENGINE='django.contrib.sessions.backends.db'):
+            self.assertEqual(sessions.check_session_cache(), [])
+
+class LoadTestHelperTests(TestCase):
+    def test_latency_distributions(self):
+        self.assertEqual(latency_distribution('fixed:0.25')(), 0.25)
+        samples = [latency_distribution('uniform:0.1,0.2', seed=1)() for _ in range(50)]
+        self.assertTrue(all(0.1 <= sample <= 0.2 for sample in samples))
+        lognormal = latency_distribution('lognormal:1.0,0.5', seed=3)
+        self.assertAlmostEqual(statistics.median(lognormal() for _ in range(2001)), 1.0, delta=0.1)
+        for spec in ('fixed', 'uniform:1', 'gamma:1,2', 'fixed:x'):
+            with self.assertRaises(ValueError):
+                latency_distribution(spec)
+
+    def test_percentile_is_nearest_rank(self):
+        values = list(range(1, 101))
+        self.assertEqual([percentile(values, p) for p in (0.5, 0.9, 0.99)], [50, 90, 99])
+        self.assertEqual(percentile([], 0.5), 0.0)
+
+    def test_a_failing_request_is_counted_not_raised(self):
+        command = LoadTestCommand()
+        client = mock.Mock()
+        client.get.side_effect = RuntimeError('stream broke')
+        route = next(route for route in LOADTEST_ROUTES if route.name == 'me')
+        sample = command._request(client, route, mock.Mock(token=mock.Mock(key='k')))
+        self.assertEqual(sample[2:], ('exception', 'RuntimeError: stream broke'))
+        summary = command._summarize([sample, (1.0, 0, 200, None)], wall=1.0)
+        self.assertEqual((summary['errors'], summary['status_counts']), (1, {'exception': 1, '200': 1}))
+        self.assertEqual(summary['exceptions'], {'RuntimeError: stream broke': 1})
+
+
+class RequestTimingTests(TestCase):
+    def setUp(self):
+        timing.reset_histograms()
+        self.user = User.objects.create_user(username='ivy', password='pass12345')
+        Goal.objects.create(user=self.user, title='Run', description='Run a marathon', category='health')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_server_timing_header_reports_queries_and_serializer_time(self):
+        response = self.client.get('/api/goals/')
+        self.assertEqual(response.status_code, 200)
+        header = response['Server-Timing']
+        queries = int(re.search(r'db;dur=[\d.]+;desc="(\d+) queries"', header).group(1))
+        self.assertGreater(queries, 0)
+        self.assertRegex(header, r'serializer;dur=[\d.]+')
+        self.assertRegex(header, r'total;dur=[\d.]+$')
+
+    @override_settings(SERVER_TIMING_HEADER=False)
+    def test_header_can_be_disabled(self):
+        self.assertNotIn('Server-Timing', self.client.get('/api/goals/'))
+
+    def test_gemini_time_is_attributed_to_the_request(self):
+        previous = set_client(GeminiClientManager(model_factory=lambda name: FakeGeminiModel(latency=0.02)))
+        token = timing.start_request()
+        try:
+            analyze_goal_with_gemini('prompt')
+            self.assertGreaterEqual(timing.current_timings().seconds['gemini'], 0.02)
+        finally:
+            timing.finish_request(token)
+            set_client(previous)
+        self.assertIsNone(timing.current_timings())
+
+    def test_metrics_endpoint_is_staff_only(self):
+        self.client.get('/api/goals/')
+        self.assertEqual(self.client.get('/api/metrics/').status_code, 403)
+        self.user.is_staff = True
+        self.user.save()
+        response = self.client.get('/api/metrics/')
+        self.assertEqual(response.status_code, 200)
+        body = response.content.decode()
+        self.assertIn('roadmap_request_duration_seconds_bucket{method="GET",route="api/goals/",le="+Inf"} 1', body)
+        self.assertIn('roadmap_request_db_queries_count{method="GET",route="api/goals/"}', body)
+        self.assertIn('# TYPE roadmap_request_serializer_seconds histogram', body)
+
+
+class StubGeminiHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # keep-alive
+
+    def setup(self):
+        super().setup()
+        with self.server.lock:
+            self.server.connections += 1
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers['Content-Length']))
+        with self.server.lock:
+            self.server.requests.append(json.loads(body))
+            self.server.headers.append(self.headers)
+            status_code, headers, payload = self.server.script.pop(0) if self.server.script else (200, {}, {'ok': True})
+        time.sleep(self.server.delay)
+        data = json.dumps(payload).encode()
+        self.send_response(status_code)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+@override_settings(GEMINI_HTTP_BACKOFF=0, GEMINI_HTTP_BACKOFF_JITTER=0)
+class PooledHttpClientTests(TestCase):
+    def setUp(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), StubGeminiHandler)
+        self.server.daemon_threads = True
+        self.server.lock = threading.Lock()
+        self.server.connections = 0
+        self.server.requests = []
+        self.server.headers = []
+        self.server.script = []
+        self.server.delay = 0
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.url = f'http://127.0.0.1:{self.server.server_port}/generate'
+        self.use_new_session()
+
+    def tearDown(self):
+        http_client.set_session(self.previous_session)
+        self.session.close()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def use_new_session(self):
+        self.session = http_client.build_session()
+        self.previous_session = http_client.set_session(self.session)
+
+    def test_connections_are_reused(self):
+        for _ in range(5):
+            self.assertEqual(http_client.post_json(self.url, {'n': 1}).json(), {'ok': True})
+        self.assertEqual(self.server.connections, 1)
+
+    @override_settings(GEMINI_HTTP_POOL_SIZE=2)
+    def test_connections_per_host_are_bounded(self):
+        self.session.close()
+        http_client.set_session(self.previous_session)
+        self.use_new_session()
+        self.server.delay = 0.05
+        threads = [threading.Thread(target=http_client.post_json, args=(self.url, {})) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(self.server.requests), 8)
+        self.assertLessEqual(self.server.connections, 2)
+
+    def test_retries_on_429_and_honours_retry_after(self):
+        self.server.script = [(429, {'Retry-After': '1'}, {}), (503, {}, {})]
+        started = time.monotonic()
+        response = http_client.post_json(self.url, {})
+        self.assertGreaterEqual(time.monotonic() - started, 0.9)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(self.server.requests), 3)
+
+    def test_last_response_is_returned_when_retries_run_out(self):
+        self.server.script = [(503, {}, {'error': 'busy'})] * 10
+        response = http_client.post_json(self.url, {})
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(len(self.server.requests), settings.GEMINI_HTTP_RETRIES + 1)
+
+    @override_settings(GEMINI_HTTP_RETRIES=0)
+    def test_read_timeout(self):
+        self.session.close()
+        http_client.set_session(self.previous_session)
+        self.use_new_session()
+        self.server.delay = 0.5
+        with self.assertRaisesRegex(requests.RequestException, 'Read timed out'):
+            http_client.post_json(self.url, {}, timeout=(1, 0.1))
+
+    def test_ask_gemini_route(self):
+        user = User.objects.create_user(username='lee', password='pass12345')
+        client = APIClient()
+        self.assertEqual(client.post('/api/gemini/ask/', {'prompt': 'hi'}, format='json').status_code, 403)
+        client.force_authenticate(user)
+        self.assertEqual(client.get('/api/gemini/ask/', {'prompt': 'hi'}).status_code, 405)
+        self.server.script = [(200, {}, {'candidates': []})]
+        with override_settings(GEMINI_REST_URL=self.url, GEMINI_API_KEY='test-key'):
+            response = client.post('/api/gemini/ask/', {'prompt': 'hi'}, format='json')
+            client.post('/api/gemini/ask/', {'prompt': 'again'}, format='json')
+        self.assertEqual(response.json(), {'candidates': []})
+        self.assertEqual(self.server.requests[0], {'contents': [{'parts': [{'text': 'hi'}]}]})
+        self.assertEqual(self.server.headers[0]['x-goog-api-key'], 'test-key')
+        self.assertNotIn('Authorization', self.server.headers[0])
+        self.assertEqual(self.server.connections, 1)
+
+    def test_rejected_api_key_is_a_bad_gateway(self):
+        user = User.objects.create_user(username='lee', password='pass12345')
+        client = APIClient()
+        client.force_authenticate(user)
+        self.server.script = [(403, {}, {'error': {'status': 'PERMISSION_DENIED'}})]
+        with override_settings(GEMINI_REST_URL=self.url):
+            response = client.post('/api/gemini/ask/', {'prompt': 'hi'}, format='json')
+        self.assertEqual(response.status_code, 502)
@@ -0,0 +1,185 @@
+"""
+Per-request timing: database, serializer and Gemini time.
+
+RequestTimingMiddleware puts a RequestTimings in a context variable for the duration of each
+request. Database time is collected by an execute_wrapper installed on every connection,
+serializer time by roadmap.serializers.TimedModelSerializer, and Gemini time by roadmap.gemini_ai.
+Context variables follow sync_to_async and asyncio tasks, so work done for the request in other
+threads or coroutines is counted too. The totals go into a Server-Timing response header and
+into per-route histograms, rendered in Prometheus text format by render_prometheus().
+Streamed response bodies are produced after the middleware returns and are not included.
+"""
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+from . import metrics
+
+# Upper bounds in seconds (Prometheus' defaults plus a tail for Gemini round-trips)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+
+# Server-Timing metric names, in header order
+PHASES = ('db', 'serializer', 'gemini')
+
+_current = ContextVar('roadmap_request_timings', default=None)
+
+
+class RequestTimings:
+    """Seconds spent per phase during one request, plus the number of database queries"""
+
+    def __init__(self):
+        self.seconds = dict.fromkeys(PHASES, 0.0)
+        self.queries = 0
+        self._active = set()
+
+    @contextmanager
+    def measure(self, phase):
+        # Nested measurements of the same phase (a serializer inside a serializer) count once.
+        if phase in self._active:
+            yield
+            return
+        self._active.add(phase)
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.seconds[phase] += time.perf_counter() - started
+            self._active.discard(phase)
+
+    def server_timing(self, total):
+        """Value for the Server-Timing header (durations in milliseconds)"""
+        entries = [f'db;dur={self.seconds["db"] * 1000:.1f};desc="{self.queries} queries"']
+        entries += [f'{phase};dur={self.seconds[phase] * 1000:.1f}' for phase in PHASES[1:] if self.seconds[phase]]
+        entries.append(f'total;dur={total * 1000:.1f}')
+        return ', '.join(entries)
+
+
+def start_request():
+    """Begin collecting timings for the current request; pass the token to finish_request()"""
+    return _current.set(RequestTimings())
+
+
+def finish_request(token):
+    _current.reset(token)
+
+
+def current_timings():
+    return _current.get()
+
+
+@contextmanager
+def timed(phase):
+    """Count the time spent in the block towards phase of the current request, if there is one"""
+    timings = _current.get()
+    if timings is None:
+        yield
+        return
+    with timings.measure(phase):
+        yield
+
+
+def _time_query(execute, sql, params, many, context):
+    timings = _current.get()
+    if timings is None:
+        return execute(sql, params, many, context)
+    timings.queries += 1
+    with timings.measure('db'):
+        return execute(sql, params, many, context)
+
+
+def install_query_timer(connection):
+    if _time_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_time_query)
+
+
+@receiver(connection_created)
+def _install_on_new_connection(sender, connection, **kwargs):
+    install_query_timer(connection)
+
+
+def install_on_open_connections():
+    for connection in connections.all(initialized_only=True):
+        install_query_timer(connection)
+
+
+class Histogram:
+    """Cumulative-bucket histogram per label set, in the shape Prometheus expects"""
+
+    def __init__(self, name, help_text, buckets):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = buckets
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, labels, value):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            series = sorted((labels, list(counts), total) for labels, (counts, total) in self._series.items())
+        for labels, counts, total in series:
+            label_text = ','.join(f'{key}="{_escape(value)}"' for key, value in labels)
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                le = '+Inf' if bound == float('inf') else f'{bound:g}'
+                lines.append(f'{self.name}_bucket{{{label_text},le="{le}"}} {cumulative}')
+            lines.append(f'{self.name}_sum{{{label_text}}} {total:.6f}')
+            lines.append(f'{self.name}_count{{{label_text}}} {cumulative}')
+        return lines
+
+    def reset(self):
+        with self._lock:
+            self._series.clear()
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+REQUEST_SECONDS = Histogram('roadmap_request_duration_seconds', 'Request latency by route.', LATENCY_BUCKETS)
+PHASE_SECONDS = {
+    phase: Histogram(f'roadmap_request_{phase}_seconds', f'Time spent in {phase} per request, by route.', LATENCY_BUCKETS)
+    for phase in PHASES
+}
+QUERY_COUNTS = Histogram('roadmap_request_db_queries', 'Database queries per request, by route.', QUERY_COUNT_BUCKETS)
+
+
+def record_request(route, method, total, timings):
+    labels = (('method', method), ('route', route))
+    REQUEST_SECONDS.observe(labels, total)
+    for phase, histogram in PHASE_SECONDS.items():
+        histogram.observe(labels, timings.seconds[phase])
+    QUERY_COUNTS.observe(labels, timings.queries)
+
+
+def render_prometheus():
+    """Request histograms and the roadmap.metrics counters in Prometheus text exposition format"""
+    lines = REQUEST_SECONDS.render()
+    for histogram in PHASE_SECONDS.values():
+        lines += histogram.render()
+    lines += QUERY_COUNTS.render()
+    for name, value in sorted(metrics.snapshot().items()):
+        metric = f'roadmap_{name}_total'
+        lines += [f'# TYPE {metric} counter', f'{metric} {value}']
+    return '\n'.join(lines) + '\n'
+
+
+def reset_histograms():
+    for histogram in (REQUEST_SECONDS, QUERY_COUNTS, *PHASE_SECONDS.values()):
+        histogram.reset()
@@ -1,6 +1,6 @@
 from django.urls import path
 
-from .views import home_view, login_view, register_view, logout_view, login_token, register_token, user_profile, view_or_edit_profile, submit_assessment, get_personality_profile, get_assessment_questions, goal_list_create, goal_detail, goal_roadmap, get_user_achievements, get_user_points, add_points_for_goal, check_new_achievements, generate_roadmap
+from .views import home_view, ask_gemini, login_view, register_view, logout_view, login_token, register_token, user_profile, view_or_edit_profile, submit_assessment, get_personality_profile, get_assessment_questions, goal_list_create, goal_detail, goal_roadmap, get_user_achievements, get_user_points, get_points_history, get_points_by_period, get_leaderboard, get_my_rank, add_points_for_goal, check_new_achievements, generate_roadmap, generate_roadmap_async, roadmap_job_status, stream_roadmap, generate_roadmap_batch, request_metrics
 
 
 
@@ -23,6 +23,10 @@ urlpatterns = [
     path('api/goals/<int:pk>/roadmap/', goal_roadmap, name='goal-roadmap'),
 
     path('api/gamification/points/', get_user_points, name='user-points'),
+    path('api/gamification/points/history/', get_points_history, name='points-history'),
+    path('api/gamification/points/periods/', get_points_by_period, name='points-by-period'),
+    path('api/gamification/leaderboard/', get_leaderboard, name='leaderboard'),
+    path('api/gamification/leaderboard/me/', get_my_rank, name='leaderboard-me'),
     path('api/gamification/add-points/', add_points_for_goal, name='add-points'),
     path('api/gamification/achievements/', get_user_achievements, name='user-achievements'),
     path('api/gamification/check-achievements/', check_new_achievements, name='check-achievements'),
@@ -30,5 +34,11 @@ urlpatterns = [
 
 
     path('api/goals/generate-roadmap/', generate_roadmap, name='generate-roadmap'),
+    path('api/goals/generate-roadmap/async/', generate_roadmap_async, name='generate-roadmap-async'),
+    path('api/goals/generate-roadmap/batch/', generate_roadmap_batch, name='generate-roadmap-batch'),
+    path('api/goals/generate-roadmap/stream/', stream_roadmap, name='generate-roadmap-stream'),
+    path('api/goals/generate-roadmap/jobs/<int:pk>/', roadmap_job_status, name='roadmap-job-status'),
+    path('api/gemini/ask/', ask_gemini, name='ask-gemini'),
+    path('api/metrics/', request_metrics, name='request-metrics'),
 
 ]
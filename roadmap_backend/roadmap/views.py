@@ -1,5 +1,7 @@
+import json
 import requests
-from django.http import JsonResponse
+from django.http import HttpResponse, HttpResponseNotModified, JsonResponse, StreamingHttpResponse
+from django.core.serializers.json import DjangoJSONEncoder
 from django.conf import settings
 from django.shortcuts import render, redirect
 from django.contrib.auth.decorators import login_required
@@ -7,16 +9,24 @@ from django.contrib.auth import login, logout
 from django.contrib.auth.forms import AuthenticationForm, UserCreationForm
 from django.contrib.auth import get_user_model, authenticate
 from django.contrib import messages
+from datetime import datetime
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
 from django.utils.timezone import now, timedelta
+from django.db import IntegrityError, transaction
+from django.db.models import Count, Prefetch, Sum
+from django.db.models.functions import TruncDay, TruncMonth, TruncWeek
 from .models import PersonalityProfile
 from .forms import PersonalityProfileForm
 from .serializers import PersonalityProfileSerializer
 from .models import (
-    Goal, PersonalityProfile, RoadmapStep, Resource, AssessmentQuestion, AssessmentAnswer,UserPoints, Achievement, UserAchievement
+    Goal, PersonalityProfile, RoadmapStep, Resource, AssessmentQuestion, AssessmentAnswer, UserAchievement,
+    RoadmapJob, PointsTransaction,
 )
 from .serializers import (
-    GoalSerializer, PersonalityProfileSerializer, RoadmapStepSerializer,
-    ResourceSerializer, AssessmentQuestionSerializer, UserSerializer, AchievementSerializer, UserAchievementSerializer, UserPointsSerializer
+    GoalSerializer, GoalSummarySerializer, PersonalityProfileSerializer, RoadmapStepSerializer,
+    ResourceSerializer, AssessmentQuestionSerializer, UserSerializer, AchievementSerializer, UserAchievementSerializer, UserPointsSerializer,
+    PointsTransactionSerializer,
 )
 
 from rest_framework import viewsets, permissions, status
@@ -24,31 +34,55 @@ from rest_framework.response import Response
 from rest_framework.decorators import action
 from rest_framework.authtoken.models import Token
 from rest_framework.decorators import api_view, permission_classes
-from rest_framework.permissions import AllowAny, IsAuthenticated
-from .gemini_ai import analyze_goal_with_gemini
-from rest_framework.views import APIView
-import re # Import re for parsing
+from rest_framework.permissions import AllowAny, IsAdminUser, IsAuthenticated
+from rest_framework.authentication import CSRFCheck
+from rest_framework.exceptions import AuthenticationFailed, ValidationError
+from .generation import (
+    RoadmapGenerationError, prepare_roadmap_prompt, agenerate_roadmap_for_goal, generate_roadmaps_for_goals,
+    astream_roadmap_events,
+)
+from .authentication import CachedTokenAuthentication
+from .catalog import etag_matches, get_question_catalog, invalidate_question_catalog
+from .http_client import post_json
+from .jobs import enqueue_roadmap_job
+from .leaderboard import rank_around, top_entries
+from .pagination import GoalCursorPagination, PointsHistoryPagination
+from .points import award_goal_completion, claim_new_achievements, current_points
+from .prompts import invalidate_profile_fragment
+from .timing import render_prometheus
+from asgiref.sync import sync_to_async
+from django.views.decorators.csrf import csrf_exempt
 
 
 # Create your views here.
 User = get_user_model()
 
+POINTS_PERIODS = {'day': TruncDay, 'week': TruncWeek, 'month': TruncMonth}
+
 def home_view(request):
     return render(request, 'home.html')
 
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
 def ask_gemini(request):
-    prompt = request.GET.get("prompt", "")
+    """Send request.data['prompt'] to Gemini's REST API and return its JSON reply"""
+    prompt = request.data.get("prompt", "")
 
     headers = {
-        "Authorization": f"Bearer {settings.GEMINI_API_KEY}",
+        "x-goog-api-key": settings.GEMINI_API_KEY,
     }
 
-    response = requests.post(
-        "https://generativelanguage.googleapis.com/v1beta/models/gemini-pro:generateContent",
-        headers=headers,
-        json={"contents": [{"parts": [{"text": prompt}]}]}
-    )
-    return JsonResponse(response.json())
+    try:
+        response = post_json(settings.GEMINI_REST_URL, {"contents": [{"parts": [{"text": prompt}]}]}, headers=headers)
+        body = response.json()
+    except requests.RequestException as e:
+        return JsonResponse({'error': f'Gemini request failed: {e}'}, status=status.HTTP_502_BAD_GATEWAY)
+    except ValueError:
+        return JsonResponse({'error': 'Gemini returned a non-JSON response'}, status=status.HTTP_502_BAD_GATEWAY)
+    if response.status_code in (status.HTTP_401_UNAUTHORIZED, status.HTTP_403_FORBIDDEN):
+        # Our API key was refused; passed through, the client would take it for its own login failing.
+        return JsonResponse({'error': 'Gemini rejected the server credentials', 'upstream': body}, status=status.HTTP_502_BAD_GATEWAY)
+    return JsonResponse(body, status=response.status_code, safe=False)
 
 def login_view(request):
     if request.method == 'POST':
@@ -244,9 +278,75 @@ def user_profile(request):
 @permission_classes([IsAuthenticated])
 def get_assessment_questions(request):
     """Get all assessment questions"""
-    questions = AssessmentQuestion.objects.all().order_by('question_id')
-    serializer = AssessmentQuestionSerializer(questions, many=True)
-    return Response(serializer.data)
+    catalog = get_question_catalog()
+    if etag_matches(request.headers.get('If-None-Match'), catalog.etag):
+        response = HttpResponseNotModified()
+    else:
+        response = HttpResponse(catalog.body, content_type='application/json')
+    response['ETag'] = catalog.etag
+    response['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+def _as_question_id(value):
+    """Question ids may arrive as numbers or numeric strings"""
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return value
+
+
+def _save_assessment(user, submitted, questions, dimension_values):
+    """Write the changed answers and the profile in one transaction; returns the profile"""
+    for question_id, answer in submitted.items():
+        question = questions[question_id]
+        # Map the answer to its value based on the dimension
+        dimension_value = getattr(question, f'value_{answer}', '') if answer in ('a', 'b', 'c', 'd') else ''
+        # Only update if the dimension exists in our mapping
+        if question.dimension in dimension_values:
+            dimension_values[question.dimension] = dimension_value
+
+    with transaction.atomic():
+        existing = dict(
+            AssessmentAnswer.objects.filter(user=user).values_list('question_id', 'answer')
+        )
+        submitted_pks = {questions[question_id].pk for question_id in submitted}
+
+        # Answers to questions that are not part of this submission are dropped
+        stale = [pk for pk in existing if pk not in submitted_pks]
+        if stale:
+            AssessmentAnswer.objects.filter(user=user, question_id__in=stale).delete()
+
+        # Insert new answers and update changed ones in a single statement
+        changed = [
+            AssessmentAnswer(user=user, question=questions[question_id], answer=answer)
+            for question_id, answer in submitted.items()
+            if existing.get(questions[question_id].pk) != answer
+        ]
+        if changed:
+            AssessmentAnswer.objects.bulk_create(
+                changed, update_conflicts=True, unique_fields=['user', 'question'], update_fields=['answer'],
+            )
+
+        # Create or update the personality profile
+        try:
+            profile = PersonalityProfile.objects.select_for_update().get(user=user)
+            # Update existing profile, writing only the dimensions that changed
+            changed_fields = [
+                key for key, value in dimension_values.items() if value and getattr(profile, key) != value
+            ]
+            for key in changed_fields:
+                setattr(profile, key, dimension_values[key])
+            if changed_fields:
+                profile.save(update_fields=changed_fields + ['updated_at'])
+        except PersonalityProfile.DoesNotExist:
+            # Create new profile
+            profile = PersonalityProfile.objects.create(
+                user=user,
+                **{k: v for k, v in dimension_values.items() if v}  # Only include non-empty values
+            )
+
+    return profile
 
 
 @api_view(['POST'])
@@ -277,61 +377,30 @@ def submit_assessment(request):
         'support_type': ''
     }
     
-    # Delete previous answers for this user
-    AssessmentAnswer.objects.filter(user=request.user).delete()
-    
-    # Process each answer
-    for answer_data in answers_data:
-        question_id = answer_data.get('question_id')
-        answer = answer_data.get('answer')
-        
+    # Later answers to the same question win, as they did when answers were saved one by one
+    submitted = {_as_question_id(answer_data.get('question_id')): answer_data.get('answer') for answer_data in answers_data}
+
+    for attempt in range(2):
+        # Questions come from the in-process catalog, so this does not touch the question table
+        questions = get_question_catalog().questions
+        for question_id in submitted:
+            if question_id not in questions:
+                return Response(
+                    {'detail': f'Question with ID {question_id} does not exist'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
         try:
-            question = AssessmentQuestion.objects.get(question_id=question_id)
-            
-            # Save the answer
-            AssessmentAnswer.objects.create(
-                user=request.user,
-                question=question,
-                answer=answer
-            )
-            
-            # Map the answer to its value based on the dimension
-            if answer == 'a':
-                dimension_value = question.value_a
-            elif answer == 'b':
-                dimension_value = question.value_b
-            elif answer == 'c':
-                dimension_value = question.value_c
-            elif answer == 'd':
-                dimension_value = question.value_d
-            else:
-                dimension_value = ''
-            
-            # Only update if the dimension exists in our mapping
-            if question.dimension in dimension_values:
-                dimension_values[question.dimension] = dimension_value
-            
-        except AssessmentQuestion.DoesNotExist:
-            return Response(
-                {'detail': f'Question with ID {question_id} does not exist'},
-                status=status.HTTP_400_BAD_REQUEST
-            )
-    
-    # Create or update the personality profile
-    try:
-        profile = PersonalityProfile.objects.get(user=request.user)
-        # Update existing profile
-        for key, value in dimension_values.items():
-            if value:  # Only update if we have a value
-                setattr(profile, key, value)
-        profile.save()
-    except PersonalityProfile.DoesNotExist:
-        # Create new profile
-        profile = PersonalityProfile.objects.create(
-            user=request.user,
-            **{k: v for k, v in dimension_values.items() if v}  # Only include non-empty values
-        )
-    
+            profile = _save_assessment(request.user, submitted, questions, dimension_values)
+            break
+        except IntegrityError:
+            # The catalog predates a reseed in another process; reload it and try once more
+            if attempt:
+                raise
+            invalidate_question_catalog()
+
+    # bulk_create and queryset deletes skip the per-row signals that keep the prompt fragment fresh
+    invalidate_profile_fragment(request.user.pk)
+
     serializer = PersonalityProfileSerializer(profile)
     return Response({
         'detail': 'Assessment completed successfully',
@@ -354,14 +423,49 @@ def get_personality_profile(request):
         )
     
 
+def _split_param(value):
+    return [name.strip() for name in value.split(',') if name.strip()] if value is not None else None
+
+
+def goal_list_queryset(user, field_names):
+    """
+    The user's goals with only the columns and relations that field_names (the serializer's
+    fields) need, so large roadmap text columns are not read unless they are serialized.
+    """
+    columns = {field.name for field in Goal._meta.concrete_fields} & set(field_names)
+    # The cursor paginator orders and filters on these.
+    columns |= {'id', 'created_at'}
+    goals = Goal.objects.filter(user=user)
+    if 'user' in field_names:
+        goals = goals.select_related('user')
+        columns |= {'user__id', 'user__username', 'user__email'}
+    if 'steps' in field_names:
+        goals = goals.prefetch_related(Prefetch('steps', queryset=RoadmapStep.objects.order_by('order', 'id')))
+    if 'resources' in field_names:
+        goals = goals.prefetch_related('resources')
+    return goals.only(*columns)
+
+
 @api_view(['GET', 'POST'])
 @permission_classes([IsAuthenticated])
 def goal_list_create(request):
     """List all goals or create a new goal"""
     if request.method == 'GET':
-        goals = Goal.objects.filter(user=request.user)
-        serializer = GoalSerializer(goals, many=True)
-        return Response(serializer.data)
+        # ?view=summary, ?fields=a,b and ?exclude=a,b choose what is serialized (and fetched)
+        serializer_class = GoalSummarySerializer if request.query_params.get('view') == 'summary' else GoalSerializer
+        sparse = {
+            'fields': _split_param(request.query_params.get('fields')),
+            'exclude': _split_param(request.query_params.get('exclude')),
+        }
+        goals = goal_list_queryset(request.user, serializer_class(**sparse).fields)
+        # Paging is opt-in: ?cursor= or ?page_size= returns {next, previous, results} pages; without
+        # them the response stays the bare list existing clients expect.
+        paginator = GoalCursorPagination()
+        if not {paginator.cursor_query_param, paginator.page_size_query_param} & request.query_params.keys():
+            return Response(serializer_class(goals, many=True, **sparse).data)
+        page = paginator.paginate_queryset(goals, request)
+        serializer = serializer_class(page, many=True, **sparse)
+        return paginator.get_paginated_response(serializer.data)
     
     elif request.method == 'POST':
         serializer = GoalSerializer(data=request.data)
@@ -413,15 +517,96 @@ def goal_roadmap(request, pk):
 @permission_classes([IsAuthenticated])
 def get_user_points(request):
     """Get the current user's points and level"""
+    serializer = UserPointsSerializer(current_points(request.user))
+    return Response(serializer.data)
+
+
+def _ledger_in_range(request):
+    """The user's PointsTransactions, limited by ?since= / ?until= (ISO dates or datetimes, until exclusive)"""
+    transactions = PointsTransaction.objects.filter(user=request.user)
+    for param, lookup in (('since', 'created_at__gte'), ('until', 'created_at__lt')):
+        value = request.query_params.get(param)
+        if not value:
+            continue
+        moment = parse_datetime(value)
+        if moment is None:
+            day = parse_date(value)
+            if day is None:
+                raise ValidationError({param: 'Expected an ISO date or datetime.'})
+            moment = datetime.combine(day, datetime.min.time())
+        if timezone.is_naive(moment):
+            moment = timezone.make_aware(moment)
+        transactions = transactions.filter(**{lookup: moment})
+    return transactions
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def get_points_history(request):
+    """The current user's points ledger, newest first (cursor paginated)"""
+    paginator = PointsHistoryPagination()
+    page = paginator.paginate_queryset(_ledger_in_range(request), request)
+    serializer = PointsTransactionSerializer(page, many=True)
+    return paginator.get_paginated_response(serializer.data)
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def get_points_by_period(request):
+    """Points earned per day, week or month (?period=, default week), optionally limited by ?since= / ?until="""
+    trunc = POINTS_PERIODS.get(request.query_params.get('period', 'week'))
+    if trunc is None:
+        return Response({'detail': f"period must be one of: {', '.join(POINTS_PERIODS)}."}, status=status.HTTP_400_BAD_REQUEST)
+
+    totals = (
+        _ledger_in_range(request)
+        .annotate(period_start=trunc('created_at'))
+        .values('period_start')
+        .annotate(points=Sum('delta'), transactions=Count('id'))
+        .order_by('period_start')
+    )
+    return Response([
+        {'period_start': row['period_start'].isoformat(), 'points': row['points'], 'transactions': row['transactions']}
+        for row in totals
+    ])
+
+def _leaderboard_rows(entries):
+    usernames = dict(User.objects.filter(id__in=[entry.user_id for entry in entries]).values_list('id', 'username'))
+    return [
+        {'rank': entry.rank, 'user_id': entry.user_id, 'username': usernames.get(entry.user_id), 'total_points': entry.total_points}
+        for entry in entries
+    ]
+
+
+def _int_param(request, name, default, maximum):
     try:
-        points = UserPoints.objects.get(user=request.user)
-        serializer = UserPointsSerializer(points)
-        return Response(serializer.data)
-    except UserPoints.DoesNotExist:
-        # Create new points object if it doesn't exist
-        points = UserPoints.objects.create(user=request.user)
-        serializer = UserPointsSerializer(points)
-        return Response(serializer.data)
+        return min(max(0, int(request.query_params.get(name, default))), maximum)
+    except ValueError:
+        raise ValidationError({name: 'Expected an integer.'})
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def get_leaderboard(request):
+    """The top ?limit= users by total points (default 10, at most LEADERBOARD_MAX_LIMIT)"""
+    limit = _int_param(request, 'limit', 10, settings.LEADERBOARD_MAX_LIMIT)
+    return Response({'results': _leaderboard_rows(top_entries(limit))})
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def get_my_rank(request):
+    """The current user's rank with ?neighbours= users above and below (default 2)"""
+    neighbours = _int_param(request, 'neighbours', 2, settings.LEADERBOARD_MAX_NEIGHBOURS)
+    user_points = current_points(request.user)
+    rank, ranked_users, entries = rank_around(request.user.id, user_points.total_points, neighbours)
+    return Response({
+        'rank': rank,
+        'total_points': user_points.total_points,
+        'ranked_users': ranked_users,
+        'neighbours': _leaderboard_rows(entries),
+    })
+
 
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
@@ -441,17 +626,12 @@ def add_points_for_goal(request):
     }
     
     points_to_add = category_points.get(category.lower(), 50)
+    goal = Goal.objects.filter(pk=goal_id, user=request.user).first() if goal_id else None
     
     try:
-        # Get or create user points
-        user_points, created = UserPoints.objects.get_or_create(user=request.user)
-        
-        # Add points
-        level_up = user_points.add_points(points_to_add)
-        
-        # Check for achievements
-        check_achievements(request.user, user_points)
-        
+        # Insert-only: the ledger row is folded into UserPoints (and achievements awarded) on the next read
+        user_points, level_up = award_goal_completion(request.user, points_to_add, goal)
+
         return Response({
             'total_points': user_points.total_points,
             'level': user_points.level,
@@ -474,240 +654,164 @@ def get_user_achievements(request):
 @permission_classes([IsAuthenticated])
 def check_new_achievements(request):
     """Check for new achievements and return them"""
-    user_points = UserPoints.objects.get_or_create(user=request.user)[0]
-    new_achievements = check_achievements(request.user, user_points)
+    new_achievements = claim_new_achievements(request.user)
     
     serializer = AchievementSerializer(new_achievements, many=True)
     return Response({
         'new_achievements': serializer.data
     })
 
-# Helper function to check and award achievements
-def check_achievements(user, user_points):
-    """Check if user qualifies for any new achievements and award them"""
-    new_achievements = []
-    
-    # Get all existing achievements for this user
-    existing_achievements = UserAchievement.objects.filter(user=user).values_list('achievement_id', flat=True)
-    
-    # Check for goal completion achievements
-    if user_points.goals_completed >= 1:
-        achievement, created = Achievement.objects.get_or_create(
-            name="First Goal Completed",
-            defaults={
-                'description': "You've completed your first goal!",
-                'points': 50,
-                'achievement_type': 'completion',
-                'icon': 'stars'
-            }
-        )
-        
-        if achievement.id not in existing_achievements:
-            UserAchievement.objects.create(user=user, achievement=achievement)
-            new_achievements.append(achievement)
-            # Add achievement bonus points
-            user_points.total_points += achievement.points
-            user_points.save()
-    
-    if user_points.goals_completed >= 5:
-        achievement, created = Achievement.objects.get_or_create(
-            name="Goal Master",
-            defaults={
-                'description': "You've completed 5 goals!",
-                'points': 100,
-                'achievement_type': 'completion',
-                'icon': 'emoji_events'
-            }
-        )
-        
-        if achievement.id not in existing_achievements:
-            UserAchievement.objects.create(user=user, achievement=achievement)
-            new_achievements.append(achievement)
-            # Add achievement bonus points
-            user_points.total_points += achievement.points
-            user_points.save()
-    
-    # Check for level achievements
-    if user_points.level >= 3:
-        achievement, created = Achievement.objects.get_or_create(
-            name="Level 3 Achiever",
-            defaults={
-                'description': "You've reached level 3!",
-                'points': 75,
-                'achievement_type': 'special',
-                'icon': 'military_tech'
-            }
-        )
-        
-        if achievement.id not in existing_achievements:
-            UserAchievement.objects.create(user=user, achievement=achievement)
-            new_achievements.append(achievement)
-            # Add achievement bonus points
-            user_points.total_points += achievement.points
-            user_points.save()
-    
-    # Return any new achievements
-    return new_achievements
-
-def parse_gemini_roadmap_response(text_response):
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def generate_roadmap(request):
     """
-    Parses the plain text response from Gemini to extract roadmap milestones and full plan.
-    Assumes the response format requested in the prompt:
-    Milestones:
-    - Start: ...
-    - 3 months: ...
-    - 6 months: ...
-    - 9 months: ...
-    - 12 months: ...
-
-    Full Plan:
-    ...
+    Queue roadmap generation with Gemini for a Goal and return the job id right away.
+    Expects 'goal_id' in request.data to identify the target goal.
+    Also uses 'goal' title, 'category', 'description' from request.data for the prompt.
+    Poll roadmap_job_status for the result.
     """
-    roadmap_data = {
-        "milestone_start": "",
-        "milestone_3_months": "",
-        "milestone_6_months": "",
-        "milestone_9_months": "",
-        "milestone_12_months": "",
-        "full_plan": ""
-    }
-
     try:
-        # Extract Milestones block
-        milestones_match = re.search(r"Milestones:(.*?)Full Plan:", text_response, re.DOTALL | re.IGNORECASE)
-        milestones_text = ""
-        if milestones_match:
-            milestones_text = milestones_match.group(1).strip()
-
-        # Extract Full Plan block
-        full_plan_match = re.search(r"Full Plan:(.*)", text_response, re.DOTALL | re.IGNORECASE)
-        if full_plan_match:
-            roadmap_data["full_plan"] = full_plan_match.group(1).strip()
-
-        # Extract individual milestones
-        if milestones_text:
-            start_match = re.search(r"- Start:(.*?)(?=(- 3 months:|- 6 months:|- 9 months:|- 12 months:|$))", milestones_text, re.DOTALL | re.IGNORECASE)
-            if start_match: roadmap_data["milestone_start"] = start_match.group(1).strip()
-
-            three_months_match = re.search(r"- 3 months:(.*?)(?=(- 6 months:|- 9 months:|- 12 months:|$))", milestones_text, re.DOTALL | re.IGNORECASE)
-            if three_months_match: roadmap_data["milestone_3_months"] = three_months_match.group(1).strip()
-
-            six_months_match = re.search(r"- 6 months:(.*?)(?=(- 9 months:|- 12 months:|$))", milestones_text, re.DOTALL | re.IGNORECASE)
-            if six_months_match: roadmap_data["milestone_6_months"] = six_months_match.group(1).strip()
-
-            nine_months_match = re.search(r"- 9 months:(.*?)(?=(- 12 months:|$))", milestones_text, re.DOTALL | re.IGNORECASE)
-            if nine_months_match: roadmap_data["milestone_9_months"] = nine_months_match.group(1).strip()
-
-            twelve_months_match = re.search(r"- 12 months:(.*)", milestones_text, re.DOTALL | re.IGNORECASE)
-            if twelve_months_match: roadmap_data["milestone_12_months"] = twelve_months_match.group(1).strip()
-            
-    except Exception as e:
-        # Log parsing error, or handle as needed
-        print(f"Error parsing roadmap response: {e}")
-        # Optionally, put the whole raw response into full_plan if parsing fails
-        # roadmap_data["full_plan"] = "Could not parse roadmap details. Raw response:\\n" + text_response
+        # Validate up front so missing goals/profiles are reported immediately, not via the job,
+        # which builds the prompt again itself.
+        target_goal, _, _ = prepare_roadmap_prompt(request.user, request.data)
+    except RoadmapGenerationError as e:
+        return Response({'detail': e.detail}, status=e.status_code)
 
+    job = enqueue_roadmap_job(request.user, target_goal, request.data)
+    return Response({'job_id': job.id, 'status': job.status}, status=status.HTTP_202_ACCEPTED)
 
-    return roadmap_data
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def roadmap_job_status(request, pk):
+    """Report the status of a roadmap generation job; includes the goal once it is done"""
+    try:
+        job = RoadmapJob.objects.select_related('goal').get(pk=pk, user=request.user)
+    except RoadmapJob.DoesNotExist:
+        return Response({'detail': 'Job not found.'}, status=status.HTTP_404_NOT_FOUND)
+
+    data = {'job_id': job.id, 'status': job.status, 'attempts': job.attempts, 'error': job.error}
+    if job.status == RoadmapJob.STATUS_DONE:
+        data['goal'] = GoalSerializer(job.goal).data
+    return Response(data)
 
 
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
-def generate_roadmap(request):
+def generate_roadmap_batch(request):
     """
-    Generate a roadmap using Gemini AI, parse it, and save it to the Goal.
-    Expects 'goal_id' in request.data to identify the target goal.
-    Also uses 'goal' title, 'category', 'description' from request.data for the prompt.
+    Generate roadmaps for several goals with a single Gemini request.
+    Expects 'goal_ids' (a list) in request.data; titles, categories and descriptions come from the goals.
     """
-    user = request.user
-    goal_id = request.data.get('goal_id')
-    goal_title = request.data.get('goal') # Assuming 'goal' is the title for the prompt
-    category = request.data.get('category')
-    description = request.data.get('description')
+    goal_ids = request.data.get('goal_ids')
+    if not isinstance(goal_ids, list) or not goal_ids:
+        return Response({'detail': 'goal_ids must be a non-empty list.'}, status=status.HTTP_400_BAD_REQUEST)
+    try:
+        goal_ids = list(dict.fromkeys(int(goal_id) for goal_id in goal_ids))
+    except (TypeError, ValueError):
+        return Response({'detail': 'goal_ids must contain integers.'}, status=status.HTTP_400_BAD_REQUEST)
+    if len(goal_ids) > settings.ROADMAP_BATCH_MAX_GOALS:
+        return Response({'detail': f'At most {settings.ROADMAP_BATCH_MAX_GOALS} goals per batch.'}, status=status.HTTP_400_BAD_REQUEST)
 
-    if not goal_id:
-        return Response({'detail': 'goal_id is required.'}, status=status.HTTP_400_BAD_REQUEST)
+    try:
+        goals = generate_roadmaps_for_goals(request.user, goal_ids)
+    except RoadmapGenerationError as e:
+        return Response({'detail': e.detail}, status=e.status_code)
 
+    serializer = GoalSerializer(goals, many=True)
+    return Response(serializer.data, status=status.HTTP_200_OK)
+
+
+async def _authenticate_async(request):
+    """
+    Resolve the user for a plain async view the way DRF's default authenticators would:
+    token first, then session (with the CSRF check SessionAuthentication enforces).
+    Returns None when the request is not authenticated.
+    """
     try:
-        target_goal = Goal.objects.get(id=goal_id, user=user)
-    except Goal.DoesNotExist:
-        return Response({'detail': 'Goal not found or you do not have permission.'}, status=status.HTTP_404_NOT_FOUND)
+        auth = await sync_to_async(CachedTokenAuthentication().authenticate)(request)
+    except AuthenticationFailed:
+        return None
+    if auth is not None:
+        return auth[0]
+
+    user = await request.auser()
+    if not user.is_authenticated:
+        return None
+
+    check = CSRFCheck(lambda req: None)
+    check.process_request(request)
+    if check.process_view(request, None, (), {}) is not None:
+        return None
+    return user
+
+
+@csrf_exempt
+async def generate_roadmap_async(request):
+    """
+    Async variant of generate_roadmap for ASGI deployments.
+    The Gemini round-trip is awaited on the event loop, so waiting requests do not hold a worker.
+    """
+    if request.method != 'POST':
+        return JsonResponse({'detail': f'Method "{request.method}" not allowed.'}, status=status.HTTP_405_METHOD_NOT_ALLOWED)
+
+    user = await _authenticate_async(request)
+    if user is None:
+        return JsonResponse({'detail': 'Authentication credentials were not provided.'}, status=status.HTTP_401_UNAUTHORIZED)
 
-    # Check for personality profile
     try:
-        profile = PersonalityProfile.objects.get(user=user)
-    except PersonalityProfile.DoesNotExist:
-        return Response({'detail': 'You must complete your assessment and personality profile before generating a roadmap.'}, status=status.HTTP_400_BAD_REQUEST)
-
-    # Get assessment answers (latest for user)
-    assessment_answers = AssessmentAnswer.objects.filter(user=user)
-    if not assessment_answers.exists():
-        return Response({'detail': 'You must complete your assessment before generating a roadmap.'}, status=status.HTTP_400_BAD_REQUEST)
-
-    assessment_summary = {}
-    for answer in assessment_answers:
-        # We need the actual text value of the answer, not just 'a', 'b', 'c', 'd'
-        # This requires mapping answer.answer to question.value_a, value_b etc.
-        # For simplicity in this step, I'm still using answer.answer, but this should be improved
-        # to get the richer text value that the profile uses.
-        # Example: if answer.answer is 'a', use answer.question.value_a
-        answer_choice = answer.answer 
-        value = answer_choice # Placeholder - ideally map to actual value
-        if hasattr(answer.question, f'value_{answer_choice.lower()}'):
-             value = getattr(answer.question, f'value_{answer_choice.lower()}')
-        assessment_summary[answer.question.dimension] = value
-
-
-    personality_summary = {field.name: getattr(profile, field.name) for field in PersonalityProfile._meta.fields if field.name not in ['id', 'user', 'created_at', 'updated_at']}
-
-    # Compose prompt for Gemini
-    # Using goal_title, category, description from request for the prompt
-    prompt = f"""
-    The user has the following goal:
-    Title: {goal_title} 
-    Category: {category}
-    Description: {description}
-
-    Their assessment answers by dimension are:
-    {assessment_summary}
-
-    Their personality profile is:
-    {personality_summary}
-
-    Please generate a 1-year roadmap for this user, broken into 5 milestones (Start, 3 months, 6 months, 9 months, 12 months) and a detailed full plan. Format as:
-    Milestones:
-    - Start: ...
-    - 3 months: ...
-    - 6 months: ...
-    - 9 months: ...
-    - 12 months: ...
-
-    Full Plan:
-    ...
+        data = json.loads(request.body or b'{}')
+    except ValueError:
+        return JsonResponse({'detail': 'Invalid JSON body.'}, status=status.HTTP_400_BAD_REQUEST)
+
+    try:
+        target_goal = await agenerate_roadmap_for_goal(user, data)
+    except RoadmapGenerationError as e:
+        return JsonResponse({'detail': e.detail}, status=e.status_code)
+
+    data = await sync_to_async(lambda: GoalSerializer(target_goal).data)()
+    return JsonResponse(data, status=status.HTTP_200_OK)
+
+
+@csrf_exempt
+async def stream_roadmap(request):
     """
+    Stream roadmap generation as Server-Sent Events.
+    Emits 'token' events with raw Gemini text, a 'milestone' event as each milestone completes,
+    and a final 'done' event carrying the saved goal (or 'error').
+    """
+    if request.method != 'POST':
+        return JsonResponse({'detail': f'Method "{request.method}" not allowed.'}, status=status.HTTP_405_METHOD_NOT_ALLOWED)
+
+    user = await _authenticate_async(request)
+    if user is None:
+        return JsonResponse({'detail': 'Authentication credentials were not provided.'}, status=status.HTTP_401_UNAUTHORIZED)
+
     try:
-        ai_response_text = analyze_goal_with_gemini(prompt)
-    except Exception as e:
-        return Response({'detail': f'Error calling Gemini: {str(e)}'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-
-    # Parse the AI response
-    parsed_roadmap = parse_gemini_roadmap_response(ai_response_text)
-
-    # Update the target Goal object
-    target_goal.milestone_start = parsed_roadmap.get("milestone_start", "")
-    target_goal.milestone_3_months = parsed_roadmap.get("milestone_3_months", "")
-    target_goal.milestone_6_months = parsed_roadmap.get("milestone_6_months", "")
-    target_goal.milestone_9_months = parsed_roadmap.get("milestone_9_months", "")
-    target_goal.milestone_12_months = parsed_roadmap.get("milestone_12_months", "")
-    target_goal.full_plan = parsed_roadmap.get("full_plan", "")
-    
+        data = json.loads(request.body or b'{}')
+    except ValueError:
+        return JsonResponse({'detail': 'Invalid JSON body.'}, status=status.HTTP_400_BAD_REQUEST)
+
     try:
-        target_goal.save()
-    except Exception as e:
-        # Log saving error
-        print(f"Error saving roadmap to goal {target_goal.id}: {e}")
-        return Response({'detail': f'Could not save roadmap to goal: {str(e)}'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        # Streaming relies on the text format: milestones are sent as soon as their label lines arrive.
+        target_goal, prompt, cache_key = await sync_to_async(prepare_roadmap_prompt)(user, data, json_mode=False)
+    except RoadmapGenerationError as e:
+        return JsonResponse({'detail': e.detail}, status=e.status_code)
 
-    serializer = GoalSerializer(target_goal)
-    return Response(serializer.data, status=status.HTTP_200_OK)
+    async def event_stream():
+        async for event, payload in astream_roadmap_events(target_goal, prompt, cache_key):
+            if event == 'done':
+                payload = await sync_to_async(lambda: GoalSerializer(target_goal).data)()
+            yield f"event: {event}\ndata: {json.dumps(payload, cls=DjangoJSONEncoder)}\n\n"
 
+    response = StreamingHttpResponse(event_stream(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def request_metrics(request):
+    """Per-route latency histograms and counters in Prometheus text format (staff only)"""
+    return HttpResponse(render_prometheus(), content_type='text/plain; version=0.0.4; charset=utf-8')
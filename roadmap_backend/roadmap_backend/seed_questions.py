@@ -8,6 +8,7 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'roadmap_backend.settings')
 django.setup()
 
+from roadmap.catalog import invalidate_question_catalog
 from roadmap.models import AssessmentQuestion
 
 # Define the questions data
@@ -220,5 +221,8 @@ def seed_questions():
     
     print(f"Created {len(questions_data)} assessment questions")
 
+    # Running servers reload the question catalog on their next request
+    invalidate_question_catalog()
+
 if __name__ == "__main__":
     seed_questions()
\ No newline at end of file
@@ -49,6 +49,7 @@ INSTALLED_APPS = [
 MIDDLEWARE = [
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'roadmap.middleware.RequestTimingMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django_session_timeout.middleware.SessionTimeoutMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -130,14 +131,27 @@ USE_TZ = True
 
 STATIC_URL = 'static/'
 
+# Shared cache. Without REDIS_URL every process gets its own LocMemCache, which the in-process
+# caches in roadmap/ are built to tolerate but sessions are not (see SESSION_ENGINE below).
+# Needs the redis package.
+REDIS_URL = config('REDIS_URL', default='')
+if REDIS_URL:
+    CACHES = {'default': {'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': REDIS_URL}}
+
 # Session timeout
-SESSION_ENGINE = 'django.contrib.sessions.backends.db' 
+# roadmap.sessions serves sessions from the cache and skips database writes that only move the
+# activity stamp, so it needs a cache every worker shares: with per-process LocMemCache a logout in
+# one worker would leave the others serving their cached, still logged-in copy. Without a shared
+# cache sessions stay in the database (checked at startup, see roadmap.sessions.check_session_cache).
+SESSION_ENGINE = 'roadmap.sessions' if REDIS_URL else 'django.contrib.sessions.backends.db'
 SESSION_COOKIE_AGE = 1800  
 SESSION_SAVE_EVERY_REQUEST = True 
 
 SESSION_EXPIRE_SECONDS = 300 
 SESSION_EXPIRE_AFTER_LAST_ACTIVITY = True  
 SESSION_TIMEOUT_REDIRECT = '/login/'  
+# Seconds between database writes of a session whose data has not changed (see roadmap/sessions.py)
+SESSION_DB_WRITE_INTERVAL = config('SESSION_DB_WRITE_INTERVAL', default=60, cast=int)
 
 
 # Default primary key field type
@@ -155,6 +169,85 @@ REST_FRAMEWORK = {
     ],
     'DEFAULT_AUTHENTICATION_CLASSES': [
         'rest_framework.authentication.SessionAuthentication',
-        'rest_framework.authentication.TokenAuthentication',
+        'roadmap.authentication.CachedTokenAuthentication',
     ],
-}
\ No newline at end of file
+}
+
+# Roadmap response cache (seconds / entry counts)
+ROADMAP_CACHE_TTL = config('ROADMAP_CACHE_TTL', default=7 * 24 * 3600, cast=int)
+ROADMAP_CACHE_MEMORY_ENTRIES = config('ROADMAP_CACHE_MEMORY_ENTRIES', default=256, cast=int)
+ROADMAP_CACHE_DB_ENTRIES = config('ROADMAP_CACHE_DB_ENTRIES', default=10000, cast=int)
+# Trim the table on every Nth store instead of every store, and refresh a row's LRU timestamp at
+# most once per interval (seconds) instead of on every DB-tier hit.
+ROADMAP_CACHE_EVICT_EVERY = config('ROADMAP_CACHE_EVICT_EVERY', default=50, cast=int)
+ROADMAP_CACHE_TOUCH_INTERVAL = config('ROADMAP_CACHE_TOUCH_INTERVAL', default=3600, cast=int)
+
+# Roadmap generation job queue (see roadmap/jobs.py)
+ROADMAP_JOB_WORKERS = config('ROADMAP_JOB_WORKERS', default=4, cast=int)
+ROADMAP_JOB_AUTOSTART = config('ROADMAP_JOB_AUTOSTART', default=True, cast=bool)
+ROADMAP_JOB_MAX_ATTEMPTS = config('ROADMAP_JOB_MAX_ATTEMPTS', default=3, cast=int)
+ROADMAP_JOB_RETRY_BACKOFF = config('ROADMAP_JOB_RETRY_BACKOFF', default=5, cast=int)
+ROADMAP_JOB_LEASE_SECONDS = config('ROADMAP_JOB_LEASE_SECONDS', default=300, cast=int)
+ROADMAP_JOB_POLL_INTERVAL = config('ROADMAP_JOB_POLL_INTERVAL', default=2, cast=float)
+
+# Single-flight coalescing of identical Gemini calls (see roadmap/singleflight.py)
+ROADMAP_SINGLEFLIGHT_LEASE_SECONDS = config('ROADMAP_SINGLEFLIGHT_LEASE_SECONDS', default=120, cast=int)
+ROADMAP_SINGLEFLIGHT_POLL_INTERVAL = config('ROADMAP_SINGLEFLIGHT_POLL_INTERVAL', default=0.25, cast=float)
+
+# Maximum goals packed into one batch roadmap request
+ROADMAP_BATCH_MAX_GOALS = config('ROADMAP_BATCH_MAX_GOALS', default=10, cast=int)
+
+# Gemini client: timeout, adaptive concurrency limit and circuit breaker (see roadmap/gemini_client.py)
+GEMINI_TIMEOUT = config('GEMINI_TIMEOUT', default=30, cast=float)
+GEMINI_CONCURRENCY_INITIAL = config('GEMINI_CONCURRENCY_INITIAL', default=8, cast=int)
+GEMINI_CONCURRENCY_MIN = config('GEMINI_CONCURRENCY_MIN', default=1, cast=int)
+GEMINI_CONCURRENCY_MAX = config('GEMINI_CONCURRENCY_MAX', default=64, cast=int)
+GEMINI_LATENCY_TARGET = config('GEMINI_LATENCY_TARGET', default=10, cast=float)
+GEMINI_ACQUIRE_TIMEOUT = config('GEMINI_ACQUIRE_TIMEOUT', default=5, cast=float)
+GEMINI_BREAKER_ERROR_RATE = config('GEMINI_BREAKER_ERROR_RATE', default=0.5, cast=float)
+GEMINI_BREAKER_WINDOW = config('GEMINI_BREAKER_WINDOW', default=20, cast=int)
+GEMINI_BREAKER_MIN_CALLS = config('GEMINI_BREAKER_MIN_CALLS', default=5, cast=int)
+GEMINI_BREAKER_RESET_SECONDS = config('GEMINI_BREAKER_RESET_SECONDS', default=30, cast=float)
+
+# Roadmap prompt building (see roadmap/prompts.py)
+ROADMAP_PROMPT_TOKEN_BUDGET = config('ROADMAP_PROMPT_TOKEN_BUDGET', default=1500, cast=int)
+ROADMAP_PROFILE_FRAGMENT_CACHE_SIZE = config('ROADMAP_PROFILE_FRAGMENT_CACHE_SIZE', default=1024, cast=int)
+# Profile changes reach other processes through the shared cache (REDIS_URL); without one they
+# only notice when their fragment expires, so keep this short.
+ROADMAP_PROFILE_FRAGMENT_TTL = config('ROADMAP_PROFILE_FRAGMENT_TTL', default=60, cast=int)
+
+# Ask Gemini for a JSON roadmap (validated, one repair retry, text parser as fallback) instead of free text
+ROADMAP_JSON_MODE = config('ROADMAP_JSON_MODE', default=False, cast=bool)
+
+# Seconds a process keeps its assessment question catalog before reloading it (see roadmap/catalog.py)
+ASSESSMENT_CATALOG_TTL = config('ASSESSMENT_CATALOG_TTL', default=300, cast=int)
+
+# Goal list pagination (see roadmap/pagination.py)
+GOAL_LIST_PAGE_SIZE = config('GOAL_LIST_PAGE_SIZE', default=20, cast=int)
+GOAL_LIST_MAX_PAGE_SIZE = config('GOAL_LIST_MAX_PAGE_SIZE', default=100, cast=int)
+
+# Leaderboard: seconds a process keeps its rank snapshot, and request limits (see roadmap/leaderboard.py)
+LEADERBOARD_SNAPSHOT_TTL = config('LEADERBOARD_SNAPSHOT_TTL', default=60, cast=int)
+LEADERBOARD_MAX_LIMIT = config('LEADERBOARD_MAX_LIMIT', default=100, cast=int)
+LEADERBOARD_MAX_NEIGHBOURS = config('LEADERBOARD_MAX_NEIGHBOURS', default=25, cast=int)
+
+# Token authentication cache (see roadmap/authentication.py): in-process entries and seconds, and
+# an optional tier in the Django cache shared by all processes
+AUTH_TOKEN_CACHE_SIZE = config('AUTH_TOKEN_CACHE_SIZE', default=4096, cast=int)
+AUTH_TOKEN_CACHE_TTL = config('AUTH_TOKEN_CACHE_TTL', default=30, cast=int)
+AUTH_TOKEN_SHARED_CACHE = config('AUTH_TOKEN_SHARED_CACHE', default=False, cast=bool)
+AUTH_TOKEN_SHARED_CACHE_TTL = config('AUTH_TOKEN_SHARED_CACHE_TTL', default=300, cast=int)
+
+# Send per-request db/serializer/gemini timings to clients in a Server-Timing header (see roadmap/timing.py)
+SERVER_TIMING_HEADER = config('SERVER_TIMING_HEADER', default=True, cast=bool)
+
+# Pooled HTTP client for direct Gemini REST calls (see roadmap/http_client.py): connections kept
+# per host, timeouts in seconds, and retries of 429/5xx with jittered backoff
+GEMINI_REST_URL = config('GEMINI_REST_URL', default='https://generativelanguage.googleapis.com/v1beta/models/gemini-2.0-flash-lite:generateContent')  # same model as roadmap/gemini_ai.py
+GEMINI_HTTP_POOL_SIZE = config('GEMINI_HTTP_POOL_SIZE', default=10, cast=int)
+GEMINI_HTTP_CONNECT_TIMEOUT = config('GEMINI_HTTP_CONNECT_TIMEOUT', default=3.05, cast=float)
+GEMINI_HTTP_READ_TIMEOUT = config('GEMINI_HTTP_READ_TIMEOUT', default=30, cast=float)
+GEMINI_HTTP_RETRIES = config('GEMINI_HTTP_RETRIES', default=3, cast=int)
+GEMINI_HTTP_BACKOFF = config('GEMINI_HTTP_BACKOFF', default=0.5, cast=float)
+GEMINI_HTTP_BACKOFF_JITTER = config('GEMINI_HTTP_BACKOFF_JITTER', default=0.5, cast=float)
+GEMINI_HTTP_RETRY_AFTER_MAX = config('GEMINI_HTTP_RETRY_AFTER_MAX', default=30, cast=float)